@@ -0,0 +1,95 @@
+import json
+import queue
+import threading
+from collections import deque
+
+
+class Subscription:
+    """One connected client: a bounded queue of pre-formatted SSE messages."""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        # Set when the client fell too far behind; its stream should end so the
+        # browser reconnects and resumes from history with Last-Event-ID.
+        self.overflowed = False
+
+    def get(self, timeout):
+        """Return the next message, or None if nothing arrived within timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broadcaster:
+    """
+    Fan-out of admin dashboard events (service status changes, new log
+    records) to any number of SSE clients.
+
+    Each event is serialized once, numbered and kept in a bounded history so a
+    reconnecting client can resume after its Last-Event-ID. Publishing never
+    blocks: a client whose queue is full is marked as overflowed and dropped.
+    """
+
+    def __init__(self, history_size=500, client_queue_size=256, max_clients=32):
+        self.client_queue_size = client_queue_size
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._history = deque(maxlen=history_size)
+        self._clients = set()
+        self.dropped_clients = 0
+
+    @property
+    def has_subscribers(self):
+        return bool(self._clients)
+
+    @staticmethod
+    def _format(event_id, event_type, data):
+        # "message" events are delivered to EventSource.onmessage
+        if event_type == 'message':
+            return f"id: {event_id}\ndata: {data}\n\n"
+        return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+    def publish(self, event_type, data):
+        """Publish one event. `data` is a dict or an already serialized JSON string."""
+        self.publish_many(event_type, [data])
+
+    def publish_many(self, event_type, items):
+        with self._lock:
+            for data in items:
+                if not isinstance(data, str):
+                    data = json.dumps(data, default=str)
+                message = self._format(self._next_id, event_type, data)
+                self._history.append((self._next_id, message))
+                self._next_id += 1
+                for client in list(self._clients):
+                    try:
+                        client.queue.put_nowait(message)
+                    except queue.Full:
+                        client.overflowed = True
+                        self._clients.discard(client)
+                        self.dropped_clients += 1
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register a client. Events newer than `last_event_id` still in history
+        are queued first. Returns None if the client limit is reached.
+        """
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                return None
+            client = Subscription(self.client_queue_size)
+            if last_event_id is not None:
+                backlog = [msg for event_id, msg in self._history if event_id > last_event_id]
+                for message in backlog[-self.client_queue_size:]:
+                    client.queue.put_nowait(message)
+            self._clients.add(client)
+            return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+
+broadcaster = Broadcaster()
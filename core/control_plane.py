@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+import threading
+from core.broadcaster import broadcaster
+
+STATUS_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '../logs/service_status.json'))
+
+
+class ControlPlane:
+    """
+    In-process service control plane.
+
+    Holds the desired state ("running"/"stopped") and the actual status of
+    every service. The admin panel calls request() from its Flask threads; the
+    command is handed to the service watcher's asyncio queue right away, so
+    start/stop no longer waits for a polling interval. Services report their
+    status with set_status(). Every change bumps a version number, is pushed
+    to the admin dashboard through the broadcaster and rewrites
+    logs/service_status.json atomically. The file is only a snapshot; nothing
+    polls it anymore.
+    """
+
+    def __init__(self, status_file=STATUS_FILE):
+        self.status_file = status_file
+        self._lock = threading.Lock()
+        self._state = self._load_snapshot()
+        self.version = 0
+        self._loop = None
+        self._queues = {}
+
+    def _load_snapshot(self):
+        # Keep desired states from the previous run, so a service stopped from
+        # the admin panel stays stopped after a restart.
+        try:
+            with open(self.status_file, 'r') as f:
+                data = json.load(f)
+        except Exception:
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        return {k: v for k, v in data.items() if k.endswith('_desired')}
+
+    def _write_snapshot(self):
+        # Called with the condition lock held, so writers never interleave
+        tmp_file = f"{self.status_file}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.status_file), exist_ok=True)
+            with open(tmp_file, 'w') as f:
+                json.dump(self._state, f)
+            os.replace(tmp_file, self.status_file)
+        except Exception:
+            pass
+
+    def _changed(self):
+        self.version += 1
+        self._write_snapshot()
+        broadcaster.publish('message', self._state)
+
+    def attach(self, loop):
+        """Bind the control plane to the orchestrator's event loop."""
+        self._loop = loop
+
+    def register(self, service):
+        """Return the command queue for a service watcher (call from the loop)."""
+        queue = asyncio.Queue()
+        self._queues[service] = queue
+        return queue
+
+    def desired(self, service):
+        with self._lock:
+            return self._state.get(f"{service}_desired", 'running')
+
+    def status(self, service):
+        with self._lock:
+            return self._state.get(service, 'unknown')
+
+    def request(self, service, action):
+        """Ask a service to 'start' or 'stop'. Safe to call from any thread."""
+        if action not in ('start', 'stop'):
+            raise ValueError(f"Unknown service action: {action}")
+        desired = 'running' if action == 'start' else 'stopped'
+        with self._lock:
+            self._state[f"{service}_desired"] = desired
+            self._changed()
+        queue = self._queues.get(service)
+        if queue is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(queue.put_nowait, action)
+
+    def set_status(self, service, status):
+        """Record the actual status of a service. No-op if it did not change."""
+        with self._lock:
+            if self._state.get(service) == status:
+                return
+            self._state[service] = status
+            self._changed()
+
+    def get_state(self):
+        """Return (version, copy of the state dict)."""
+        with self._lock:
+            return self.version, dict(self._state)
+
+
+control_plane = ControlPlane()
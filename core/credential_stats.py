@@ -0,0 +1,122 @@
+import threading
+import time
+from array import array
+
+# Failed login events (with user and password fields) fed to credential_stats
+CREDENTIAL_EVENTS = ("ssh.login_failed", "ftp.login_failed", "web.login_failed")
+
+
+class CountMinSketch:
+    """
+    Approximate counts in a fixed depth x width table; never underestimates.
+    Row positions come from the two halves of one 64-bit hash (double
+    hashing), and only the smallest counters are raised (conservative
+    update), which keeps overestimates low for a skewed stream.
+    """
+
+    def __init__(self, width=4096, depth=4):
+        self.width = width
+        self.depth = depth
+        self._rows = [array("Q", bytes(8 * width)) for _ in range(depth)]
+
+    def add(self, item):
+        """Count one occurrence of `item` and return its new estimate."""
+        h = hash(item) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        slots = [(row, (h1 + k * h2) % self.width) for k, row in enumerate(self._rows)]
+        estimate = min(row[i] for row, i in slots) + 1
+        for row, i in slots:
+            if row[i] < estimate:
+                row[i] = estimate
+        return estimate
+
+
+class TopK:
+    """
+    Heavy hitters: a count-min sketch for estimates plus the k items with the
+    highest estimate seen so far. Memory is fixed by k and the sketch size.
+    """
+
+    def __init__(self, k=50, width=4096, depth=4):
+        self.k = k
+        self._sketch = CountMinSketch(width, depth)
+        self._top = {}
+        self._min_item = None
+
+    def add(self, item):
+        count = self._sketch.add(item)
+        if item in self._top:
+            self._top[item] = count
+            if item == self._min_item:
+                self._min_item = None
+            return
+        if len(self._top) < self.k:
+            self._top[item] = count
+            self._min_item = None
+            return
+        if self._min_item is None:
+            self._min_item = min(self._top, key=self._top.get)
+        if count > self._top[self._min_item]:
+            del self._top[self._min_item]
+            self._top[item] = count
+            self._min_item = None
+
+    def most_common(self, n=None):
+        items = sorted(self._top.items(), key=lambda kv: kv[1], reverse=True)
+        return items if n is None else items[:n]
+
+
+class CredentialStats:
+    """
+    Running top-K of usernames, passwords, (username, password) pairs and
+    source IPs over the failed logins of every service, plus exact totals
+    per service. Each attempt costs a few hash updates; memory stays fixed no
+    matter how many distinct credentials are tried. Counts are estimates
+    (they may be slightly high for rare items) and reset on restart; the
+    logs and the event store keep the exact history.
+    """
+
+    def __init__(self, k=50, width=4096, depth=4):
+        self._lock = threading.Lock()
+        self._k = k
+        self._width = width
+        self._depth = depth
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.total = 0
+            self.by_service = {}
+            self.usernames = TopK(self._k, self._width, self._depth)
+            self.passwords = TopK(self._k, self._width, self._depth)
+            self.pairs = TopK(self._k, self._width, self._depth)
+            self.src_ips = TopK(self._k, self._width, self._depth)
+
+    def record(self, service, src_ip=None, user=None, password=None):
+        user = "" if user is None else str(user)
+        password = "" if password is None else str(password)
+        with self._lock:
+            self.total += 1
+            self.by_service[service] = self.by_service.get(service, 0) + 1
+            self.usernames.add(user)
+            self.passwords.add(password)
+            self.pairs.add((user, password))
+            if src_ip:
+                self.src_ips.add(src_ip)
+
+    def snapshot(self, n=20):
+        """Top `n` of each kind, as plain JSON-friendly data."""
+        with self._lock:
+            return {
+                "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+                "total": self.total,
+                "by_service": dict(self.by_service),
+                "usernames": [{"user": u, "count": c} for u, c in self.usernames.most_common(n)],
+                "passwords": [{"password": p, "count": c} for p, c in self.passwords.most_common(n)],
+                "pairs": [{"user": u, "password": p, "count": c} for (u, p), c in self.pairs.most_common(n)],
+                "src_ips": [{"src_ip": ip, "count": c} for ip, c in self.src_ips.most_common(n)],
+            }
+
+
+credential_stats = CredentialStats()
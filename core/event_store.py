@@ -0,0 +1,116 @@
+import json
+import os
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    level TEXT NOT NULL,
+    service TEXT NOT NULL,
+    event TEXT,
+    src_ip TEXT,
+    user TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts);
+CREATE INDEX IF NOT EXISTS idx_events_service_ts ON events(service, ts);
+CREATE INDEX IF NOT EXISTS idx_events_src_ip_ts ON events(src_ip, ts);
+CREATE INDEX IF NOT EXISTS idx_events_event_ts ON events(event, ts);
+"""
+
+# Columns that can be filtered on with an exact match
+FILTER_COLUMNS = ("service", "event", "src_ip", "user", "level")
+
+
+class EventStore:
+    """
+    SQLite (WAL mode) copy of every log record, for fast queries such as
+    "all events from IP X in the last hour" across services.
+
+    Writes go through one connection guarded by a lock and are inserted a
+    batch at a time in a single transaction. Each reading thread gets its
+    own connection; WAL lets readers run while the writer commits.
+    """
+
+    def __init__(self, path="logs/events.db"):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._write_lock = threading.Lock()
+        self._writer = sqlite3.connect(path, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._writer.executescript(SCHEMA)
+        self._writer.commit()
+        self._local = threading.local()
+
+    def insert_many(self, rows):
+        """
+        rows: iterable of (ts, level, service, event, fields, line) where line
+        is the already serialized JSON record.
+        """
+        params = [
+            (ts, level, service, event, fields.get("src_ip"), fields.get("user"), line)
+            for ts, level, service, event, fields, line in rows
+        ]
+        if not params:
+            return
+        with self._write_lock:
+            with self._writer:
+                self._writer.executemany(
+                    "INSERT INTO events (ts, level, service, event, src_ip, user, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    params,
+                )
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def query(self, since=None, until=None, before=None, limit=100, **filters):
+        """
+        Return matching records, newest first, as dicts (the logged JSON plus
+        "id" and "ts" keys). `since`/`until` are epoch seconds. `before` is a
+        (ts, id) pair, normally the last record of the previous page, and
+        continues from there (keyset pagination, no OFFSET scans).
+        Supported filters: service, event, src_ip, user, level.
+        """
+        clauses = []
+        params = []
+        for column in FILTER_COLUMNS:
+            value = filters.get(column)
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        if before is not None:
+            clauses.append("(ts, id) < (?, ?)")
+            params.extend(before)
+        sql = "SELECT id, ts, data FROM events"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        # Every index ends with (ts, rowid), so this order needs no sort step
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(int(limit))
+        results = []
+        for row_id, ts, data in self._reader().execute(sql, params):
+            try:
+                record = json.loads(data)
+            except ValueError:
+                record = {"message": data}
+            record["id"] = row_id
+            record["ts"] = ts
+            results.append(record)
+        return results
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
@@ -1,9 +1,178 @@
 from loguru import logger
 import os
 import json
+import time
+import queue
+import atexit
+import random
+import threading
+from collections import OrderedDict
+from core.broadcaster import broadcaster
+from core.credential_stats import CREDENTIAL_EVENTS, credential_stats
+from core.event_store import EventStore
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
+
+# Sentinel pushed onto the queue to tell the writer thread to flush and exit
+_STOP = object()
+
+
+def dumps_line(obj):
+    """Serialize one log record to a single JSON line."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode("utf-8")
+    return json.dumps(obj, default=str, ensure_ascii=False)
+
+
+def _format_time(ts):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+class _Group:
+    __slots__ = ("first", "last", "count", "examples")
+
+    def __init__(self, record):
+        self.first = record
+        self.last = record[0]
+        self.count = 1
+        self.examples = [record[4]]
+
+
+class EventAggregator:
+    """
+    Collapses repeated events into one record per time window.
+
+    Events listed in `events` (name -> key field names) are grouped by event
+    name, src_ip and the values of their key fields. A group is closed
+    `window` seconds after its first event. If it saw a single event, that
+    event is emitted unchanged; otherwise one record is emitted carrying the
+    key fields, count, first_seen, last_seen and up to `max_examples` full
+    field sets sampled uniformly from the group (reservoir sampling). At most
+    `max_groups` groups are open; beyond that the oldest one is closed early.
+    """
+
+    def __init__(self, events, window=10.0, max_examples=3, max_groups=10000):
+        self.events = {name: tuple(keys or ()) for name, keys in events.items()}
+        self.window = float(window)
+        self.max_examples = max(1, int(max_examples))
+        self.max_groups = max(1, int(max_groups))
+        self._lock = threading.Lock()
+        # Insertion order is also expiry order, since every group lives `window` seconds
+        self._groups = OrderedDict()
+        self.collapsed = 0
+
+    def add(self, record):
+        """
+        Take a record if its event is aggregated. Returns (taken, closed) where
+        closed lists records of groups evicted to stay under max_groups.
+        """
+        ts, level, service, event, fields = record
+        keys = self.events.get(event)
+        if keys is None:
+            return False, []
+        key = (event, fields.get("src_ip")) + tuple(self._hashable(fields.get(k)) for k in keys)
+        closed = []
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                self._groups[key] = _Group(record)
+                while len(self._groups) > self.max_groups:
+                    closed.append(self._close(self._groups.popitem(last=False)[1]))
+                return True, closed
+            group.count += 1
+            group.last = ts
+            self.collapsed += 1
+            if len(group.examples) < self.max_examples:
+                group.examples.append(fields)
+            else:
+                slot = random.randrange(group.count)
+                if slot < self.max_examples:
+                    group.examples[slot] = fields
+        return True, closed
+
+    @staticmethod
+    def _hashable(value):
+        try:
+            hash(value)
+        except TypeError:
+            return str(value)
+        return value
+
+    def _close(self, group):
+        ts, level, service, event, fields = group.first
+        if group.count == 1:
+            return group.first
+        summary = {"src_ip": fields.get("src_ip")}
+        for key in self.events[event]:
+            if key in fields:
+                summary[key] = fields[key]
+        summary.update(
+            aggregated=True,
+            count=group.count,
+            first_seen=_format_time(ts),
+            last_seen=_format_time(group.last),
+            examples=group.examples,
+        )
+        return (ts, level, service, event, summary)
+
+    def expired(self, now=None, flush_all=False):
+        """Close and return the records of groups whose window has ended."""
+        deadline = (time.time() if now is None else now) - self.window
+        closed = []
+        with self._lock:
+            while self._groups:
+                key, group = next(iter(self._groups.items()))
+                if not flush_all and group.first[0] > deadline:
+                    break
+                del self._groups[key]
+                closed.append(self._close(group))
+        return closed
+
+    def pending(self):
+        with self._lock:
+            return len(self._groups)
+
 
 class Logger:
-    def __init__(self):
+    """
+    Central honeypot logger.
+
+    In "sync" mode (default) every record is written to its service log file
+    from the calling thread. In "batched" mode producers only push a record on
+    a bounded queue and a single background writer flushes them to disk in
+    batches of at most `max_batch_size` records or every `flush_interval`
+    seconds, whichever comes first.
+
+    Options (all optional, usually the `logging` section of honeypot.yaml):
+        mode: sync | batched
+        max_batch_size: max records written per flush (default 256)
+        flush_interval: max seconds a record waits in the queue (default 0.5)
+        queue_size: max queued records before backpressure (default 10000)
+        overflow: drop | block - what producers do when the queue is full
+        block_timeout: seconds to wait in "block" mode before dropping (default 1.0)
+        event_store: {enabled: bool, path: str} - also insert every record in
+            a SQLite event store (see core.event_store) for indexed queries
+        aggregation: {enabled: bool, window: seconds, max_examples: int,
+            max_groups: int, events: {event name: [key fields]}} - collapse
+            repeated events (see EventAggregator)
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.mode = config.get("mode", "sync")
+        self.max_batch_size = max(1, int(config.get("max_batch_size", 256)))
+        self.flush_interval = float(config.get("flush_interval", 0.5))
+        self.queue_size = int(config.get("queue_size", 10000))
+        self.overflow = config.get("overflow", "drop")
+        self.block_timeout = float(config.get("block_timeout", 1.0))
+        store_config = config.get("event_store") or {}
+        self.event_store = None
+        if store_config.get("enabled", False):
+            self.event_store = EventStore(store_config.get("path", "logs/events.db"))
+
         os.makedirs("logs", exist_ok=True)
         logger.remove()
         self.ssh_logger = logger.bind(service="ssh")
@@ -11,41 +180,277 @@ class Logger:
         self.smb_logger = logger.bind(service="smb")
         self.ftp_logger = logger.bind(service="ftp")
         self.web_logger = logger.bind(service="web")
-        # Use JSON format for easier parsing
-        log_format = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {extra[service]} | {message}"
-        json_format = '{{"timestamp": "{time:YYYY-MM-DD HH:mm:ss}", "level": "{level}", "service": "{extra[service]}", "message": "{message}"}}'
-        logger.add("logs/ssh_honeypot.log", rotation="1 MB", filter=lambda record: record["extra"].get("service") == "ssh", format=json_format)
-        logger.add("logs/dns_honeypot.log", rotation="1 MB", filter=lambda record: record["extra"].get("service") == "dns", format=json_format)
+        self.core_logger = logger.bind(service="core")
+        self._loggers = {
+            "ssh": self.ssh_logger,
+            "dns": self.dns_logger,
+            "smb": self.smb_logger,
+            "ftp": self.ftp_logger,
+            "web": self.web_logger,
+            "core": self.core_logger,  # orchestrator health (event loop)
+        }
+        # Lines are serialized to JSON by _format_line, so the sinks only
+        # write the message. This lets one loguru call carry a whole batch.
+        logger.add("logs/ssh_honeypot.log", rotation="1 MB", filter=lambda record: record["extra"].get("service") == "ssh", format="{message}")
+        logger.add("logs/dns_honeypot.log", rotation="1 MB", filter=lambda record: record["extra"].get("service") == "dns", format="{message}")
+
+        logger.add("logs/ftp_honeypot.log", rotation="1 MB", filter=lambda record: record["extra"].get("service") == "ftp", format="{message}")
+        logger.add("logs/web_honeypot.log", rotation="1 MB", filter=lambda record: record["extra"].get("service") == "web", format="{message}")
+        logger.add("logs/core_honeypot.log", rotation="1 MB", filter=lambda record: record["extra"].get("service") == "core", format="{message}")
+
+        # Counters, exposed through stats()
+        self._stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
 
-        logger.add("logs/ftp_honeypot.log", rotation="1 MB", filter=lambda record: record["extra"].get("service") == "ftp", format=json_format)
-        logger.add("logs/web_honeypot.log", rotation="1 MB", filter=lambda record: record["extra"].get("service") == "web", format=json_format)
+        self._queue = None
+        self._writer_thread = None
+        self._closed = False
+        if self.mode == "batched":
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._writer_thread = threading.Thread(target=self._writer_loop, name="honeypot-log-writer", daemon=True)
+            self._writer_thread.start()
+        aggregation = config.get("aggregation") or {}
+        self.aggregator = None
+        self._aggregator_stop = threading.Event()
+        self._aggregator_thread = None
+        if aggregation.get("enabled", False) and aggregation.get("events"):
+            self.aggregator = EventAggregator(
+                aggregation["events"],
+                window=aggregation.get("window", 10.0),
+                max_examples=aggregation.get("max_examples", 3),
+                max_groups=aggregation.get("max_groups", 10000),
+            )
+            self._aggregator_thread = threading.Thread(target=self._aggregator_loop, name="honeypot-log-aggregator", daemon=True)
+            self._aggregator_thread.start()
+        if self._writer_thread is not None or self._aggregator_thread is not None:
+            atexit.register(self.close)
 
     def info(self, msg, service="ssh"):
-        if service == "ssh":
-            self.ssh_logger.info(msg)
-        elif service == "dns":
-            self.dns_logger.info(msg)
-        elif service == "ftp":
-            self.ftp_logger.info(msg)
-        elif service == "web":
-            self.web_logger.info(msg)
+        self._log("INFO", service, None, {"message": msg})
 
     def warning(self, msg, service="ssh"):
-        if service == "ssh":
-            self.ssh_logger.warning(msg)
-        elif service == "dns":
-            self.dns_logger.warning(msg)
-        elif service == "ftp":
-            self.ftp_logger.warning(msg)
-        elif service == "web":
-            self.web_logger.warning(msg)
+        self._log("WARNING", service, None, {"message": msg})
 
     def error(self, msg, service="ssh"):
-        if service == "ssh":
-            self.ssh_logger.error(msg)
-        elif service == "dns":
-            self.dns_logger.error(msg)
-        elif service == "ftp":
-            self.ftp_logger.error(msg)
-        elif service == "web":
-            self.web_logger.error(msg)
+        self._log("ERROR", service, None, {"message": msg})
+
+    def event(self, name, level="INFO", **fields):
+        """
+        Log a structured event, e.g.
+            logger.event("ssh.login_failed", level="WARNING", src_ip=ip, user=u, password=p)
+        The service is the part of the name before the first dot. Fields are
+        stored as-is and serialized to JSON once, by the writer.
+        """
+        service = name.split(".", 1)[0]
+        if name in CREDENTIAL_EVENTS:
+            self.record_credentials(service, fields.get("src_ip"), fields.get("user"), fields.get("password"))
+        self._log(level, service, name, fields)
+
+    def record_credentials(self, service, src_ip, user, password):
+        """
+        Count a failed login in the credential stats without logging it, for
+        attempts whose log line was sampled out by the rate limiter.
+        """
+        credential_stats.record(service, src_ip, user, password)
+
+    def _log(self, level, service, event, fields):
+        if service not in self._loggers:
+            return
+        record = (time.time(), level, service, event, fields)
+        if self.aggregator is not None and not self._closed:
+            taken, closed = self.aggregator.add(record)
+            for closed_record in closed:
+                self._emit(closed_record)
+            if taken:
+                return
+        self._emit(record)
+
+    def _emit(self, record):
+        if self._queue is None or self._closed:
+            self._write_batch([record])
+            return
+        try:
+            if self.overflow == "block":
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return
+        with self._stats_lock:
+            self.enqueued += 1
+
+    def _aggregator_loop(self):
+        # Close expired groups a few times per window
+        tick = min(1.0, max(0.1, self.aggregator.window / 4))
+        while not self._aggregator_stop.wait(tick):
+            for record in self.aggregator.expired():
+                self._emit(record)
+
+    @staticmethod
+    def _format_line(record):
+        ts, level, service, event, fields = record
+        line = {
+            "timestamp": _format_time(ts),
+            "level": level,
+            "service": service,
+        }
+        if event:
+            line["event"] = event
+        for key, value in fields.items():
+            # Record metadata always wins over event fields of the same name
+            if key not in line:
+                line[key] = value
+        return dumps_line(line)
+
+    def _write_batch(self, batch):
+        # Group by service so each log file gets a single write per batch
+        lines = {}
+        store_rows = []
+        for record in batch:
+            line = self._format_line(record)
+            lines.setdefault(record[2], []).append(line)
+            if self.event_store is not None:
+                store_rows.append(record + (line,))
+        if store_rows:
+            try:
+                self.event_store.insert_many(store_rows)
+            except Exception:
+                # The text logs stay the source of truth
+                pass
+        for service, service_lines in lines.items():
+            self._loggers[service].info("\n".join(service_lines))
+            # Live feed for the admin dashboard, reusing the serialized lines
+            if broadcaster.has_subscribers:
+                broadcaster.publish_many('log', service_lines)
+        with self._stats_lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    def _writer_loop(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(batch)
+            except Exception:
+                with self._stats_lock:
+                    self.dropped += len(batch)
+        # Flush whatever was queued after the stop request
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        if batch:
+            self._write_batch(batch)
+
+    def stats(self):
+        """Return writer counters (useful for the admin panel and debugging)."""
+        with self._stats_lock:
+            return {
+                "mode": self.mode,
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "written": self.written,
+                "batches": self.batches,
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "aggregated": self.aggregator.collapsed if self.aggregator is not None else 0,
+            }
+
+    def close(self, timeout=5.0):
+        """Flush pending records and stop the background writer (batched mode)."""
+        if self._closed:
+            return
+        if self._aggregator_thread is not None:
+            self._aggregator_stop.set()
+            self._aggregator_thread.join(timeout)
+            # Emit the groups still open, before the writer stops
+            for record in self.aggregator.expired(flush_all=True):
+                self._emit(record)
+        self._closed = True
+        if self.aggregator is not None:
+            # Groups opened by producers racing with close(); written directly
+            for record in self.aggregator.expired(flush_all=True):
+                self._emit(record)
+        if self._writer_thread is not None:
+            # Never drop the stop sentinel, even if the queue is full
+            self._queue.put(_STOP)
+            self._writer_thread.join(timeout)
+        if self.event_store is not None:
+            store, self.event_store = self.event_store, None
+            store.close()
+
+
+class QueueLogger:
+    """
+    Logger stand-in for child processes: every call is forwarded over a
+    multiprocessing queue to forward_log_events() in the parent, which owns
+    the log files. Calls never block; if the queue is full the record is
+    dropped and counted.
+    """
+
+    def __init__(self, event_queue):
+        self._queue = event_queue
+        self.dropped = 0
+        self.event_store = None
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def info(self, msg, service="ssh"):
+        self._put(("info", (msg,), {"service": service}))
+
+    def warning(self, msg, service="ssh"):
+        self._put(("warning", (msg,), {"service": service}))
+
+    def error(self, msg, service="ssh"):
+        self._put(("error", (msg,), {"service": service}))
+
+    def event(self, name, level="INFO", **fields):
+        fields["level"] = level
+        self._put(("event", (name,), fields))
+
+    def record_credentials(self, service, src_ip, user, password):
+        # Counted by the parent, where the admin panel reads the stats
+        self._put(("record_credentials", (service, src_ip, user, password), {}))
+
+
+def forward_log_events(event_queue, target):
+    """Replay QueueLogger calls on `target` until a None sentinel arrives."""
+    while True:
+        item = event_queue.get()
+        if item is None:
+            break
+        method, args, kwargs = item
+        try:
+            getattr(target, method)(*args, **kwargs)
+        except Exception:
+            pass
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+
+try:
+    import uvloop
+except ImportError:  # optional, the stdlib loop is used without it
+    uvloop = None
+
+DEFAULTS = {
+    "enabled": True,
+    "interval": 0.5,  # seconds between lag samples
+    "report_every": 60,  # seconds between core.loop_stats records
+    "lag_warning": 0.25,  # seconds late a wakeup must be to log core.loop_lag
+    "blocked_threshold": 0.5,  # seconds one callback may hold the loop before core.loop_blocked
+}
+
+
+def loop_factory(implementation="auto"):
+    """
+    Return (name, factory) for the event loop selected by
+    event_loop.implementation: "auto" (uvloop when installed), "uvloop" or
+    "asyncio". A factory of None means asyncio's default loop.
+    """
+    if implementation not in ("auto", "uvloop", "asyncio"):
+        raise ValueError(f"Unknown event loop implementation: {implementation}")
+    if implementation == "asyncio" or (implementation == "auto" and uvloop is None):
+        return "asyncio", None
+    if uvloop is None:
+        raise RuntimeError("event_loop.implementation is uvloop but uvloop is not installed")
+    return "uvloop", uvloop.new_event_loop
+
+
+class LoopMonitor:
+    """
+    Health of the orchestrator's event loop.
+
+    A coroutine sleeps `interval` seconds at a time and measures how late
+    each wakeup is (loop lag); it also counts live tasks. A watchdog thread
+    checks that those wakeups keep coming: when the loop has been stuck for
+    blocked_threshold seconds it grabs the loop thread's stack, so the
+    callback that blocks it is named in a core.loop_blocked event. This
+    costs nothing per callback, unlike asyncio's debug mode.
+
+    A core.loop_stats record is written every report_every seconds, with one
+    core.loop_lag warning at most per report period while the loop is late.
+    stats() backs /admin/api/loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.implementation = None
+        self.configure(None)
+        self._reset_window()
+        self.last_lag = 0.0
+        self.tasks = 0
+        self.blocked = 0
+        self.last_blocked = None
+
+    def configure(self, config):
+        config = config or {}
+        self.settings = {k: config.get(k, v) for k, v in DEFAULTS.items()}
+        self.interval = float(self.settings["interval"])
+        self.report_every = float(self.settings["report_every"])
+        self.lag_warning = float(self.settings["lag_warning"])
+        self.blocked_threshold = float(self.settings["blocked_threshold"])
+
+    def _reset_window(self):
+        self.samples = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.late = 0
+
+    async def run(self, logger):
+        loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        watchdog = threading.Thread(target=self._watchdog, args=(logger,), name="honeypot-loop-watchdog", daemon=True)
+        watchdog.start()
+        logger.event("core.loop_started", implementation=self.implementation, pid=os.getpid())
+        next_report = loop.time() + self.report_every
+        warned = False
+        try:
+            while True:
+                expected = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                now = loop.time()
+                self._beat = time.monotonic()
+                lag = max(0.0, now - expected)
+                tasks = len(asyncio.all_tasks(loop))
+                with self._lock:
+                    self.last_lag = lag
+                    self.tasks = tasks
+                    self.samples += 1
+                    self.lag_total += lag
+                    self.lag_max = max(self.lag_max, lag)
+                    if lag >= self.lag_warning:
+                        self.late += 1
+                if lag >= self.lag_warning and not warned:
+                    warned = True
+                    logger.event("core.loop_lag", level="WARNING", lag_ms=round(lag * 1000, 1), tasks=tasks)
+                if now >= next_report:
+                    next_report = now + self.report_every
+                    warned = False
+                    logger.event("core.loop_stats", **self._window_stats(reset=True))
+        finally:
+            self._stop.set()
+
+    def _watchdog(self, logger):
+        reported = None
+        check = max(self.blocked_threshold / 2, 0.05)
+        while not self._stop.wait(check):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.blocked_threshold or beat == reported:
+                continue
+            # Once per stall: where is the loop thread right now?
+            reported = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            where = ""
+            if frame is not None:
+                where = " <- ".join(
+                    f"{os.path.basename(f.filename)}:{f.lineno} {f.name}"
+                    for f in reversed(traceback.extract_stack(frame, limit=8)[-3:])
+                )
+            with self._lock:
+                self.blocked += 1
+                self.last_blocked = {"blocked_ms": round(stalled * 1000, 1), "where": where,
+                                     "at": time.strftime("%Y-%m-%d %H:%M:%S")}
+            logger.event("core.loop_blocked", level="WARNING", blocked_ms=round(stalled * 1000, 1), where=where)
+
+    def _window_stats(self, reset=False):
+        with self._lock:
+            stats = {
+                "implementation": self.implementation,
+                "lag_avg_ms": round(self.lag_total / self.samples * 1000, 1) if self.samples else 0.0,
+                "lag_max_ms": round(self.lag_max * 1000, 1),
+                "late_wakeups": self.late,
+                "tasks": self.tasks,
+                "blocked": self.blocked,
+            }
+            if reset:
+                self._reset_window()
+        return stats
+
+    def stats(self):
+        stats = self._window_stats()
+        with self._lock:
+            stats["lag_ms"] = round(self.last_lag * 1000, 1)
+            stats["last_blocked"] = self.last_blocked
+        return stats
+
+
+loop_monitor = LoopMonitor()
@@ -1,12 +1,14 @@
 import asyncio
+import functools
 import subprocess
 import os
 import time
 from services.ssh import ssh_service
 from services.dns import dns_service
 from services.ftp.ftp_service import start_ftp_server
-from services.web.web_honeypot import app as web_app
 from services.web.init_pms_db import PMSDatabaseInitializer
+from core.control_plane import control_plane
+from core.loop_monitor import loop_factory, loop_monitor
 import threading
 
 class HoneypotOrchestrator:
@@ -33,32 +35,29 @@ class HoneypotOrchestrator:
             tasks.append(self.web_service_watcher())
 
         # Ensure PMS DB is initialized before starting web honeypot
+        # (the server itself is started once, by web_service_watcher)
         if self.config["services"].get("web", {}).get("enabled", False):
-            PMSDatabaseInitializer.initialize(self.config)
-
-        # Start the web honeypot in a background thread if enabled
-        if self.config["services"].get("web", {}).get("enabled", False):
-            port = self.config["services"]["web"].get("port", 8080)
-            def run_web():
-                web_app.run(host='0.0.0.0', port=port, debug=False)
-            t = threading.Thread(target=run_web, daemon=True)
-            t.start()
-            self.logger.info(f"Web honeypot started on port {port}", service="web")
+            PMSDatabaseInitializer.initialize(self.config, self.logger)
 
         # Start the admin panel in a background thread if enabled
         if self.config["services"].get("admin", {}).get("enabled", False):
             admin_port = self.config["services"]["admin"].get("port", 6000)
             from services.admin.admin_service import run_admin_app
             def run_admin():
-                run_admin_app(port=admin_port)
+                run_admin_app(port=admin_port, logger=self.logger)
             t = threading.Thread(target=run_admin, daemon=True)
             t.start()
             self.logger.info(f"Admin panel started on port {admin_port}", service="admin")
 
         # Run all enabled service watchers concurrently
         if tasks:
+            loop_config = self.config.get("event_loop") or {}
+            implementation, factory = loop_factory(loop_config.get("implementation", "auto"))
+            loop_monitor.implementation = implementation
+            loop_monitor.configure(loop_config.get("monitor"))
             try:
-                asyncio.run(self.run_services(tasks))
+                with asyncio.Runner(loop_factory=factory) as runner:
+                    runner.run(self.run_services(tasks))
             except (KeyboardInterrupt, SystemExit):
                 print("\n[!] Honeypot interrupted by user. Shutting down...")
                 # Log shutdown for all services
@@ -67,84 +66,74 @@ class HoneypotOrchestrator:
                 self.logger.info("Honeypot interrupted by user. Shutting down...", service="smb")
                 self.logger.info("Honeypot interrupted by user. Shutting down...", service="ftp")
                 self.logger.info("Honeypot interrupted by user. Shutting down...", service="web")
+            finally:
+                if self.config["services"].get("web", {}).get("enabled", False):
+                    from services.web import web_honeypot
+                    web_honeypot.stop_web_server()
+                # Flush any queued log records before the process exits
+                self.logger.close()
 
     async def run_services(self, services):
+        # Admin actions are delivered to the watchers through this loop
+        control_plane.attach(asyncio.get_running_loop())
+        if loop_monitor.settings["enabled"]:
+            services = [*services, loop_monitor.run(self.logger)]
         # Run all service watcher coroutines concurrently
         await asyncio.gather(*services)
 
 
-    async def generic_service_watcher(self, service_name, desired_key, status_key, start_func, stop_func, task_attr):
+    async def generic_service_watcher(self, service_name, start_func, stop_func, task_attr):
         """
         Generic watcher for services.
         service_name: e.g. 'ssh', 'ftp', 'dns', 'smb'
-        desired_key: e.g. 'ssh_desired'
-        status_key: e.g. 'ssh'
         start_func: function to start the service (should be a coroutine)
         stop_func: function to stop the service (should be a coroutine)
         task_attr: attribute name for the asyncio task (e.g. 'ssh_task')
+
+        Sleeps on the control plane command queue and reconciles the service
+        with its desired state whenever the admin panel sends a command. A
+        service task that exits on its own (e.g. port in use) is not restarted
+        until the next start command; its status becomes "error" if it raised
+        (logged as core.service_failed) or "stopped" otherwise.
         """
-        import json
-        status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../logs/service_status.json'))
-        running = False
-        # Ensure the status file exists and is initialized with all required keys
-        initial_keys = [desired_key, status_key]
-        if not os.path.exists(status_file):
-            data = {k: 'running' for k in initial_keys}
-            try:
-                with open(status_file, 'w') as f:
-                    json.dump(data, f)
-            except Exception:
-                pass
+        commands = control_plane.register(service_name)
         while True:
-            desired = 'running'
-            try:
-                if os.path.exists(status_file):
-                    with open(status_file, 'r') as f:
-                        data = json.load(f)
-                else:
-                    data = {k: 'running' for k in initial_keys}
-                # Ensure all required keys are present
-                for k in initial_keys:
-                    if k not in data:
-                        data[k] = 'running'
-                desired = data.get(desired_key, 'running')
-            except Exception:
-                data = {k: 'running' for k in initial_keys}
+            desired = control_plane.desired(service_name)
+            task = getattr(self, task_attr, None)
+            running = task is not None and not task.done()
             if desired == 'running' and not running:
                 # Start service as an asyncio task
                 task = asyncio.create_task(start_func(self.config, self.logger))
+                task.add_done_callback(functools.partial(self._service_task_done, service_name, task_attr))
                 setattr(self, task_attr, task)
-                running = True
-                # Set status to running in status file
-                try:
-                    data[status_key] = 'running'
-                    with open(status_file, 'w') as f:
-                        json.dump(data, f)
-                except Exception:
-                    pass
+                control_plane.set_status(service_name, 'running')
             elif desired == 'stopped' and running:
                 # Stop service and update status
                 await stop_func()
-                task = getattr(self, task_attr, None)
-                if task:
-                    task.cancel()
-                    setattr(self, task_attr, None)
-                running = False
-                try:
-                    data[status_key] = 'stopped'
-                    with open(status_file, 'w') as f:
-                        json.dump(data, f)
-                except Exception:
-                    pass
-            await asyncio.sleep(2)
+                task.cancel()
+                setattr(self, task_attr, None)
+                control_plane.set_status(service_name, 'stopped')
+            await commands.get()
+
+    def _service_task_done(self, service_name, task_attr, task):
+        """Done callback of a service task: record why it ended."""
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.logger.event("core.service_failed", level="ERROR", service=service_name,
+                              error=str(error), error_type=type(error).__name__)
+            if getattr(self, task_attr, None) is task:
+                control_plane.set_status(service_name, 'error')
+        elif getattr(self, task_attr, None) is task and control_plane.status(service_name) == 'running':
+            # Returned by itself; an "error" it set on the way out is kept
+            control_plane.set_status(service_name, 'stopped')
 
     # Wrappers for each service watcher
     async def ssh_service_watcher(self):
         from services.ssh import ssh_service
         return await self.generic_service_watcher(
             service_name='ssh',
-            desired_key='ssh_desired',
-            status_key='ssh',
             start_func=ssh_service.start_ssh_server,
             stop_func=ssh_service.stop_ssh_server,
             task_attr='ssh_task'
@@ -154,8 +143,6 @@ class HoneypotOrchestrator:
         from services.ftp import ftp_service
         return await self.generic_service_watcher(
             service_name='ftp',
-            desired_key='ftp_desired',
-            status_key='ftp',
             start_func=ftp_service.start_ftp_server,
             stop_func=ftp_service.stop_ftp_server,
             task_attr='ftp_task'
@@ -165,8 +152,6 @@ class HoneypotOrchestrator:
         from services.dns import dns_service
         return await self.generic_service_watcher(
             service_name='dns',
-            desired_key='dns_desired',
-            status_key='dns',
             start_func=dns_service.start_dns_server,
             stop_func=dns_service.stop_dns_server,
             task_attr='dns_task'
@@ -176,8 +161,6 @@ class HoneypotOrchestrator:
         from services.smb import smb_service
         return await self.generic_service_watcher(
             service_name='smb',
-            desired_key='smb_desired',
-            status_key='smb',
             start_func=smb_service.start_smb_server,
             stop_func=smb_service.stop_smb_server,
             task_attr='smb_task'
@@ -185,44 +168,21 @@ class HoneypotOrchestrator:
 
     async def web_service_watcher(self):
         # Watches the desired state for the web honeypot and blocks/unblocks access accordingly
-        import json
         from services.web import web_honeypot
-        status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../logs/service_status.json'))
-        port = self.config["services"]["web"].get("port", 8080)
-        # Ensure web server is running in a background thread
-        if not hasattr(web_honeypot, 'web_server_thread') or not web_honeypot.web_server_thread or not web_honeypot.web_server_thread.is_alive():
+        commands = control_plane.register('web')
+        # Start the web server once; stop/start from the admin panel only blocks/unblocks it
+        if web_honeypot.web_server is None or not web_honeypot.web_server.is_alive():
+            port = self.config["services"]["web"].get("port", 8080)
             try:
                 web_honeypot.start_web_server(self.config, self.logger)
+                self.logger.info(f"Web honeypot started on port {port}", service="web")
             except Exception as e:
                 self.logger.error(f"Failed to start web honeypot: {e}", service="web")
         while True:
-            desired = 'running'
-            try:
-                if os.path.exists(status_file):
-                    with open(status_file, 'r') as f:
-                        data = json.load(f)
-                else:
-                    data = {}
-                desired = data.get('web_desired', 'running')
-            except Exception:
-                data = {}
-            # Always set block flag and update status
-            if desired == 'running':
+            if control_plane.desired('web') == 'running':
                 web_honeypot.set_web_blocked(False)
-                # Set status to running
-                try:
-                    data['web'] = 'running'
-                    with open(status_file, 'w') as f:
-                        json.dump(data, f)
-                except Exception:
-                    pass
+                control_plane.set_status('web', 'running')
             else:
                 web_honeypot.set_web_blocked(True)
-                # Set status to blocked
-                try:
-                    data['web'] = 'blocked'
-                    with open(status_file, 'w') as f:
-                        json.dump(data, f)
-                except Exception:
-                    pass
-            await asyncio.sleep(2)
\ No newline at end of file
+                control_plane.set_status('web', 'blocked')
+            await commands.get()
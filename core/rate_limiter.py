@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+DEFAULTS = {
+    "enabled": False,
+    "rate": 5.0,  # tokens added per second, per source IP
+    "burst": 20,  # bucket size: requests allowed in a burst
+    "action": "delay",  # delay | drop | log_only, once the bucket is empty
+    "tarpit_delay": 2.0,  # seconds, for action "delay"
+    "max_tarpits": 16,  # threads one service may hold in tarpit() at once (0 = unlimited)
+    "sample_every": 50,  # over the limit, report one hit out of this many
+}
+ACTIONS = ("delay", "drop", "log_only")
+
+# allowed: False means the request must be dropped
+# delay: seconds to wait before handling the request (tarpit)
+# log: False means the service should not log this hit (sampled out)
+Verdict = namedtuple("Verdict", "allowed delay log")
+ALLOW = Verdict(True, 0, True)
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "over")
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.over = 0  # hits over the limit since the bucket last had a token
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter keyed by (service, source IP), consulted by
+    every honeypot service before it handles a connection, command or query.
+
+    Buckets live in one LRU-ordered dict capped at max_tracked_ips entries, so
+    a scan from many addresses cannot grow memory without bound; the least
+    recently seen IP is evicted (and starts with a full bucket if it returns).
+
+    When a bucket is empty the service's action applies:
+      delay    - handle the request after tarpit_delay seconds
+      drop     - do not handle it (close the connection / ignore the packet)
+      log_only - handle it normally but only log one hit in sample_every
+    Services that handle each request in its own thread (dns, web) tarpit
+    through tarpit(), which holds at most max_tarpits threads at a time and
+    drops the requests beyond that, so a flood cannot pin every thread.
+    In every case a "<service>.rate_limited" event is logged for the first hit
+    over the limit and then once every sample_every hits, with the running
+    count, so a flood is still recorded without writing every request.
+
+    Settings come from the rate_limit section of honeypot.yaml; the
+    services sub-section overrides them per service.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._tarpitted = Counter()  # service -> threads sleeping in tarpit()
+        self.tarpit_dropped = 0
+        self.configure(None)
+
+    def configure(self, config):
+        """Apply the rate_limit config section (None disables limiting)."""
+        config = config or {}
+        defaults = {k: config.get(k, v) for k, v in DEFAULTS.items()}
+        policies = {}
+        for service, overrides in (config.get("services") or {}).items():
+            policies[service] = dict(defaults, **(overrides or {}))
+        for policy in [defaults, *policies.values()]:
+            if policy["action"] not in ACTIONS:
+                raise ValueError(f"Unknown rate limit action: {policy['action']}")
+        with self._lock:
+            # Kept as given, so worker processes can be configured the same way
+            self.settings = config
+            self.max_tracked_ips = int(config.get("max_tracked_ips", 10000))
+            self._default = defaults
+            self._policies = policies
+            self._buckets.clear()
+            self.limited = 0
+            self.evicted = 0
+
+    def policy(self, service):
+        return self._policies.get(service, self._default)
+
+    def check(self, service, ip, logger=None):
+        """Take one token for `ip` on `service` and return a Verdict."""
+        policy = self.policy(service)
+        if not policy["enabled"] or not ip:
+            return ALLOW
+        rate = float(policy["rate"])
+        burst = float(policy["burst"])
+        now = time.monotonic()
+        key = (service, ip)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = _Bucket(burst, now)
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_tracked_ips:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+                bucket.updated = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                bucket.over = 0
+                return ALLOW
+            bucket.over += 1
+            over = bucket.over
+            self.limited += 1
+        action = policy["action"]
+        report = over == 1 or over % int(policy["sample_every"]) == 0
+        if report and logger is not None:
+            logger.event(f"{service}.rate_limited", level="WARNING", src_ip=ip, action=action,
+                         count=over, rate=rate, burst=burst)
+        if action == "drop":
+            return Verdict(False, 0, False)
+        if action == "delay":
+            return Verdict(True, float(policy["tarpit_delay"]), True)
+        return Verdict(True, 0, report)
+
+    def tarpit(self, service, delay):
+        """
+        Sleep `delay` seconds in the calling thread, unless max_tarpits threads
+        of `service` already are. Returns False if the request must be dropped.
+        """
+        limit = int(self.policy(service)["max_tarpits"] or 0)
+        with self._lock:
+            if limit and self._tarpitted[service] >= limit:
+                self.tarpit_dropped += 1
+                return False
+            self._tarpitted[service] += 1
+        try:
+            time.sleep(delay)
+        finally:
+            with self._lock:
+                self._tarpitted[service] -= 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"tracked": len(self._buckets), "limited": self.limited, "evicted": self.evicted,
+                    "tarpitted": sum(self._tarpitted.values()), "tarpit_dropped": self.tarpit_dropped}
+
+
+rate_limiter = RateLimiter()
@@ -1,9 +1,11 @@
 from core.config_manager import ConfigManager
 from core.logger import Logger
 from core.orchestrator import HoneypotOrchestrator
+from core.rate_limiter import rate_limiter
 
 if __name__ == "__main__":
     config = ConfigManager("config/honeypot.yaml").load()
-    logger = Logger()
+    logger = Logger(config.get("logging"))
+    rate_limiter.configure(config.get("rate_limit"))
     orchestrator = HoneypotOrchestrator(config, logger)
     orchestrator.run()
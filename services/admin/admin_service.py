@@ -1,31 +1,62 @@
-from flask import Flask, render_template, request, redirect, url_for, session, abort, make_response, Response
+from flask import Flask, render_template, request, redirect, url_for, session, abort, make_response, Response, jsonify
 import os
+import time
+import datetime
 from dotenv import load_dotenv
 import re
 import json
-import time
+from services.admin.log_index import get_log_index
+from core.control_plane import control_plane
+from core.broadcaster import broadcaster
+from core.event_store import FILTER_COLUMNS
+from core.credential_stats import credential_stats
+from services.admin.log_tail import LogDirectoryWatcher, LogTail
+from services.admin.log_search import search_logs
+from services.ssh.session_recorder import RECORDINGS_DIR, list_recordings
+from services.ssh.connection_limits import connection_limits
+from core.loop_monitor import loop_monitor
+import threading
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
 LOGS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs'))
+SSE_HEARTBEAT_INTERVAL = 15  # seconds between keepalive comments on idle streams
+MAX_TAIL_STREAMS = 16  # concurrent live log viewers
+
+log_watcher = LogDirectoryWatcher(LOGS_DIR)
+tail_slots = threading.BoundedSemaphore(MAX_TAIL_STREAMS)
 
-# Helper to parse log lines (simple example, can be improved)
+# Keys shown in their own column, everything else is an event field
+_RECORD_KEYS = ('timestamp', 'level', 'service', 'event', 'message')
+_AGGREGATE_KEYS = ('aggregated', 'count', 'first_seen', 'last_seen', 'examples')
+
+def describe_event(log):
+    """Build a one-line display message for a log record."""
+    if log.get('message'):
+        return log['message']
+    if log.get('aggregated'):
+        # Collapsed repeats: show the group key and counts, not the examples
+        fields = ' '.join(f'{k}={v}' for k, v in log.items()
+                          if k not in _RECORD_KEYS + _AGGREGATE_KEYS and v not in (None, ''))
+        return (f"{log.get('event', '')} x{log.get('count')} {fields} "
+                f"({log.get('first_seen')} - {log.get('last_seen')})").strip()
+    fields = ' '.join(f'{k}={v}' for k, v in log.items() if k not in _RECORD_KEYS and v not in (None, ''))
+    return f"{log.get('event', '')} {fields}".strip()
+
+# Helper to parse one page of log lines, most recent first
 def parse_log_file(filepath, page=1, per_page=50):
     entries = []
     try:
-        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-        lines = lines[::-1]  # Most recent first
-        start = (page - 1) * per_page
-        end = start + per_page
-        for line in lines[start:end]:
+        lines = get_log_index(filepath).read_page(page, per_page)
+        for line in lines:
             try:
                 log = json.loads(line)
                 entries.append({
                     'timestamp': log.get('timestamp', ''),
                     'level': log.get('level', ''),
                     'service': log.get('service', ''),
-                    'message': log.get('message', '')
+                    'event': log.get('event', ''),
+                    'message': describe_event(log)
                 })
             except Exception:
                 entries.append({'timestamp': '', 'level': 'ERROR', 'service': '', 'message': line.strip()})
@@ -33,7 +64,26 @@ def parse_log_file(filepath, page=1, per_page=50):
         entries.append({'timestamp': '', 'level': 'ERROR', 'service': '', 'message': f'Could not read log: {e}'})
     return entries
 
-def run_admin_app(port=6000):
+def parse_time(value):
+    """Parse '2025-06-12 08:00[:00]' / ISO format into epoch seconds (local time)."""
+    if not value:
+        return None
+    return datetime.datetime.fromisoformat(value.strip()).timestamp()
+
+def parse_event_query(args):
+    """Turn admin query-string arguments into EventStore.query keyword arguments."""
+    params = {k: args.get(k) for k in FILTER_COLUMNS if args.get(k)}
+    params['limit'] = min(max(int(args.get('limit') or 100), 1), 1000)
+    params['since'] = parse_time(args.get('since'))
+    params['until'] = parse_time(args.get('until'))
+    if args.get('minutes'):
+        params['since'] = time.time() - float(args['minutes']) * 60
+    if args.get('before'):
+        ts, row_id = args['before'].split(':', 1)
+        params['before'] = (float(ts), int(row_id))
+    return params
+
+def run_admin_app(port=6000, logger=None):
     app = Flask(__name__, template_folder='templates', static_folder=None)
     app.secret_key = os.urandom(32)
 
@@ -64,22 +114,15 @@ def run_admin_app(port=6000):
     def dashboard():
         if not session.get('admin_logged_in'):
             return redirect(url_for('login'))
-        # Read status file for all services
-        import json
-        status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/service_status.json'))
-        ssh_status = ftp_status = dns_status = smb_status = web_status = 'unknown'
-        try:
-            if os.path.exists(status_file):
-                with open(status_file, 'r') as f:
-                    data = json.load(f)
-                ssh_status = data.get('ssh', 'unknown')
-                ftp_status = data.get('ftp', 'unknown')
-                dns_status = data.get('dns', 'unknown')
-                web_status = data.get('web', 'unknown')
-        except Exception:
-            pass
+        # Current status of all services, straight from the control plane
+        _, data = control_plane.get_state()
+        ssh_status = data.get('ssh', 'unknown')
+        ftp_status = data.get('ftp', 'unknown')
+        dns_status = data.get('dns', 'unknown')
+        web_status = data.get('web', 'unknown')
         return render_template('logs.html', log_files=get_log_files(),
-            ssh_status=ssh_status, ftp_status=ftp_status, dns_status=dns_status, web_status=web_status)
+            ssh_status=ssh_status, ftp_status=ftp_status, dns_status=dns_status, web_status=web_status,
+            loop=loop_monitor.stats())
 
     @app.route('/admin/logs/<logfile>')
     def view_log(logfile):
@@ -88,18 +131,182 @@ def run_admin_app(port=6000):
         if not logfile.endswith('.log'):
             abort(404)
         log_path = os.path.join(LOGS_DIR, logfile)
-        page = int(request.args.get('page', 1))
+        page = max(1, int(request.args.get('page', 1)))
         per_page = 50
         entries = parse_log_file(log_path, page=page, per_page=per_page)
-        # Count total lines for pagination
-        try:
-            with open(log_path, 'r', encoding='utf-8', errors='ignore') as f:
-                total_lines = len(f.readlines())
-        except Exception:
-            total_lines = 0
+        # Line count comes from the index, no second read of the file
+        total_lines = get_log_index(log_path).total_lines
         total_pages = (total_lines + per_page - 1) // per_page
         return render_template('log_view.html', logfile=logfile, entries=entries, page=page, total_pages=total_pages)
 
+    @app.route('/admin/logs/<logfile>/stream')
+    def stream_log(logfile):
+        """SSE stream of records appended to a log file (live tail)."""
+        if not session.get('admin_logged_in'):
+            abort(403)
+        if not logfile.endswith('.log'):
+            abort(404)
+        log_path = os.path.join(LOGS_DIR, logfile)
+        resume_from = request.headers.get('Last-Event-ID')
+
+        def event_stream():
+            # The slot is taken once the stream runs and held by the try below,
+            # so a client gone before the first chunk or a LogTail error cannot leak it
+            if not tail_slots.acquire(blocking=False):
+                # Ask the browser to come back later instead of hammering us
+                yield "retry: 30000\nevent: busy\ndata: Too many live log viewers\n\n"
+                return
+            try:
+                log_watcher.start()
+                tail = LogTail(log_path, resume_from=resume_from)
+                version = log_watcher.version(tail.path)
+                while True:
+                    lines = tail.read_new_lines()
+                    for line in lines:
+                        yield f"data: {line}\n\n"
+                    if lines:
+                        # One id per batch is enough to resume after a reconnect
+                        yield f"id: {tail.position}\n\n"
+                    new_version = log_watcher.wait(tail.path, version, timeout=SSE_HEARTBEAT_INTERVAL)
+                    if new_version == version:
+                        yield ": keepalive\n\n"
+                    version = new_version
+            finally:
+                tail_slots.release()
+        return Response(event_stream(), mimetype="text/event-stream",
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    @app.route('/admin/api/events')
+    def api_events():
+        """JSON query over the SQLite event store (newest first)."""
+        if not session.get('admin_logged_in'):
+            abort(403)
+        store = logger.event_store if logger else None
+        if store is None:
+            return jsonify({'error': 'event store is disabled'}), 404
+        try:
+            params = parse_event_query(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        results = store.query(**params)
+        next_before = None
+        if len(results) == params['limit']:
+            next_before = f"{results[-1]['ts']}:{results[-1]['id']}"
+        return jsonify({'results': results, 'next_before': next_before})
+
+    @app.route('/admin/search')
+    def search():
+        """Filter records across all service logs (event store when possible)."""
+        if not session.get('admin_logged_in'):
+            return redirect(url_for('login'))
+        entries = []
+        error = None
+        source = None
+        scanned = None
+        form = {k: request.args.get(k, '') for k in ('service', 'level', 'src_ip', 'user', 'event', 'q', 'since', 'until', 'minutes', 'limit', 'source')}
+        if any(form[k] for k in ('service', 'level', 'src_ip', 'user', 'event', 'q', 'since', 'until', 'minutes')):
+            try:
+                params = parse_event_query(request.args)
+            except ValueError as e:
+                params = None
+                error = f'Invalid query: {e}'
+            if params is not None:
+                store = logger.event_store if logger else None
+                # Free-text search is only possible on the raw lines
+                if store is not None and not form['q'] and form['source'] != 'scan':
+                    source = 'index'
+                    records = store.query(**params)
+                else:
+                    source = 'scan'
+                    params.pop('before', None)
+                    try:
+                        records, scanned = search_logs(LOGS_DIR, text=form['q'] or None, **params)
+                    except ValueError as e:
+                        records = []
+                        error = f'Invalid query: {e}'
+                for log in records:
+                    entries.append({
+                        'timestamp': log.get('timestamp', ''),
+                        'level': log.get('level', ''),
+                        'service': log.get('service', ''),
+                        'src_ip': log.get('src_ip', ''),
+                        'message': describe_event(log),
+                    })
+        if request.args.get('format') == 'json':
+            return jsonify({'source': source, 'scanned': scanned, 'results': entries, 'error': error})
+        return render_template('search.html', form=form, entries=entries, error=error, source=source, scanned=scanned)
+
+    @app.route('/admin/credentials')
+    def credentials():
+        """Most tried usernames, passwords, pairs and source IPs (failed logins)."""
+        if not session.get('admin_logged_in'):
+            return redirect(url_for('login'))
+        try:
+            top = max(1, min(int(request.args.get('top') or 20), 50))
+        except ValueError:
+            top = 20
+        return render_template('credentials.html', stats=credential_stats.snapshot(top), top=top)
+
+    @app.route('/admin/api/credentials')
+    def api_credentials():
+        """JSON version of the credentials page (?top=N, at most 50)."""
+        if not session.get('admin_logged_in'):
+            abort(403)
+        try:
+            top = max(1, min(int(request.args.get('top') or 20), 50))
+        except ValueError:
+            return jsonify({'error': 'top must be an integer'}), 400
+        return jsonify(credential_stats.snapshot(top))
+
+    @app.route('/admin/sessions')
+    def sessions():
+        """Recorded SSH sessions, newest first."""
+        if not session.get('admin_logged_in'):
+            return redirect(url_for('login'))
+        recordings = [
+            {'name': name, 'size': size,
+             'mtime': datetime.datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S'),
+             'live': not name.endswith('.gz')}
+            for name, size, mtime in list_recordings()
+        ]
+        return render_template('sessions.html', recordings=recordings)
+
+    @app.route('/admin/sessions/<name>')
+    def play_session(name):
+        if not session.get('admin_logged_in'):
+            return redirect(url_for('login'))
+        if name not in {r[0] for r in list_recordings()}:
+            abort(404)
+        return render_template('session_player.html', name=name)
+
+    @app.route('/admin/sessions/<name>/cast')
+    def session_cast(name):
+        """The asciicast file; compressed recordings are sent gzip-encoded as is."""
+        if not session.get('admin_logged_in'):
+            abort(403)
+        if name not in {r[0] for r in list_recordings()}:
+            abort(404)
+        with open(os.path.join(RECORDINGS_DIR, name), 'rb') as f:
+            data = f.read()
+        headers = {'Cache-Control': 'no-cache'}
+        if name.endswith('.gz'):
+            headers['Content-Encoding'] = 'gzip'
+        return Response(data, mimetype='application/x-asciicast', headers=headers)
+
+    @app.route('/admin/api/ssh/limits')
+    def api_ssh_limits():
+        """Open SSH connections and how many were refused or timed out, by reason."""
+        if not session.get('admin_logged_in'):
+            abort(403)
+        return jsonify(connection_limits.stats())
+
+    @app.route('/admin/api/loop')
+    def api_loop():
+        """Event loop health: implementation, lag, task count and blocked callbacks."""
+        if not session.get('admin_logged_in'):
+            abort(403)
+        return jsonify(loop_monitor.stats())
+
     @app.route('/admin/logout')
     def logout():
         session.pop('admin_logged_in', None)
@@ -107,172 +314,66 @@ def run_admin_app(port=6000):
         resp.set_cookie('admin_logged_in', '', expires=0)
         return resp
 
-    @app.route('/admin/service/ssh/<action>', methods=['POST'])
-    def control_ssh(action):
+    def control_service(service, action):
+        """Forward a start/stop action to the control plane and log it."""
         if not session.get('admin_logged_in'):
             return redirect(url_for('login'))
-        # Update desired state in service_status.json
-        import json
-        import datetime
-        status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/service_status.json'))
-        try:
-            if os.path.exists(status_file):
-                with open(status_file, 'r') as f:
-                    data = json.load(f)
-            else:
-                data = {}
-            if action == 'stop':
-                data['ssh_desired'] = 'stopped'
-                # Log to SSH service log
-                try:
-                    with open(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/ssh_honeypot.log')), 'a', encoding='utf-8') as sshlog:
-                        import datetime
-                        sshlog.write('{"timestamp": "%s", "level": "INFO", "service": "ssh", "message": "SSH honeypot stopped by admin panel"}\n' % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-                except Exception:
-                    pass
-            elif action == 'start':
-                data['ssh_desired'] = 'running'
-                # Log to SSH service log
-                try:
-                    with open(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/ssh_honeypot.log')), 'a', encoding='utf-8') as sshlog:
-                        import datetime
-                        sshlog.write('{"timestamp": "%s", "level": "INFO", "service": "ssh", "message": "SSH honeypot started by admin panel"}\n' % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-                except Exception:
-                    pass
-            with open(status_file, 'w') as f:
-                json.dump(data, f)
-        except Exception:
-            pass
+        if action not in ('start', 'stop'):
+            abort(400)
+        control_plane.request(service, action)
+        if logger:
+            logger.event(f"{service}.admin_action", action=action, admin_ip=request.remote_addr)
         return redirect(url_for('dashboard'))
 
+    @app.route('/admin/service/ssh/<action>', methods=['POST'])
+    def control_ssh(action):
+        return control_service('ssh', action)
+
     @app.route('/admin/service/ftp/<action>', methods=['POST'])
     def control_ftp(action):
-        if not session.get('admin_logged_in'):
-            return redirect(url_for('login'))
-        import json, datetime
-        status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/service_status.json'))
-        ftp_log_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/ftp_honeypot.log'))
-        try:
-            if os.path.exists(status_file):
-                with open(status_file, 'r') as f:
-                    data = json.load(f)
-            else:
-                data = {}
-            if action == 'stop':
-                data['ftp_desired'] = 'stopped'
-                with open(ftp_log_file, 'a', encoding='utf-8') as f:
-                    f.write('{"timestamp": "%s", "level": "INFO", "service": "ftp", "message": "FTP honeypot stopped by admin panel"}\n' % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            elif action == 'start':
-                data['ftp_desired'] = 'running'
-                with open(ftp_log_file, 'a', encoding='utf-8') as f:
-                    f.write('{"timestamp": "%s", "level": "INFO", "service": "ftp", "message": "FTP honeypot started by admin panel"}\n' % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            with open(status_file, 'w') as f:
-                json.dump(data, f)
-        except Exception:
-            pass
-        return redirect(url_for('dashboard'))
+        return control_service('ftp', action)
 
     @app.route('/admin/service/dns/<action>', methods=['POST'])
     def control_dns(action):
-        if not session.get('admin_logged_in'):
-            return redirect(url_for('login'))
-        import json, datetime
-        status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/service_status.json'))
-        dns_log_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/dns_honeypot.log'))
-        try:
-            if os.path.exists(status_file):
-                with open(status_file, 'r') as f:
-                    data = json.load(f)
-            else:
-                data = {}
-            if action == 'stop':
-                data['dns_desired'] = 'stopped'
-                with open(dns_log_file, 'a', encoding='utf-8') as f:
-                    f.write('{"timestamp": "%s", "level": "INFO", "service": "dns", "message": "DNS honeypot stopped by admin panel"}\n' % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            elif action == 'start':
-                data['dns_desired'] = 'running'
-                with open(dns_log_file, 'a', encoding='utf-8') as f:
-                    f.write('{"timestamp": "%s", "level": "INFO", "service": "dns", "message": "DNS honeypot started by admin panel"}\n' % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            with open(status_file, 'w') as f:
-                json.dump(data, f)
-        except Exception:
-            pass
-        return redirect(url_for('dashboard'))
+        return control_service('dns', action)
 
     @app.route('/admin/service/smb/<action>', methods=['POST'])
     def control_smb(action):
-        if not session.get('admin_logged_in'):
-            return redirect(url_for('login'))
-        import json, datetime
-        status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/service_status.json'))
-        smb_log_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/smb_honeypot.log'))
-        try:
-            if os.path.exists(status_file):
-                with open(status_file, 'r') as f:
-                    data = json.load(f)
-            else:
-                data = {}
-            if action == 'stop':
-                data['smb_desired'] = 'stopped'
-                with open(smb_log_file, 'a', encoding='utf-8') as f:
-                    f.write('{"timestamp": "%s", "level": "INFO", "service": "smb", "message": "SMB honeypot stopped by admin panel"}\n' % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            elif action == 'start':
-                data['smb_desired'] = 'running'
-                with open(smb_log_file, 'a', encoding='utf-8') as f:
-                    f.write('{"timestamp": "%s", "level": "INFO", "service": "smb", "message": "SMB honeypot started by admin panel"}\n' % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            with open(status_file, 'w') as f:
-                json.dump(data, f)
-        except Exception:
-            pass
-        return redirect(url_for('dashboard'))
+        return control_service('smb', action)
 
     @app.route('/admin/service/web/<action>', methods=['POST'])
     def control_web(action):
-        if not session.get('admin_logged_in'):
-            return redirect(url_for('login'))
-        import json, datetime
-        status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/service_status.json'))
-        web_log_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/web_honeypot.log'))
-        try:
-            if os.path.exists(status_file):
-                with open(status_file, 'r') as f:
-                    data = json.load(f)
-            else:
-                data = {}
-            if action == 'stop':
-                data['web_desired'] = 'stopped'
-                with open(web_log_file, 'a', encoding='utf-8') as f:
-                    f.write('{"timestamp": "%s", "level": "INFO", "service": "web", "message": "Web honeypot stopped by admin panel"}\n' % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            elif action == 'start':
-                data['web_desired'] = 'running'
-                with open(web_log_file, 'a', encoding='utf-8') as f:
-                    f.write('{"timestamp": "%s", "level": "INFO", "service": "web", "message": "Web honeypot started by admin panel"}\n' % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            with open(status_file, 'w') as f:
-                json.dump(data, f)
-        except Exception:
-            pass
-        return redirect(url_for('dashboard'))
+        return control_service('web', action)
 
-    # --- SSE endpoint for real-time service status updates ---
+    # --- SSE endpoint for real-time service status and log events ---
     @app.route('/admin/events')
     def admin_events():
+        if not session.get('admin_logged_in'):
+            abort(403)
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_event_id = None
+
         def event_stream():
-            last_status = None
-            status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/service_status.json'))
-            while True:
-                try:
-                    if os.path.exists(status_file):
-                        with open(status_file, 'r') as f:
-                            data = json.load(f)
-                    else:
-                        data = {}
-                except Exception:
-                    data = {}
-                if data != last_status:
-                    yield f"data: {json.dumps(data)}\n\n"
-                    last_status = data.copy() if isinstance(data, dict) else data
-                time.sleep(2)
-        return Response(event_stream(), mimetype="text/event-stream")
+            # Subscribed only once the stream runs, so a client gone before the
+            # first chunk never leaves a subscription behind
+            client = broadcaster.subscribe(last_event_id)
+            if client is None:
+                yield "retry: 30000\nevent: busy\ndata: Too many dashboard clients\n\n"
+                return
+            try:
+                _, state = control_plane.get_state()
+                # Current status first, then whatever the broadcaster pushes
+                yield f"data: {json.dumps(state)}\n\n"
+                while not client.overflowed:
+                    message = client.get(timeout=SSE_HEARTBEAT_INTERVAL)
+                    yield message if message is not None else ": keepalive\n\n"
+            finally:
+                broadcaster.unsubscribe(client)
+        return Response(event_stream(), mimetype="text/event-stream",
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
     def get_log_files():
         try:
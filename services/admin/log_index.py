@@ -0,0 +1,130 @@
+"""
+Line offset index for honeypot log files.
+
+The admin panel shows logs newest-first, 50 lines per page. Instead of
+reading the whole file on every page view, LogIndex keeps the byte offset of
+every complete line and only scans bytes appended since the last refresh, so
+a page is one seek plus one small read and the line count is O(1).
+
+Loguru rotates a log by renaming it and creating a new file at the same path;
+this is detected by an inode change (or the file shrinking) and the index is
+rebuilt for the new file. Rotated files never change, so their index is built
+once and reused.
+"""
+import os
+import threading
+from array import array
+from collections import OrderedDict
+
+SCAN_CHUNK_SIZE = 1024 * 1024
+MAX_CACHED_INDEXES = 128
+
+
+class LogIndex:
+    def __init__(self, path):
+        self.path = path
+        self.offsets = array('Q')  # start offset of each complete line
+        self._scanned = 0          # bytes of the file already indexed
+        self._line_start = 0       # start of the current, not yet terminated line
+        self._file_id = None
+        self._lock = threading.Lock()
+
+    def _reset(self, file_id):
+        self.offsets = array('Q')
+        self._scanned = 0
+        self._line_start = 0
+        self._file_id = file_id
+
+    def refresh(self):
+        """Index any bytes appended since the last call. Returns the line count."""
+        with self._lock:
+            try:
+                with open(self.path, 'rb') as f:
+                    return self._refresh(f)
+            except OSError:
+                self._reset(None)
+                return 0
+
+    def _refresh(self, f):
+        # Called with the lock held. `f` is the open file: the index is
+        # checked against what was opened, not whatever is at the path now.
+        st = os.fstat(f.fileno())
+        file_id = (st.st_dev, st.st_ino)
+        if file_id != self._file_id or st.st_size < self._scanned:
+            # New file at this path (rotation) or truncated
+            self._reset(file_id)
+        if st.st_size > self._scanned:
+            self._scan(f, st.st_size)
+        return len(self.offsets)
+
+    def _scan(self, f, size):
+        f.seek(self._scanned)
+        pos = self._scanned
+        while pos < size:
+            chunk = f.read(min(SCAN_CHUNK_SIZE, size - pos))
+            if not chunk:
+                break
+            nl = chunk.find(b'\n')
+            while nl != -1:
+                self.offsets.append(self._line_start)
+                self._line_start = pos + nl + 1
+                nl = chunk.find(b'\n', nl + 1)
+            pos += len(chunk)
+        self._scanned = pos
+
+    @property
+    def total_lines(self):
+        return len(self.offsets)
+
+    def _read_lines(self, f, start, stop):
+        stop = min(stop, len(self.offsets))
+        if start >= stop:
+            return []
+        begin = self.offsets[start]
+        end = self.offsets[stop] if stop < len(self.offsets) else self._line_start
+        f.seek(begin)
+        return f.read(end - begin).decode('utf-8', errors='ignore').splitlines()
+
+    def read_lines(self, start, stop):
+        """Return complete lines [start, stop) in file order, decoded."""
+        with self._lock:
+            try:
+                with open(self.path, 'rb') as f:
+                    return self._read_lines(f, start, stop)
+            except OSError:
+                return []
+
+    def read_page(self, page=1, per_page=50):
+        """Return one page of lines, most recent first (page 1 = newest)."""
+        # Refresh and read under one lock and from one open file, so a
+        # rotation in between cannot pair old offsets with the new file
+        with self._lock:
+            try:
+                with open(self.path, 'rb') as f:
+                    total = self._refresh(f)
+                    stop = total - (page - 1) * per_page
+                    if stop <= 0:
+                        return []
+                    return self._read_lines(f, max(0, stop - per_page), stop)[::-1]
+            except OSError:
+                self._reset(None)
+                return []
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_log_index(path):
+    """Return the shared LogIndex for a path (small LRU cache)."""
+    path = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = LogIndex(path)
+            _indexes[path] = index
+            if len(_indexes) > MAX_CACHED_INDEXES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(path)
+        return index
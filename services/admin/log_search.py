@@ -0,0 +1,129 @@
+"""
+Streaming search over the honeypot log files.
+
+Files (current and loguru-rotated ones) are scanned newest first and each
+file is read backwards in blocks, so recent matches come back without
+touching old data. The scan stops as soon as `limit` matches are found or
+the records get older than `since` by more than SINCE_MARGIN. A cheap
+substring test on the raw line runs before any JSON parsing.
+"""
+import glob
+import heapq
+import itertools
+import json
+import os
+import time
+
+REVERSE_CHUNK_SIZE = 64 * 1024
+# Records are not strictly in timestamp order on disk: an aggregated record
+# carries its first_seen time but is written when its window closes, and
+# worker processes log through a queue. A backwards scan only stops once it
+# sees a record this many seconds older than `since`.
+SINCE_MARGIN = 300
+# Glob metacharacters and path separators are not allowed in a service name
+_SERVICE_FORBIDDEN = set('*?[]/\\') | {os.sep}
+
+
+def iter_lines_reversed(path, chunk_size=REVERSE_CHUNK_SIZE):
+    """Yield the lines of a file (bytes, without newline) from last to first."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        remainder = b''
+        while pos > 0:
+            read_size = min(chunk_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            block = f.read(read_size) + remainder
+            lines = block.split(b'\n')
+            # The first piece may be the tail of a line that starts in the previous block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if remainder:
+            yield remainder
+
+
+def list_log_files(logs_dir, service=None):
+    """
+    All *_honeypot log files (including rotated ones), grouped by service,
+    each group newest first.
+    """
+    if service and (_SERVICE_FORBIDDEN & set(service) or service in ('.', '..')):
+        raise ValueError(f"Invalid service name: {service!r}")
+    pattern = f"{service}_honeypot*.log" if service else "*_honeypot*.log"
+    groups = {}
+    for path in glob.glob(os.path.join(logs_dir, pattern)):
+        name = os.path.basename(path).split('_honeypot', 1)[0]
+        groups.setdefault(name, []).append(path)
+    for files in groups.values():
+        files.sort(key=os.path.getmtime, reverse=True)
+    return groups
+
+
+def _format_time(epoch):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(epoch))
+
+
+def _iter_matches(files, match, needles, since_str, stop_str, until_str, since, counter):
+    """Matching records of one service's files, newest first."""
+    for path in files:
+        if since is not None and os.path.getmtime(path) < since:
+            # Last write to this file is older than the range, and so are the older files
+            return
+        try:
+            for raw in iter_lines_reversed(path):
+                counter[0] += 1
+                if needles and not all(n in raw for n in needles):
+                    continue
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                timestamp = record.get('timestamp', '')
+                if until_str and timestamp >= until_str:
+                    continue
+                if since_str and timestamp < since_str:
+                    if timestamp < stop_str:
+                        return
+                    continue
+                if match(record):
+                    record['file'] = os.path.basename(path)
+                    yield record
+        except OSError:
+            continue
+
+
+def search_logs(logs_dir, service=None, level=None, src_ip=None, user=None, event=None,
+                text=None, since=None, until=None, limit=100):
+    """
+    Return (records, lines_scanned): up to `limit` matching records, newest
+    first across all services. `since`/`until` are epoch seconds. `text` is
+    a case-sensitive substring of the raw line. Raises ValueError for a
+    service name that is not a plain name.
+    """
+    since_str = _format_time(since) if since is not None else None
+    stop_str = _format_time(since - SINCE_MARGIN) if since is not None else None
+    until_str = _format_time(until) if until is not None else None
+    # Substrings every matching raw line must contain
+    # (in their JSON-escaped form, since that is what is on disk)
+    needles = [json.dumps(n, ensure_ascii=False)[1:-1].encode('utf-8') for n in (src_ip, user, event, text) if n]
+    expected = {'service': service, 'level': level, 'src_ip': src_ip, 'user': user, 'event': event}
+    expected = {k: v for k, v in expected.items() if v}
+
+    def match(record):
+        return all(record.get(k) == v for k, v in expected.items())
+
+    counter = [0]
+    streams = [
+        _iter_matches(files, match, needles, since_str, stop_str, until_str, since, counter)
+        for files in list_log_files(logs_dir, service).values()
+    ]
+    # Each service stream is already newest first; merge them lazily so the
+    # scan stops as soon as `limit` records are out.
+    merged = heapq.merge(*streams, key=lambda r: r.get('timestamp', ''), reverse=True)
+    results = list(itertools.islice(merged, limit))
+    return results, counter[0]
@@ -0,0 +1,137 @@
+"""
+Incremental tailing of honeypot log files for the admin live view.
+
+A single watchdog observer watches the logs directory and wakes the tailers
+of a file when it changes. Each tailer remembers the (device, inode) and byte
+offset it has read up to and only reads what was appended since. When loguru
+rotates the file (renames it and creates a new one at the same path) the rest
+of the rotated file is drained first, then the tailer continues at the start
+of the new file. No file handle is kept open between reads, so rotation is
+never blocked on Windows.
+"""
+import glob
+import os
+import threading
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+
+class LogDirectoryWatcher(FileSystemEventHandler):
+    """Shared watchdog observer; tailers wait on it for changes to their file."""
+
+    def __init__(self, logs_dir):
+        self.logs_dir = logs_dir
+        self._cond = threading.Condition()
+        self._versions = {}
+        self._observer = None
+
+    def start(self):
+        with self._cond:
+            if self._observer is not None:
+                return
+            os.makedirs(self.logs_dir, exist_ok=True)
+            self._observer = Observer()
+            self._observer.schedule(self, self.logs_dir, recursive=False)
+            self._observer.start()
+
+    def on_any_event(self, event):
+        paths = [event.src_path, getattr(event, 'dest_path', None)]
+        with self._cond:
+            for path in paths:
+                if path:
+                    path = os.path.abspath(path)
+                    self._versions[path] = self._versions.get(path, 0) + 1
+            self._cond.notify_all()
+
+    def version(self, path):
+        with self._cond:
+            return self._versions.get(path, 0)
+
+    def wait(self, path, version, timeout):
+        """Block until `path` changed since `version` or timeout. Returns the new version."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._versions.get(path, 0) != version, timeout)
+            return self._versions.get(path, 0)
+
+
+class LogTail:
+    def __init__(self, path, resume_from=None):
+        """
+        Follow `path` from its current end, or from `resume_from`
+        ("<inode>:<offset>", as returned by position) if it still refers to
+        the current file.
+        """
+        self.path = os.path.abspath(path)
+        self._file_id = None
+        self._offset = 0
+        self._partial = b''
+        st = self._stat(self.path)
+        if st is not None:
+            self._file_id = (st.st_dev, st.st_ino)
+            self._offset = st.st_size
+            if resume_from:
+                try:
+                    ino, offset = resume_from.split(':', 1)
+                    if int(ino) == st.st_ino and 0 <= int(offset) <= st.st_size:
+                        self._offset = int(offset)
+                except ValueError:
+                    pass
+
+    @staticmethod
+    def _stat(path):
+        try:
+            return os.stat(path)
+        except OSError:
+            return None
+
+    @property
+    def position(self):
+        """Opaque resume token for the data read so far (used as SSE event id)."""
+        ino = self._file_id[1] if self._file_id else 0
+        return f"{ino}:{self._offset - len(self._partial)}"
+
+    def _read_from(self, path, offset):
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                return f.read()
+        except OSError:
+            return b''
+
+    def _find_rotated(self):
+        # Loguru renames "name.log" to "name.<date>.log" on rotation
+        stem, ext = os.path.splitext(self.path)
+        for candidate in glob.glob(f"{glob.escape(stem)}.*{ext}"):
+            st = self._stat(candidate)
+            if st is not None and (st.st_dev, st.st_ino) == self._file_id:
+                return candidate
+        return None
+
+    def read_new_lines(self):
+        """Return complete lines appended since the previous call."""
+        data = b''
+        st = self._stat(self.path)
+        file_id = (st.st_dev, st.st_ino) if st is not None else None
+        if file_id != self._file_id:
+            # Rotated: finish the old file, then start the new one at 0
+            if self._file_id is not None:
+                rotated = self._find_rotated()
+                if rotated:
+                    data += self._read_from(rotated, self._offset)
+            self._file_id = file_id
+            self._offset = 0
+        elif st is not None and st.st_size < self._offset:
+            # Truncated in place
+            self._offset = 0
+            self._partial = b''
+        if st is not None and file_id == self._file_id:
+            chunk = self._read_from(self.path, self._offset)
+            self._offset += len(chunk)
+            data += chunk
+        if not data:
+            return []
+        data = self._partial + data
+        lines = data.split(b'\n')
+        self._partial = lines.pop()
+        return [line.decode('utf-8', errors='ignore') for line in lines if line.strip()]
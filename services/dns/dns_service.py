@@ -1,6 +1,22 @@
 import asyncio
 from dnslib.server import DNSServer, DNSHandler, BaseResolver
 from dnslib import RR, QTYPE, A
+from core.control_plane import control_plane
+from core.rate_limiter import rate_limiter
+
+class RateLimitedDNSHandler(DNSHandler):
+    """DNSHandler that consults the rate limiter before answering a query."""
+    log_query = True
+
+    def handle(self):
+        verdict = rate_limiter.check('dns', self.client_address[0], self.server.resolver.logger)
+        if not verdict.allowed:
+            return
+        if verdict.delay and not rate_limiter.tarpit('dns', verdict.delay):
+            # Too many handler threads already tarpitted
+            return
+        self.log_query = verdict.log
+        super().handle()
 
 class FakeDNSResolver(BaseResolver):
     def __init__(self, config, logger):
@@ -14,41 +30,31 @@ class FakeDNSResolver(BaseResolver):
         subdomain = str(qname).rstrip('.').split('.')[0]
 
         client_ip = handler.client_address[0]  # Extract client IP from handler
-        self.logger.info(f"DNS Query from {client_ip} for {qname}", service="dns")
+        log = getattr(handler, 'log_query', True)
+        if log:
+            self.logger.event("dns.query", src_ip=client_ip, qname=str(qname), qtype=qtype)
 
         ip = self.records.get(subdomain)
         if ip:
-            self.logger.info(f"Resolved {qname} to {ip} for client {client_ip}", service="dns")
+            if log:
+                self.logger.event("dns.resolved", src_ip=client_ip, qname=str(qname), answer=ip)
             reply.add_answer(RR(qname, QTYPE.A, rdata=A(ip), ttl=60))
-        else:
-            self.logger.warning(f"No fake record found for {qname} from client {client_ip}", service="dns")
+        elif log:
+            self.logger.event("dns.no_record", level="WARNING", src_ip=client_ip, qname=str(qname), qtype=qtype)
 
         return reply
 
 dns_server_instance = None
 def set_dns_status(status):
-    import json
-    import os
-    status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/service_status.json'))
-    try:
-        if os.path.exists(status_file):
-            with open(status_file, 'r') as f:
-                data = json.load(f)
-        else:
-            data = {}
-        data['dns'] = status
-        with open(status_file, 'w') as f:
-            json.dump(data, f)
-    except Exception:
-        pass
+    control_plane.set_status('dns', status)
 
 async def start_dns_server(config, logger):
     global dns_server_instance
     port = config["services"]["dns"]["port"]
     resolver = FakeDNSResolver(config, logger)
-    server = DNSServer(resolver, port=port, address="0.0.0.0")
+    server = DNSServer(resolver, port=port, address="0.0.0.0", handler=RateLimitedDNSHandler)
     dns_server_instance = server
-    logger.info(f"Starting DNS server on port {port}",service="dns")
+    logger.event("dns.server_starting", port=port)
     set_dns_status("running")
     server.start_thread()
     try:
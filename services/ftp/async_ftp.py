@@ -0,0 +1,712 @@
+"""
+FTP server running on the orchestrator's asyncio event loop.
+
+AsyncFTPHandler speaks the control protocol for one client as a coroutine
+and opens passive (PASV/EPSV) or active (PORT/EPRT) data connections with
+asyncio as well, so every session shares the loop, a slow client never
+holds a thread, and stopping the server cancels all sessions at once.
+
+The hooks and conventions follow pyftpdlib's FTPHandler, whose authorizer
+and filesystem classes are reused: on_connect, on_login, on_login_failed,
+on_file_sent/received, on_incomplete_file_sent/received, on_disconnect,
+pre_process_command and ftp_<CMD> methods (which receive real filesystem
+paths for filesystem commands). Methods that wait on the network
+(pre_process_command, ftp_RETR, ftp_STOR, ...) are coroutines here. After
+each command on_command(cmd, arg, resp, resp_code) is called with the reply.
+"""
+import asyncio
+import os
+import time
+
+from pyftpdlib.authorizers import AuthenticationFailed, AuthorizerError
+from pyftpdlib.filesystems import AbstractedFS, FilesystemError
+
+CHUNK_SIZE = 65536
+MAX_LINE = 2048
+
+# cmd -> (needs authentication, argument: True required / False none / None optional, permission)
+PROTO_CMDS = {
+    'ABOR': (True, False, None),
+    'ALLO': (True, True, None),
+    'APPE': (True, True, 'a'),
+    'CDUP': (True, False, 'e'),
+    'CWD': (True, None, 'e'),
+    'DELE': (True, True, 'd'),
+    'EPRT': (True, True, None),
+    'EPSV': (True, None, None),
+    'FEAT': (False, False, None),
+    'HELP': (False, None, None),
+    'LIST': (True, None, 'l'),
+    'MDTM': (True, True, 'l'),
+    'MKD': (True, True, 'm'),
+    'MODE': (True, True, None),
+    'NLST': (True, None, 'l'),
+    'NOOP': (False, False, None),
+    'OPTS': (True, True, None),
+    'PASS': (False, None, None),
+    'PASV': (True, False, None),
+    'PORT': (True, True, None),
+    'PWD': (True, False, None),
+    'QUIT': (False, False, None),
+    'RETR': (True, True, 'r'),
+    'RMD': (True, True, 'd'),
+    'RNFR': (True, True, 'f'),
+    'RNTO': (True, True, 'f'),
+    'SIZE': (True, True, 'l'),
+    'STOR': (True, True, 'w'),
+    'STRU': (True, True, None),
+    'SYST': (False, False, None),
+    'TYPE': (True, True, None),
+    'USER': (False, True, None),
+    'XCUP': (True, False, 'e'),
+    'XCWD': (True, None, 'e'),
+    'XMKD': (True, True, 'm'),
+    'XPWD': (True, False, None),
+    'XRMD': (True, True, 'd'),
+}
+ALIASES = {'XCUP': 'CDUP', 'XCWD': 'CWD', 'XMKD': 'MKD', 'XPWD': 'PWD', 'XRMD': 'RMD'}
+
+
+def _strerror(err):
+    if isinstance(err, OSError) and err.strerror:
+        return err.strerror
+    return str(err)
+
+
+class DataChannelError(Exception):
+    pass
+
+
+class AsyncFTPHandler:
+    """One FTP control connection. Configure by setting class attributes."""
+
+    authorizer = None
+    banner = "FTP server ready."
+    timeout = 300  # seconds of inactivity on the control connection
+    data_timeout = 30  # seconds to wait for the data connection
+    max_upload_bytes = 0  # STOR/APPE size cap, 0 = unlimited
+    auth_failed_timeout = 3  # delay before answering a failed login
+    max_login_attempts = 3
+    use_gmt_times = True
+    encoding = 'utf8'
+    unicode_errors = 'replace'
+    abstracted_fs = AbstractedFS
+
+    def __init__(self, reader, writer, server=None):
+        self.reader = reader
+        self.writer = writer
+        self.server = server
+        # peername is None if the client already reset the connection
+        self.remote_ip, self.remote_port = (writer.get_extra_info('peername') or ('', 0))[:2]
+        self.local_ip = (writer.get_extra_info('sockname') or ('0.0.0.0',))[0]
+        self.username = ""
+        self.authenticated = False
+        self.attempted_logins = 0
+        self.fs = None
+        self._closed = False
+        self._current_type = 'a'
+        self._rnfr = None
+        self._passive = None  # (asyncio server, future of (reader, writer))
+        self._active = None  # (host, port) from PORT/EPRT
+        self._last_response = ""
+        self._raw_arg = ""  # argument as sent by the client, for on_command
+
+    # --- hooks, overridden by subclasses
+
+    def on_connect(self):
+        pass
+
+    def on_disconnect(self):
+        pass
+
+    def on_login(self, username):
+        pass
+
+    def on_login_failed(self, username, password):
+        pass
+
+    def on_logout(self, username):
+        pass
+
+    def on_file_sent(self, file):
+        pass
+
+    def on_file_received(self, file):
+        pass
+
+    def on_incomplete_file_sent(self, file):
+        pass
+
+    def on_incomplete_file_received(self, file):
+        pass
+
+    def on_command(self, cmd, arg, resp, resp_code):
+        pass
+
+    # --- connection
+
+    def respond(self, line):
+        self._last_response = line
+        self.push(line + "\r\n")
+
+    def push(self, data):
+        if not self._closed:
+            self.writer.write(data.encode(self.encoding, self.unicode_errors))
+
+    def close(self):
+        """Disconnect the client now."""
+        if not self._closed:
+            self._closed = True
+            self.writer.transport.abort()
+
+    def close_when_done(self):
+        """Disconnect the client once pending replies are sent."""
+        if not self._closed:
+            self._closed = True
+            self.writer.close()
+
+    async def handle(self):
+        try:
+            self.on_connect()
+            if self._closed:
+                return
+            banner = str(self.banner)
+            self.respond(banner if banner[:3] == "220" else f"220 {banner}")
+            while not self._closed:
+                try:
+                    line = await asyncio.wait_for(self.reader.readuntil(b"\n"), self.timeout)
+                except asyncio.TimeoutError:
+                    self.respond("421 Control connection timed out.")
+                    self.close_when_done()
+                    break
+                except asyncio.LimitOverrunError:
+                    self.respond("500 Command too long.")
+                    self.close_when_done()
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if len(line) > MAX_LINE:
+                    self.respond("500 Command too long.")
+                    continue
+                line = line.decode(self.encoding, self.unicode_errors).rstrip("\r\n")
+                cmd = line.split(" ")[0].upper()
+                arg = line[len(cmd) + 1:]
+                await self.pre_process_command(line, cmd, arg)
+                await self._drain()
+        finally:
+            self._close_data_channels()
+            if not self._closed:
+                self._closed = True
+                self.writer.close()
+            self.on_disconnect()
+
+    async def _drain(self):
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            self.close()
+
+    # --- command dispatch
+
+    async def pre_process_command(self, line, cmd, arg):
+        # on_command reports what the client sent, not the resolved path
+        self._raw_arg = arg
+        if cmd not in PROTO_CMDS:
+            if cmd:
+                self._reply(cmd, arg, f'500 Command "{cmd}" not understood.')
+            return
+        needs_auth, takes_arg, perm = PROTO_CMDS[cmd]
+        cmd = ALIASES.get(cmd, cmd)
+        if not arg and takes_arg is True:
+            return self._reply(cmd, arg, "501 Syntax error: command needs an argument.")
+        if arg and takes_arg is False:
+            return self._reply(cmd, arg, "501 Syntax error: command does not accept arguments.")
+        if needs_auth and not self.authenticated:
+            return self._reply(cmd, arg, "530 Log in with USER and PASS first.")
+        if perm is not None:
+            # Filesystem commands get the real path, like pyftpdlib's handlers
+            if cmd == 'CDUP':
+                arg = self.fs.ftp2fs("..")
+            elif cmd in ('LIST', 'NLST'):
+                if arg.startswith("-"):  # "LIST -la" from ls-minded clients
+                    arg = arg.split(" ", 1)[1] if " " in arg else ""
+                arg = self.fs.ftp2fs(arg or self.fs.cwd)
+            else:
+                arg = self.fs.ftp2fs(arg or "/")
+            # Both resolve the path on disk (realpath, isdir), so off the loop too
+            if not await self._io(self.fs.validpath, arg):
+                return self._reply(cmd, arg, f"550 {self.fs.fs2ftp(arg)!r} points to a path which is outside the user's root directory.")
+            if not await self._io(self.authorizer.has_perm, self.username, perm, arg):
+                return self._reply(cmd, arg, "550 Not enough privileges.")
+        await self.process_command(cmd, arg)
+
+    async def process_command(self, cmd, arg):
+        if self._closed:
+            return
+        self._last_response = ""
+        result = getattr(self, "ftp_" + cmd)(arg)
+        if asyncio.iscoroutine(result):
+            await result
+        if self._last_response:
+            self.on_command(cmd, self._raw_arg, self._last_response[4:], int(self._last_response[:3]))
+
+    def _reply(self, cmd, arg, line):
+        self.respond(line)
+        self.on_command(cmd, self._raw_arg, line[4:], int(line[:3]))
+
+    # --- authentication
+
+    def ftp_USER(self, line):
+        if self.authenticated:
+            self._flush_account()
+            self.respond("331 Previous account information was flushed, send password.")
+        else:
+            self.respond("331 Username ok, send password.")
+        self.username = line
+
+    async def ftp_PASS(self, line):
+        if self.authenticated:
+            return self.respond("503 User already authenticated.")
+        if not self.username:
+            return self.respond("503 Login with USER first.")
+        try:
+            self.authorizer.validate_authentication(self.username, line, self)
+            home = self.authorizer.get_home_dir(self.username)
+            msg_login = self.authorizer.get_msg_login(self.username)
+        except (AuthenticationFailed, AuthorizerError) as err:
+            username, self.username = self.username, ""
+            msg = str(err).capitalize() or (
+                "Anonymous access not allowed." if username == "anonymous" else "Authentication failed.")
+            # Slow down password guessing without holding up other sessions
+            await asyncio.sleep(self.auth_failed_timeout)
+            self.attempted_logins += 1
+            if self.attempted_logins >= self.max_login_attempts:
+                self.respond(f"530 {msg} Disconnecting.")
+                self.close_when_done()
+            else:
+                self.respond(f"530 {msg}")
+            self.on_login_failed(username, line)
+            return
+        self.respond(f"230 {msg_login}")
+        self.authenticated = True
+        self.attempted_logins = 0
+        self.fs = self.abstracted_fs(home, self)
+        self.on_login(self.username)
+
+    def _flush_account(self):
+        self._close_data_channels()
+        self.username = ""
+        self.authenticated = False
+        self.fs = None
+        self._rnfr = None
+
+    def ftp_QUIT(self, line):
+        if self.authenticated:
+            self.respond(f"221 {self.authorizer.get_msg_quit(self.username)}")
+            self.on_logout(self.username)
+        else:
+            self.respond("221 Goodbye.")
+        self.close_when_done()
+
+    # --- informational
+
+    def ftp_SYST(self, line):
+        self.respond("215 UNIX Type: L8")
+
+    def ftp_FEAT(self, line):
+        features = ["EPRT", "EPSV", "MDTM", "SIZE", "TVFS", "UTF8"]
+        self.push("211-Features supported:\r\n" + "".join(f" {x}\r\n" for x in features))
+        self.respond("211 End FEAT.")
+
+    def ftp_OPTS(self, line):
+        if line.split(" ")[0].upper() in ("UTF8", "UTF-8"):
+            self.respond("200 Always in UTF8 mode.")
+        else:
+            self.respond(f'501 Unsupported command "{line.split(" ")[0]}".')
+
+    def ftp_HELP(self, line):
+        self.push("214-The following commands are recognized:\r\n")
+        self.push(" " + " ".join(sorted(PROTO_CMDS)) + "\r\n")
+        self.respond("214 Help command successful.")
+
+    def ftp_NOOP(self, line):
+        self.respond("200 I successfully did nothing'.")
+
+    def ftp_ALLO(self, line):
+        self.respond("202 No storage allocation necessary.")
+
+    def ftp_ABOR(self, line):
+        self._close_data_channels()
+        self.respond("225 No transfer to abort.")
+
+    def ftp_TYPE(self, line):
+        type_ = line.upper().replace(" ", "")
+        if type_ in ("A", "L7"):
+            self._current_type = 'a'
+            self.respond("200 Type set to: ASCII.")
+        elif type_ in ("I", "L8"):
+            self._current_type = 'i'
+            self.respond("200 Type set to: Binary.")
+        else:
+            self.respond(f'504 Unsupported type "{line}".')
+
+    def ftp_MODE(self, line):
+        if line.upper() == "S":
+            self.respond("200 Transfer mode set to: S")
+        else:
+            self.respond("504 Unimplemented MODE type.")
+
+    def ftp_STRU(self, line):
+        if line.upper() == "F":
+            self.respond("200 File transfer structure set to: F.")
+        else:
+            self.respond("504 Unimplemented STRU type.")
+
+    # --- filesystem
+
+    def ftp_PWD(self, line):
+        cwd = self.fs.cwd.replace('"', '""')
+        self.respond(f'257 "{cwd}" is the current directory.')
+
+    async def ftp_CWD(self, path):
+        try:
+            if not await self._io(self.fs.isdir, path):
+                raise FilesystemError("No such file or directory")
+            self.fs.cwd = self.fs.fs2ftp(path)
+        except (OSError, FilesystemError) as err:
+            return self.respond(f"550 {_strerror(err)}.")
+        self.respond(f'250 "{self.fs.cwd}" is the current directory.')
+
+    async def ftp_CDUP(self, path):
+        return await self.ftp_CWD(path)
+
+    async def ftp_SIZE(self, path):
+        if self._current_type == 'a':
+            return self.respond("550 SIZE not allowed in ASCII mode.")
+        try:
+            if await self._io(self.fs.isdir, path):
+                return self.respond(f"550 {self.fs.fs2ftp(path)} is not retrievable.")
+            size = await self._io(self.fs.getsize, path)
+        except (OSError, FilesystemError) as err:
+            return self.respond(f"550 {_strerror(err)}.")
+        self.respond(f"213 {size}")
+
+    async def ftp_MDTM(self, path):
+        try:
+            if not await self._io(lambda: self.fs.isfile(self.fs.realpath(path))):
+                return self.respond(f"550 {self.fs.fs2ftp(path)} is not retrievable")
+            mtime = time.gmtime(await self._io(self.fs.getmtime, path))
+        except (OSError, FilesystemError) as err:
+            return self.respond(f"550 {_strerror(err)}.")
+        self.respond("213 " + time.strftime("%Y%m%d%H%M%S", mtime))
+
+    async def ftp_MKD(self, path):
+        try:
+            await self._io(self.fs.mkdir, path)
+        except (OSError, FilesystemError) as err:
+            return self.respond(f"550 {_strerror(err)}.")
+        line = self.fs.fs2ftp(path).replace('"', '""')
+        self.respond(f'257 "{line}" directory created.')
+
+    async def ftp_RMD(self, path):
+        if path == await self._io(self.fs.realpath, self.fs.root):
+            return self.respond("550 Can't remove root directory.")
+        try:
+            await self._io(self.fs.rmdir, path)
+        except (OSError, FilesystemError) as err:
+            return self.respond(f"550 {_strerror(err)}.")
+        self.respond("250 Directory removed.")
+
+    async def ftp_DELE(self, path):
+        try:
+            await self._io(self.fs.remove, path)
+        except (OSError, FilesystemError) as err:
+            return self.respond(f"550 {_strerror(err)}.")
+        self.respond("250 File removed.")
+
+    async def ftp_RNFR(self, path):
+        if not await self._io(self.fs.lexists, path):
+            return self.respond("550 No such file or directory.")
+        if path == await self._io(self.fs.realpath, self.fs.root):
+            return self.respond("550 Can't rename home directory.")
+        self._rnfr = path
+        self.respond("350 Ready for destination name.")
+
+    async def ftp_RNTO(self, path):
+        if not self._rnfr:
+            return self.respond("503 Bad sequence of commands: use RNFR first.")
+        src, self._rnfr = self._rnfr, None
+        try:
+            await self._io(self.fs.rename, src, path)
+        except (OSError, FilesystemError) as err:
+            return self.respond(f"550 {_strerror(err)}.")
+        self.respond("250 Renaming ok.")
+
+    # --- data connections
+
+    def _close_data_channels(self):
+        if self._passive is not None:
+            server, accepted = self._passive
+            self._passive = None
+            server.close()
+            if accepted.done() and not accepted.cancelled():
+                accepted.result()[1].close()
+            else:
+                accepted.cancel()
+        self._active = None
+
+    async def _listen_passive(self):
+        self._close_data_channels()
+        loop = asyncio.get_running_loop()
+        accepted = loop.create_future()
+
+        async def on_data_connection(reader, writer):
+            # Like pyftpdlib, only the control connection's address may connect
+            if accepted.done() or writer.get_extra_info('peername')[0] != self.remote_ip:
+                writer.close()
+                return
+            accepted.set_result((reader, writer))
+
+        server = await asyncio.start_server(on_data_connection, self.local_ip, 0)
+        self._passive = (server, accepted)
+        return server.sockets[0].getsockname()[1]
+
+    async def ftp_PASV(self, line):
+        if ":" in self.local_ip:
+            return self.respond("425 You cannot use PASV on IPv6 connections. Use EPSV instead.")
+        port = await self._listen_passive()
+        host = self.local_ip.replace(".", ",")
+        self.respond(f"227 Entering passive mode ({host},{port >> 8},{port & 0xFF}).")
+
+    async def ftp_EPSV(self, line):
+        if line.upper() == "ALL":
+            return self.respond("220 Other commands other than EPSV are now disabled.")
+        port = await self._listen_passive()
+        self.respond(f"229 Entering extended passive mode (|||{port}|).")
+
+    def _set_active(self, host, port):
+        if host != self.remote_ip:
+            return self.respond("501 Rejected data connection to foreign address.")
+        if port < 1024:
+            return self.respond("501 PORT against the privileged port refused.")
+        self._close_data_channels()
+        self._active = (host, port)
+        self.respond("200 Active data connection established.")
+
+    def ftp_PORT(self, line):
+        try:
+            fields = [int(x) for x in line.split(",")]
+            if len(fields) != 6 or not all(0 <= x <= 255 for x in fields):
+                raise ValueError
+        except ValueError:
+            return self.respond("501 Invalid PORT format.")
+        self._set_active(".".join(str(x) for x in fields[:4]), fields[4] * 256 + fields[5])
+
+    def ftp_EPRT(self, line):
+        try:
+            _, proto, host, port, _ = line.split(line[0])
+            if proto not in ("1", "2"):
+                return self.respond("522 Network protocol not supported (use 1 or 2).")
+            port = int(port)
+        except (ValueError, IndexError):
+            return self.respond("501 Invalid EPRT format.")
+        self._set_active(host, port)
+
+    async def _open_data_channel(self):
+        """Return (reader, writer) of the data connection set up by PASV/EPSV or PORT/EPRT."""
+        if self._passive is not None:
+            server, accepted = self._passive
+            try:
+                return await asyncio.wait_for(asyncio.shield(accepted), self.data_timeout)
+            except asyncio.TimeoutError:
+                raise DataChannelError("Data connection timed out")
+            finally:
+                server.close()
+                self._passive = None
+        if self._active is not None:
+            host, port = self._active
+            self._active = None
+            try:
+                return await asyncio.wait_for(asyncio.open_connection(host, port), self.data_timeout)
+            except (OSError, asyncio.TimeoutError):
+                raise DataChannelError("Can't connect to the client")
+        raise DataChannelError("No data connection (use PASV, EPSV, PORT or EPRT first)")
+
+    async def _io(self, func, *args):
+        """Run blocking file I/O off the event loop, which every service shares."""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _send_data(self, data):
+        """
+        Send `data` (bytes, or a file object read in chunks off the loop) over
+        a new data connection; returns True when all of it was sent.
+        """
+        self.respond("150 File status okay. About to open data connection.")
+        try:
+            reader, writer = await self._open_data_channel()
+        except DataChannelError as err:
+            self.respond(f"425 Can't open data connection: {err}.")
+            return False
+        try:
+            while True:
+                if isinstance(data, bytes):
+                    chunk, data = data, b""
+                else:
+                    chunk = await self._io(data.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                if self._current_type == 'a':
+                    chunk = chunk.replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+                writer.write(chunk)
+                await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            writer.close()
+            self.respond("426 Connection closed; transfer aborted.")
+            return False
+        self.respond("226 Transfer complete.")
+        return True
+
+    def _list_lines(self, path):
+        """LIST output for `path` (blocking: stats every entry)."""
+        if self.fs.isdir(path):
+            listing = sorted(self.fs.listdir(path))
+            return b"".join(self.fs.format_list(path, listing))
+        self.fs.lstat(path)
+        basedir, filename = os.path.split(path)
+        return b"".join(self.fs.format_list(basedir, [filename]))
+
+    def _nlst_names(self, path):
+        """NLST names for `path` (blocking)."""
+        if self.fs.isdir(path):
+            return sorted(self.fs.listdir(path))
+        self.fs.lstat(path)
+        return [os.path.basename(path)]
+
+    async def ftp_LIST(self, path):
+        try:
+            data = await self._io(self._list_lines, path)
+        except (OSError, FilesystemError) as err:
+            return self.respond(f"550 {_strerror(err)}.")
+        await self._send_data(data)
+
+    async def ftp_NLST(self, path):
+        try:
+            listing = await self._io(self._nlst_names, path)
+        except (OSError, FilesystemError) as err:
+            return self.respond(f"550 {_strerror(err)}.")
+        data = "".join(name + "\r\n" for name in listing)
+        await self._send_data(data.encode(self.encoding, self.unicode_errors))
+
+    async def ftp_RETR(self, file):
+        try:
+            fd = await self._io(self.fs.open, file, "rb")
+        except (OSError, FilesystemError) as err:
+            return self.respond(f"550 {_strerror(err)}.")
+        try:
+            if await self._send_data(fd):
+                self.on_file_sent(file)
+            else:
+                self.on_incomplete_file_sent(file)
+        finally:
+            await self._io(fd.close)
+        return file
+
+    async def ftp_STOR(self, file, mode="w"):
+        try:
+            fd = await self._io(self.fs.open, file, mode + "b")
+        except (OSError, FilesystemError) as err:
+            return self.respond(f"550 {_strerror(err)}.")
+        try:
+            self.respond("150 File status okay. About to open data connection.")
+            try:
+                reader, writer = await self._open_data_channel()
+            except DataChannelError as err:
+                self.respond(f"425 Can't open data connection: {err}.")
+                self.on_incomplete_file_received(file)
+                return
+            received = 0
+            try:
+                while True:
+                    chunk = await asyncio.wait_for(reader.read(CHUNK_SIZE), self.timeout)
+                    if not chunk:
+                        break
+                    received += len(chunk)
+                    if self.max_upload_bytes and received > self.max_upload_bytes:
+                        # Keep what fits, so the sample is still there to look at
+                        await self._io(fd.write, chunk[:len(chunk) - (received - self.max_upload_bytes)])
+                        self.respond("552 Requested file action aborted. Exceeded storage allocation.")
+                        self.on_incomplete_file_received(file)
+                        return
+                    if self._current_type == 'a':
+                        chunk = chunk.replace(b"\r\n", b"\n")
+                    await self._io(fd.write, chunk)
+            except (ConnectionError, asyncio.TimeoutError):
+                self.respond("426 Connection closed; transfer aborted.")
+                self.on_incomplete_file_received(file)
+                return
+            finally:
+                writer.close()
+        finally:
+            await self._io(fd.close)
+        self.respond("226 Transfer complete.")
+        self.on_file_received(file)
+        return file
+
+    async def ftp_APPE(self, file):
+        return await self.ftp_STOR(file, mode="a")
+
+
+class AsyncFTPServer:
+    """Accepts control connections and runs one handler coroutine per client."""
+
+    def __init__(self, handler, host='0.0.0.0', port=21, max_cons=512, backlog=100):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.max_cons = max_cons
+        self.backlog = backlog
+        self._server = None
+        self._tasks = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._accept, self.host, self.port, backlog=self.backlog)
+
+    async def _accept(self, reader, writer):
+        if self.max_cons and len(self._tasks) >= self.max_cons:
+            writer.write(b"421 Too many connections. Service temporarily unavailable.\r\n")
+            writer.close()
+            return
+        # The session gets its own task, which close() cancels: asyncio's
+        # start_server callback logs a bogus error for a cancelled handler
+        # task on Python 3.11/3.12.1, so this one only waits for the session
+        session = asyncio.ensure_future(self._session(reader, writer))
+        self._tasks.add(session)
+        session.add_done_callback(self._tasks.discard)
+        await asyncio.wait([session])
+
+    async def _session(self, reader, writer):
+        try:
+            await self.handler(reader, writer, self).handle()
+        except asyncio.CancelledError:
+            writer.transport.abort()
+            raise
+
+    @property
+    def connections(self):
+        return len(self._tasks)
+
+    def close(self):
+        """Stop accepting and drop every session."""
+        if self._server is not None:
+            self._server.close()
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def wait_closed(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
@@ -1,78 +1,94 @@
 import asyncio
 import os
-import logging
 from pyftpdlib.authorizers import DummyAuthorizer
-from pyftpdlib.handlers import FTPHandler
-from pyftpdlib.servers import FTPServer
+from services.ftp.async_ftp import AsyncFTPHandler, AsyncFTPServer
+from core.control_plane import control_plane
+from core.rate_limiter import rate_limiter
 
-# Suppress pyftpdlib's own logging to the terminal
-logging.getLogger("pyftpdlib").setLevel(logging.CRITICAL)
+class FTPHoneypotHandler(AsyncFTPHandler):
+    # False while the current command is sampled out by the rate limiter
+    log_command = True
+    # True when on_connect dropped the connection (rate limited, never logged)
+    rejected = False
 
-class FTPHoneypotHandler(FTPHandler):
     def on_connect(self):
         ip, port = self.remote_ip, self.remote_port
-        self.log_service.info(f"FTP connection from {ip}:{port}", service="ftp")
+        if not rate_limiter.check('ftp', ip, self.log_service).allowed:
+            self.rejected = True
+            self.close()
+            return
+        self.log_service.event("ftp.connection", src_ip=ip, src_port=port)
+
+    async def pre_process_command(self, line, cmd, arg):
+        verdict = rate_limiter.check('ftp', self.remote_ip, self.log_service)
+        self.log_command = verdict.log
+        if not verdict.allowed:
+            self.respond("421 Too many commands, closing control connection.")
+            self.close_when_done()
+            return
+        if verdict.delay:
+            # Tarpit: this session stops reading from the client meanwhile
+            await asyncio.sleep(verdict.delay)
+            if self._closed:
+                return
+        await super().pre_process_command(line, cmd, arg)
 
     def on_login(self, username):
         ip, port = self.remote_ip, self.remote_port
-        self.log_service.info(f"FTP login: {username} from {ip}:{port}", service="ftp")
+        self.log_service.event("ftp.login", src_ip=ip, src_port=port, user=username)
 
     def on_login_failed(self, username, password):
         ip, port = self.remote_ip, self.remote_port
-        self.log_service.warning(f"FTP failed login: {username} with password: {password} from {ip}:{port}", service="ftp")
+        if not self.log_command:
+            # Sampled out: not logged, but still counted in the credential stats
+            self.log_service.record_credentials("ftp", ip, username, password)
+            return
+        self.log_service.event("ftp.login_failed", level="WARNING", src_ip=ip, src_port=port, user=username, password=password)
 
     def on_file_sent(self, file):
         ip, port = self.remote_ip, self.remote_port
-        self.log_service.info(f"FTP file sent: {file} to {ip}:{port}", service="ftp")
+        self.log_service.event("ftp.file_sent", src_ip=ip, src_port=port, path=file)
 
     def on_file_received(self, file):
         ip, port = self.remote_ip, self.remote_port
-        self.log_service.info(f"FTP file uploaded: {file} from {ip}:{port}", service="ftp")
+        self.log_service.event("ftp.file_received", src_ip=ip, src_port=port, path=file)
 
     def on_incomplete_file_sent(self, file):
         ip, port = self.remote_ip, self.remote_port
-        self.log_service.warning(f"FTP incomplete file sent: {file} to {ip}:{port}", service="ftp")
+        self.log_service.event("ftp.incomplete_file_sent", level="WARNING", src_ip=ip, src_port=port, path=file)
 
     def on_incomplete_file_received(self, file):
         ip, port = self.remote_ip, self.remote_port
-        self.log_service.warning(f"FTP incomplete file uploaded: {file} from {ip}:{port}", service="ftp")
+        self.log_service.event("ftp.incomplete_file_received", level="WARNING", src_ip=ip, src_port=port, path=file)
 
     def on_disconnect(self):
+        if self.rejected:
+            return
         ip, port = self.remote_ip, self.remote_port
-        self.log_service.info(f"FTP disconnect from {ip}:{port}", service="ftp")
+        self.log_service.event("ftp.disconnect", src_ip=ip, src_port=port)
 
-    def ftp_RETR(self, file):
+    async def ftp_RETR(self, file):
         ip, port = self.remote_ip, self.remote_port
-        if not os.path.exists(file):
-            self.log_service.warning(f"FTP attempted download of non-existent file: {file} from {ip}:{port}", service="ftp")
-        return super().ftp_RETR(file)
+        if not await self._io(os.path.exists, file):
+            self.log_service.event("ftp.retr_missing", level="WARNING", src_ip=ip, src_port=port, path=file)
+        return await super().ftp_RETR(file)
 
-    def ftp_STOR(self, file):
+    async def ftp_STOR(self, file, mode="w"):
         ip, port = self.remote_ip, self.remote_port
-        self.log_service.info(f"FTP attempted upload: {file} from {ip}:{port}", service="ftp")
-        return super().ftp_STOR(file)
+        self.log_service.event("ftp.stor", src_ip=ip, src_port=port, path=file)
+        return await super().ftp_STOR(file, mode)
 
     def on_command(self, cmd, arg, resp, resp_code):
         ip, port = self.remote_ip, self.remote_port
-        self.log_service.info(f"FTP command: {cmd} {arg if arg else ''} from {ip}:{port} -> {resp_code} {resp}", service="ftp")
+        if not self.log_command:
+            return
+        self.log_service.event("ftp.command", src_ip=ip, src_port=port, command=cmd, arg=arg, resp_code=resp_code, resp=resp)
 
 ftp_server_instance = None
 ftp_server_event = None
 
 def set_ftp_status(status):
-    import json
-    status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/service_status.json'))
-    try:
-        if os.path.exists(status_file):
-            with open(status_file, 'r') as f:
-                data = json.load(f)
-        else:
-            data = {}
-        data['ftp'] = status
-        with open(status_file, 'w') as f:
-            json.dump(data, f)
-    except Exception:
-        pass
+    control_plane.set_status('ftp', status)
 
 async def start_ftp_server(config, logger):
     global ftp_server_instance, ftp_server_event
@@ -99,28 +115,33 @@ async def start_ftp_server(config, logger):
     handler.authorizer = authorizer
     handler.banner = banner
     handler.log_service = logger
-    server = FTPServer(('0.0.0.0', port), handler)
+    handler.timeout = config["services"]["ftp"].get("timeout", 300)
+    handler.max_upload_bytes = config["services"]["ftp"].get("max_upload_bytes", 10 * 1024 * 1024)
+    server = AsyncFTPServer(handler, '0.0.0.0', port, max_cons=config["services"]["ftp"].get("max_connections", 512))
+    logger.event("ftp.server_starting", port=port)
+    try:
+        await server.start()
+    except OSError as e:
+        logger.event("ftp.server_error", level="ERROR", port=port, error=str(e))
+        set_ftp_status("error")
+        return
     ftp_server_instance = server
+    ftp_server_event = asyncio.Event()
     set_ftp_status("running")
-    logger.info(f"FTP honeypot service is starting on port {port}...", service="ftp")
-    loop = asyncio.get_running_loop()
-    import concurrent.futures
-    with concurrent.futures.ThreadPoolExecutor() as pool:
-        try:
-            await loop.run_in_executor(pool, server.serve_forever)
-        except asyncio.CancelledError:
-            logger.info("FTP honeypot server received cancellation. Shutting down...", service="ftp")
-            server.close_all()
-            set_ftp_status("stopped")
-            raise
-        except Exception:
-            set_ftp_status("error")
-            raise
-    set_ftp_status("stopped")
+    try:
+        await ftp_server_event.wait()  # Sessions run as tasks on this loop
+    finally:
+        # Also reached when the watcher cancels this task
+        server.close()
+        set_ftp_status("stopped")
 
 async def stop_ftp_server():
-    global ftp_server_instance
+    global ftp_server_instance, ftp_server_event
     if ftp_server_instance:
-        ftp_server_instance.close_all()
+        ftp_server_instance.close()
+        await ftp_server_instance.wait_closed()
         ftp_server_instance = None
+    if ftp_server_event:
+        ftp_server_event.set()
+        ftp_server_event = None
     set_ftp_status("stopped")
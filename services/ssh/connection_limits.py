@@ -0,0 +1,81 @@
+import threading
+from collections import Counter
+
+DEFAULTS = {
+    "max_connections": 500,  # concurrent connections, all IPs (0 = unlimited)
+    "max_per_ip": 10,  # concurrent connections from one source IP (0 = unlimited)
+    "login_grace_time": 30,  # seconds to authenticate before being disconnected
+    "idle_timeout": 300,  # seconds without input before a session is closed
+    "max_session_duration": 3600,  # seconds an authenticated connection may last
+    "keepalive_interval": 30,  # seconds between keepalives, detects half-open peers
+}
+REASONS = ("max_connections", "max_per_ip", "login_grace_time", "idle_timeout", "max_session_duration")
+
+
+class SSHConnectionLimits:
+    """
+    Caps on concurrent SSH connections and their lifetime, from
+    services.ssh.limits in honeypot.yaml (0 disables a limit).
+
+    Only connections currently open are tracked: the per-IP counts drop an
+    address as soon as its last connection closes, so the table never holds
+    more than max_connections entries. Connections refused at accept time
+    and connections closed for a timeout are counted by reason in `evicted`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._per_ip = {}
+        self.active = 0
+        self.evicted = Counter()
+        self.configure(None)
+
+    def configure(self, config):
+        config = config or {}
+        settings = {k: config.get(k, v) for k, v in DEFAULTS.items()}
+        with self._lock:
+            self.max_connections = int(settings["max_connections"] or 0)
+            self.max_per_ip = int(settings["max_per_ip"] or 0)
+            self.login_grace_time = float(settings["login_grace_time"] or 0)
+            self.idle_timeout = float(settings["idle_timeout"] or 0)
+            self.max_session_duration = float(settings["max_session_duration"] or 0)
+            self.keepalive_interval = float(settings["keepalive_interval"] or 0)
+
+    def admit(self, ip):
+        """Register a new connection from `ip`. Returns None, or the limit that refuses it."""
+        with self._lock:
+            if self.max_connections and self.active >= self.max_connections:
+                reason = "max_connections"
+            elif self.max_per_ip and self._per_ip.get(ip, 0) >= self.max_per_ip:
+                reason = "max_per_ip"
+            else:
+                self.active += 1
+                self._per_ip[ip] = self._per_ip.get(ip, 0) + 1
+                return None
+            self.evicted[reason] += 1
+            return reason
+
+    def release(self, ip):
+        """Forget an admitted connection once it is closed."""
+        with self._lock:
+            self.active -= 1
+            count = self._per_ip.get(ip, 0) - 1
+            if count > 0:
+                self._per_ip[ip] = count
+            else:
+                self._per_ip.pop(ip, None)
+
+    def count_eviction(self, reason):
+        with self._lock:
+            self.evicted[reason] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "source_ips": len(self._per_ip),
+                "evicted": {reason: self.evicted[reason] for reason in REASONS},
+            }
+
+
+connection_limits = SSHConnectionLimits()
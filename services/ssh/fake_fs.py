@@ -0,0 +1,252 @@
+"""
+Fake Windows filesystem shown by the SSH shell.
+
+FakeFileSystem is built once at startup from an image file (YAML or JSON)
+and never modified afterwards, so every session shares the same tree. Each
+session wraps it in an FSOverlay that records its own changes (mkdir,
+files written with echo >, deletions) in a small dict keyed by directory;
+creating a session costs nothing, whatever the size of the tree.
+
+Image format:
+
+    volume_serial: 1A2B-3C4D
+    free_bytes: 14348484608
+    mtime: 2025-06-01 09:00          # default timestamp
+    entries:
+      - path: C:\\Users\\{user}\\Documents\\notes.txt
+        content: "Remember to update the honeypot logs."
+        mtime: 2025-06-01 09:15
+      - path: C:\\Users\\{user}\\Secrets\\secret.txt
+        size: 2048
+        denied: true                 # "type" answers "Access is denied."
+      - path: C:\\Windows\\Temp
+        type: dir
+
+Parent directories are created as needed. "{user}" is expanded for every
+configured user. Names are matched case-insensitively, like on Windows.
+"""
+import json
+import os
+from datetime import datetime
+from types import MappingProxyType
+
+import yaml
+
+DEFAULT_IMAGE = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../config/fake_fs.yaml'))
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+DEFAULT_MTIME = datetime(2025, 6, 1, 9, 0)
+
+
+def _parse_time(value, default):
+    if value is None:
+        return default
+    if isinstance(value, datetime):
+        return value
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(str(value), fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid timestamp in fake filesystem image: {value}")
+
+
+class FakeFile:
+    __slots__ = ("name", "content", "size", "mtime", "denied")
+    is_dir = False
+
+    def __init__(self, name, content="", size=None, mtime=DEFAULT_MTIME, denied=False):
+        self.name = name
+        self.content = content
+        self.size = len(content.encode("utf-8")) if size is None else int(size)
+        self.mtime = mtime
+        self.denied = denied
+
+
+class FakeDir:
+    __slots__ = ("name", "children", "mtime")
+    is_dir = True
+
+    def __init__(self, name, children=None, mtime=DEFAULT_MTIME):
+        self.name = name
+        # Lowercased name -> node; read-only once built
+        self.children = MappingProxyType(children if children is not None else {})
+        self.mtime = mtime
+
+
+def split_path(path):
+    """Split a Windows path into (is_absolute, [components])."""
+    path = path.strip().strip('"').replace("/", "\\")
+    absolute = False
+    if len(path) >= 2 and path[1] == ":":
+        path = path[2:]
+        absolute = True
+    if path.startswith("\\"):
+        absolute = True
+    return absolute, [part for part in path.split("\\") if part]
+
+
+class FakeFileSystem:
+    """The shared, read-only tree (C:\\ is the root)."""
+
+    def __init__(self, root, volume_serial="1A2B-3C4D", free_bytes=14348484608):
+        self.root = root
+        self.volume_serial = volume_serial
+        self.free_bytes = free_bytes
+
+    @classmethod
+    def load(cls, path, usernames=()):
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                image = json.load(f)
+            else:
+                image = yaml.safe_load(f)
+        return cls.from_image(image or {}, usernames)
+
+    @classmethod
+    def from_image(cls, image, usernames=()):
+        default_mtime = _parse_time(image.get("mtime"), DEFAULT_MTIME)
+        # Built with plain dicts, frozen into FakeDir nodes at the end
+        root = {"name": "", "children": {}, "mtime": default_mtime}
+
+        def make_dirs(parts, mtime):
+            node = root
+            for part in parts:
+                child = node["children"].get(part.lower())
+                if child is None or not isinstance(child, dict):
+                    child = {"name": part, "children": {}, "mtime": mtime}
+                    node["children"][part.lower()] = child
+                node = child
+            return node
+
+        for entry in image.get("entries", []):
+            paths = [entry["path"]]
+            if "{user}" in entry["path"]:
+                paths = [entry["path"].replace("{user}", user) for user in usernames]
+            mtime = _parse_time(entry.get("mtime"), default_mtime)
+            for path in paths:
+                _, parts = split_path(path)
+                if not parts:
+                    continue
+                if entry.get("type") == "dir":
+                    make_dirs(parts, mtime)
+                    continue
+                parent = make_dirs(parts[:-1], mtime)
+                parent["children"][parts[-1].lower()] = FakeFile(
+                    parts[-1],
+                    content=entry.get("content", ""),
+                    size=entry.get("size"),
+                    mtime=mtime,
+                    denied=entry.get("denied", False),
+                )
+
+        def freeze(node):
+            children = {
+                key: freeze(child) if isinstance(child, dict) else child
+                for key, child in node["children"].items()
+            }
+            return FakeDir(node["name"], children, node["mtime"])
+
+        return cls(
+            freeze(root),
+            volume_serial=str(image.get("volume_serial", "1A2B-3C4D")),
+            free_bytes=int(image.get("free_bytes", 14348484608)),
+        )
+
+
+class FSOverlay:
+    """
+    Per-session copy-on-write view of a FakeFileSystem. Only directories the
+    session changed get an entry in `_changes` (lowercased name -> node, or
+    None for a deleted entry); everything else is read from the shared tree.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self._changes = {}
+
+    def children(self, key, node):
+        """Entries of directory `node` at key path `key`, with this session's changes."""
+        changes = self._changes.get(key)
+        if not changes:
+            return node.children
+        merged = dict(node.children)
+        for name, child in changes.items():
+            if child is None:
+                merged.pop(name, None)
+            else:
+                merged[name] = child
+        return merged
+
+    def lookup(self, parts):
+        """Return (node, display parts) for absolute path components, or (None, None)."""
+        node = self.base.root
+        key = ()
+        names = []
+        for part in parts:
+            if not node.is_dir:
+                return None, None
+            child = self.children(key, node).get(part.lower())
+            if child is None:
+                return None, None
+            key += (part.lower(),)
+            names.append(child.name)
+            node = child
+        return node, names
+
+    def resolve(self, cwd, path):
+        """Absolute components for `path` relative to `cwd` (a list of components)."""
+        absolute, parts = split_path(path)
+        result = [] if absolute else list(cwd)
+        for part in parts:
+            if part == ".":
+                continue
+            if part == "..":
+                if result:
+                    result.pop()
+                continue
+            result.append(part)
+        return result
+
+    def _set(self, parent_parts, name, node):
+        key = tuple(p.lower() for p in parent_parts)
+        self._changes.setdefault(key, {})[name.lower()] = node
+
+    def mkdir(self, parts):
+        """Create a directory (and its parents). Returns an error message or None."""
+        for i in range(1, len(parts) + 1):
+            node, _ = self.lookup(parts[:i])
+            if node is None:
+                self._set(parts[:i - 1], parts[i - 1], FakeDir(parts[i - 1], mtime=datetime.now()))
+            elif not node.is_dir or i == len(parts):
+                return f"A subdirectory or file {parts[-1]} already exists."
+        return None
+
+    def write_file(self, parts, content, append=False):
+        """Write (or append to) a file. Returns an error message or None."""
+        if not parts:
+            return "The system cannot find the path specified."
+        parent, _ = self.lookup(parts[:-1])
+        if parent is None or not parent.is_dir:
+            return "The system cannot find the path specified."
+        existing, _ = self.lookup(parts)
+        if existing is not None and (existing.is_dir or existing.denied):
+            return "Access is denied."
+        if append and existing is not None:
+            content = existing.content + content
+        name = existing.name if existing is not None else parts[-1]
+        self._set(parts[:-1], name, FakeFile(name, content, mtime=datetime.now()))
+        return None
+
+    def remove(self, parts):
+        """Delete a file or directory. Returns an error message or None."""
+        node, _ = self.lookup(parts)
+        if node is None or not parts:
+            return "The system cannot find the file specified."
+        if getattr(node, "denied", False):
+            return "Access is denied."
+        self._set(parts[:-1], parts[-1], None)
+        # Forget changes made inside a removed directory
+        key = tuple(p.lower() for p in parts)
+        for changed in [k for k in self._changes if k[:len(key)] == key]:
+            del self._changes[changed]
+        return None
@@ -0,0 +1,74 @@
+"""
+SSH host keys.
+
+On first start a key of each configured type is generated into the state
+directory (services.ssh.host_keys.dir, default state/ssh) and reused from
+then on, so every deployment has its own stable host identity. Parsed keys
+are cached in the process: restarting the SSH service from the admin panel
+only checks the files' modification times.
+"""
+import os
+import threading
+
+import asyncssh
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+DEFAULT_DIR = 'state/ssh'
+
+# Key algorithm -> (file name, generate_private_key options)
+KEY_TYPES = {
+    "ssh-ed25519": ("ssh_host_ed25519_key", {}),
+    "ecdsa-sha2-nistp256": ("ssh_host_ecdsa_key", {}),
+    "ssh-rsa": ("ssh_host_rsa_key", {"key_size": 3072}),
+}
+
+_lock = threading.Lock()
+_cache = {}  # path -> (mtime, SSHKey)
+
+
+def _resolve(path):
+    return path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+
+
+def _load(path):
+    mtime = os.stat(path).st_mtime
+    cached = _cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    key = asyncssh.read_private_key(path)
+    _cache[path] = (mtime, key)
+    return key
+
+
+def load_host_keys(settings=None, logger=None):
+    """
+    Return the host keys (asyncssh SSHKey objects) for services.ssh.host_keys:
+      dir: state directory for generated keys
+      types: key algorithms to generate (default: all of KEY_TYPES)
+      files: extra existing private key files to serve as well
+    """
+    settings = settings or {}
+    state_dir = _resolve(settings.get('dir', DEFAULT_DIR))
+    types = settings.get('types') or list(KEY_TYPES)
+    keys = []
+    with _lock:
+        for algorithm in types:
+            if algorithm not in KEY_TYPES:
+                raise ValueError(f"Unsupported SSH host key type: {algorithm}")
+            filename, options = KEY_TYPES[algorithm]
+            path = os.path.join(state_dir, filename)
+            if not os.path.exists(path):
+                os.makedirs(state_dir, mode=0o700, exist_ok=True)
+                key = asyncssh.generate_private_key(algorithm, **options)
+                # Created with owner-only permissions, like sshd's keys
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(key.export_private_key())
+                key.write_public_key(path + '.pub')
+                if logger:
+                    logger.event("ssh.host_key_generated", algorithm=algorithm, path=path,
+                                 fingerprint=key.get_fingerprint())
+            keys.append(_load(path))
+        for path in settings.get('files') or []:
+            keys.append(_load(_resolve(path)))
+    return keys
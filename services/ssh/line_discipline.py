@@ -0,0 +1,150 @@
+"""
+Line discipline for the SSH shell.
+
+Clients send keystrokes one packet at a time (interactive PTY sessions) or
+whole scripts in one chunk (bots piping commands). LineDiscipline turns
+either into complete command lines: input is buffered until CR or LF, and
+backspace, Ctrl+U, Ctrl+C, left/right/Home/End/Delete and up/down history
+are applied to the line being edited. When echo is on (PTY sessions) it also
+returns the terminal output that redraws the edited line.
+"""
+
+ESC = "\x1b"
+BACKSPACE = ("\x7f", "\x08")
+CTRL_C = "\x03"
+CTRL_U = "\x15"
+
+
+class LineDiscipline:
+    def __init__(self, echo=False, history_size=50, max_line=4096):
+        self.echo = echo
+        self.history_size = history_size
+        self.max_line = max_line
+        self._line = []
+        self._cursor = 0
+        self._history = []
+        self._history_pos = 0
+        self._escape = None  # pending escape sequence, None outside of one
+        self._last_cr = False
+
+    @property
+    def pending(self):
+        """The partial line typed so far."""
+        return "".join(self._line)
+
+    def feed(self, data):
+        """
+        Process received characters. Returns a list of events in order:
+        ("echo", text) to write back to the terminal and ("line", text) for
+        every completed line.
+        """
+        events = []
+        out = []
+
+        def flush_echo():
+            if out:
+                if self.echo:
+                    events.append(("echo", "".join(out)))
+                out.clear()
+
+        for ch in data:
+            if self._escape is not None:
+                self._escape += ch
+                self._handle_escape(out)
+                continue
+            if ch in "\r\n":
+                # CR LF (or LF after CR) ends a single line
+                if ch == "\n" and self._last_cr:
+                    self._last_cr = False
+                    continue
+                self._last_cr = ch == "\r"
+                out.append("\r\n")
+                flush_echo()
+                events.append(("line", self._complete()))
+                continue
+            self._last_cr = False
+            if ch == ESC:
+                self._escape = ESC
+            elif ch in BACKSPACE:
+                if self._cursor > 0:
+                    self._cursor -= 1
+                    del self._line[self._cursor]
+                    out.append("\b" + self._redraw_tail(1))
+            elif ch == CTRL_C:
+                out.append("^C\r\n")
+                flush_echo()
+                self._reset_line()
+                # Like cmd.exe: the line is dropped and a new prompt shown
+                events.append(("line", ""))
+            elif ch == CTRL_U:
+                out.append(self._replace_line(""))
+            elif ch >= " ":
+                if len(self._line) < self.max_line:
+                    self._line.insert(self._cursor, ch)
+                    self._cursor += 1
+                    out.append(ch + self._redraw_tail(0))
+            # Other control characters (tab, Ctrl+D, ...) are ignored
+        flush_echo()
+        return events
+
+    def _complete(self):
+        line = "".join(self._line)
+        self._reset_line()
+        if line.strip():
+            self._history.append(line)
+            del self._history[:-self.history_size]
+        self._history_pos = len(self._history)
+        return line
+
+    def _reset_line(self):
+        self._line = []
+        self._cursor = 0
+        self._history_pos = len(self._history)
+
+    def _redraw_tail(self, erase):
+        """Rewrite the text after the cursor (plus `erase` blanks) and move back."""
+        tail = "".join(self._line[self._cursor:]) + " " * erase
+        return tail + ("\b" * len(tail))
+
+    def _replace_line(self, text):
+        """Replace the whole line (history recall, Ctrl+U); returns the echo."""
+        old_len = len(self._line)
+        echo = "\b" * self._cursor + " " * old_len + "\b" * old_len + text
+        self._line = list(text)
+        self._cursor = len(self._line)
+        return echo
+
+    def _handle_escape(self, out):
+        seq = self._escape
+        if len(seq) == 2:
+            if seq[1] not in "[O":
+                self._escape = None
+            return
+        # CSI / SS3 sequences end with a byte in @..~
+        if not ("@" <= seq[-1] <= "~") and len(seq) < 16:
+            return
+        self._escape = None
+        final = seq[-1]
+        if final == "D" and self._cursor > 0:  # left
+            self._cursor -= 1
+            out.append("\b")
+        elif final == "C" and self._cursor < len(self._line):  # right
+            out.append(self._line[self._cursor])
+            self._cursor += 1
+        elif final == "H" or seq in ("\x1b[1~", "\x1b[7~"):  # home
+            out.append("\b" * self._cursor)
+            self._cursor = 0
+        elif final == "F" or seq in ("\x1b[4~", "\x1b[8~"):  # end
+            out.append("".join(self._line[self._cursor:]))
+            self._cursor = len(self._line)
+        elif seq == "\x1b[3~":  # delete
+            if self._cursor < len(self._line):
+                del self._line[self._cursor]
+                out.append(self._redraw_tail(1))
+        elif final == "A" and self._history_pos > 0:  # up
+            self._history_pos -= 1
+            out.append(self._replace_line(self._history[self._history_pos]))
+        elif final == "B" and self._history_pos < len(self._history):  # down
+            self._history_pos += 1
+            text = self._history[self._history_pos] if self._history_pos < len(self._history) else ""
+            out.append(self._replace_line(text))
@@ -0,0 +1,146 @@
+"""
+SSH session recording in asciicast v2 format (https://docs.asciinema.org).
+
+Each session gets a SessionRecorder that appends "o" (output) and "i"
+(input) events to an in-memory buffer. Nothing touches the disk from the
+SSH event loop: full buffers are handed to one background writer thread
+shared by all sessions, which appends them to "<name>.cast" and, when the
+session ends, compresses the file to "<name>.cast.gz".
+"""
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+RECORDINGS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/sessions'))
+
+_CLOSE = object()
+
+
+class RecordingWriter:
+    """Background thread doing all recording file I/O."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ssh-recording-writer", daemon=True)
+                self._thread.start()
+
+    def write(self, path, data):
+        self._ensure_started()
+        self._queue.put((path, data))
+
+    def close(self, path):
+        self._ensure_started()
+        self._queue.put((path, _CLOSE))
+
+    def _run(self):
+        files = {}
+        while True:
+            path, data = self._queue.get()
+            try:
+                if data is _CLOSE:
+                    f = files.pop(path, None)
+                    if f is not None:
+                        f.close()
+                    self._compress(path)
+                    continue
+                f = files.get(path)
+                if f is None:
+                    f = files[path] = open(path, 'a', encoding='utf-8')
+                f.write(data)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _compress(path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+
+
+recording_writer = RecordingWriter()
+
+
+class SessionRecorder:
+    def __init__(self, name, width=80, height=24, title=None, directory=RECORDINGS_DIR,
+                 flush_bytes=64 * 1024, max_bytes=5 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.name = name
+        self.path = os.path.join(directory, f"{name}.cast")
+        self.flush_bytes = flush_bytes
+        self.max_bytes = max_bytes
+        self._start = time.monotonic()
+        self._buffer = []
+        self._buffered = 0
+        self._written = 0
+        self._closed = False
+        header = {"version": 2, "width": width, "height": height, "timestamp": int(time.time())}
+        if title:
+            header["title"] = title
+        self._add(json.dumps(header) + "\n")
+
+    def output(self, text):
+        self._event("o", text)
+
+    def input(self, text):
+        self._event("i", text)
+
+    def resize(self, width, height):
+        self._event("r", f"{width}x{height}")
+
+    def _event(self, kind, text):
+        if self._closed or not text:
+            return
+        if self._written + self._buffered > self.max_bytes:
+            # Stop recording a session that floods us; note it once
+            self._add(json.dumps([round(time.monotonic() - self._start, 6), "o", "\r\n[recording truncated]\r\n"]) + "\n")
+            self._closed = True
+            return
+        self._add(json.dumps([round(time.monotonic() - self._start, 6), kind, text]) + "\n")
+
+    def _add(self, line):
+        self._buffer.append(line)
+        self._buffered += len(line)
+        if self._buffered >= self.flush_bytes:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            recording_writer.write(self.path, "".join(self._buffer))
+            self._written += self._buffered
+            self._buffer = []
+            self._buffered = 0
+
+    def close(self):
+        """Flush what is left and compress the recording (in the writer thread)."""
+        self.flush()
+        self._closed = True
+        recording_writer.close(self.path)
+
+
+def list_recordings(directory=RECORDINGS_DIR):
+    """Recordings in `directory`, newest first, as (file name, size, mtime)."""
+    try:
+        names = [n for n in os.listdir(directory) if n.endswith(('.cast', '.cast.gz'))]
+    except OSError:
+        return []
+    result = []
+    for name in names:
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        result.append((name, st.st_size, st.st_mtime))
+    result.sort(key=lambda r: r[2], reverse=True)
+    return result
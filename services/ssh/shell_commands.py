@@ -0,0 +1,389 @@
+"""
+Command engine for the fake Windows shell.
+
+A command line is tokenized once into a pipeline (`dir | findstr txt`) and an
+optional output redirection (`> file`, `>> file`, `> nul`). Every stage is
+dispatched through the COMMANDS dict, so the cost of a command does not
+depend on how many commands are registered. Commands with fixed output are
+registered with `static(...)`: the text is built once at import time.
+
+To add a command:
+
+    @command("tasklist")
+    def tasklist(shell, args, stdin):
+        return "..."
+
+Handlers get the WindowsShell, the argument list (quotes removed) and the
+output of the previous pipeline stage (None for the first stage), and
+return the text to print.
+"""
+
+EXIT = "__exit__"
+
+# name (lowercase) -> handler(shell, args, stdin) -> str
+COMMANDS = {}
+
+
+def command(name, *aliases):
+    """Register a handler under `name` and its aliases."""
+    def register(handler):
+        for key in (name, *aliases):
+            COMMANDS[key] = handler
+        return handler
+    return register
+
+
+def static(output, *names):
+    """Register a command that always prints `output`."""
+    def handler(shell, args, stdin):
+        return output
+    for key in names:
+        COMMANDS[key] = handler
+
+
+def tokenize(line):
+    """
+    Split a command line into tokens. Double quotes group words and are
+    removed; |, > and >> are separate tokens even without spaces around them.
+    Returns a list of (token, quoted) pairs.
+    """
+    tokens = []
+    current = []
+    quoted = False
+    in_quotes = False
+    i = 0
+    while i < len(line):
+        ch = line[i]
+        if ch == '"':
+            in_quotes = not in_quotes
+            quoted = True
+        elif not in_quotes and ch in " \t|>":
+            # "2>" redirects stderr; output here has no stderr part
+            stderr = ch == ">" and current == ["2"] and not quoted
+            if (current or quoted) and not stderr:
+                tokens.append(("".join(current), quoted))
+            current = []
+            quoted = False
+            if ch == "|":
+                tokens.append(("|", False))
+            elif ch == ">":
+                if line[i + 1:i + 2] == ">":
+                    tokens.append(("2>" if stderr else ">>", False))
+                    i += 1
+                else:
+                    tokens.append(("2>" if stderr else ">", False))
+        else:
+            current.append(ch)
+        i += 1
+    if current or quoted:
+        tokens.append(("".join(current), quoted))
+    return tokens
+
+
+def parse(line):
+    """Return (stages, redirect) where redirect is (target, append) or None."""
+    stages = [[]]
+    redirect = None
+    tokens = iter(tokenize(line))
+    for token, quoted in tokens:
+        if not quoted and token == "|":
+            stages.append([])
+        elif not quoted and token in (">", ">>", "2>"):
+            target = next(tokens, ("", False))[0]
+            if token != "2>":
+                redirect = (target, token == ">>")
+        else:
+            stages[-1].append(token)
+    return stages, redirect
+
+
+def split_switches(args):
+    """Separate /switches (lowercased) from the other arguments."""
+    switches = {a.lower() for a in args if a.startswith("/")}
+    return switches, [a for a in args if not a.startswith("/")]
+
+
+def lookup(name):
+    """
+    Find the handler for the first word of a stage. Like cmd.exe, "cd.." and
+    "dir/w" work without a space; returns (handler, extra first argument).
+    """
+    key = name.lower()
+    handler = COMMANDS.get(key)
+    if handler is not None:
+        return handler, None
+    for i, ch in enumerate(key):
+        if ch in "./\\":
+            handler = COMMANDS.get(key[:i])
+            if handler is not None:
+                return handler, name[i:]
+            break
+    return None, None
+
+
+def run(shell, line):
+    """Execute a command line and return its output (or EXIT)."""
+    stages, redirect = parse(line)
+    output = None
+    for args in stages:
+        if not args:
+            return "The syntax of the command is incorrect."
+        handler, extra = lookup(args[0])
+        if handler is None:
+            return f"'{args[0]}' is not recognized as an internal or external command,\noperable program or batch file."
+        params = args[1:] if extra is None else [extra] + args[1:]
+        output = handler(shell, params, output)
+        if output == EXIT:
+            return EXIT
+    if redirect is not None:
+        target, append = redirect
+        if not target:
+            return "The syntax of the command is incorrect."
+        if target.lower() == "nul":
+            return ""
+        text = output if output.endswith("\n") or not output else output + "\r\n"
+        return shell.fs.write_file(shell.fs.resolve(shell.cwd, target), text, append=append) or ""
+    return output
+
+
+# --- Commands ---
+
+@command("exit", "logout")
+def exit_(shell, args, stdin):
+    return EXIT
+
+
+@command("cd", "chdir")
+def cd(shell, args, stdin):
+    # cmd.exe takes the rest of the line as the path, spaces included
+    _, parts = split_switches(args)
+    return shell.change_directory(shell.current_user, " ".join(parts))
+
+
+@command("dir")
+def dir_(shell, args, stdin):
+    switches, paths = split_switches(args)
+    return shell.fake_dir_listing(" ".join(paths), bare="/b" in switches)
+
+
+@command("type")
+def type_(shell, args, stdin):
+    if not args:
+        return "The syntax of the command is incorrect."
+    outputs = []
+    for filename in args:
+        node, _ = shell.fs.lookup(shell.fs.resolve(shell.cwd, filename))
+        if node is None:
+            outputs.append(f"The system cannot find the file specified: {filename}")
+        elif node.is_dir or node.denied:
+            outputs.append("Access is denied.")
+        else:
+            outputs.append(node.content)
+    return "\n".join(outputs)
+
+
+@command("mkdir", "md")
+def mkdir(shell, args, stdin):
+    if not args:
+        return "The syntax of the command is incorrect."
+    errors = [shell.fs.mkdir(shell.fs.resolve(shell.cwd, path)) for path in args]
+    return "\n".join(e for e in errors if e)
+
+
+@command("del", "erase")
+def del_(shell, args, stdin):
+    _, paths = split_switches(args)
+    if not paths:
+        return "The syntax of the command is incorrect."
+    errors = []
+    for path in paths:
+        target = shell.fs.resolve(shell.cwd, path)
+        node, _ = shell.fs.lookup(target)
+        if node is not None and node.is_dir:
+            errors.append("Access is denied.")
+        else:
+            errors.append(shell.fs.remove(target))
+    return "\n".join(e for e in errors if e)
+
+
+@command("rmdir", "rd")
+def rmdir(shell, args, stdin):
+    switches, paths = split_switches(args)
+    if not paths:
+        return "The syntax of the command is incorrect."
+    target = shell.fs.resolve(shell.cwd, " ".join(paths))
+    node, _ = shell.fs.lookup(target)
+    if node is None or not node.is_dir:
+        return "The directory name is invalid."
+    if "/s" not in switches and shell.fs.children(tuple(p.lower() for p in target), node):
+        return "The directory is not empty."
+    return shell.fs.remove(target) or ""
+
+
+@command("echo")
+def echo(shell, args, stdin):
+    return " ".join(args) if args else "ECHO is on."
+
+
+@command("whoami")
+def whoami(shell, args, stdin):
+    return f"domain\\{shell.current_user}"
+
+
+@command("net")
+def net(shell, args, stdin):
+    if not args or args[0].lower() != "user":
+        return "The syntax of this command is:\n\nNET\n    [ ACCOUNTS | COMPUTER | CONFIG | CONTINUE | FILE | GROUP | HELP |\n      HELPMSG | LOCALGROUP | PAUSE | SESSION | SHARE | START |\n      STATISTICS | STOP | TIME | USE | USER | VIEW ]"
+    if len(args) == 1:
+        user_list = "  ".join(shell.get_valid_usernames())
+        return (
+            f"User accounts for \\DC01\n"
+            "---------------------------------------------------\n"
+            f"{user_list}\n\n"
+            "The command completed successfully."
+        )
+    user_input = " ".join(args[1:])
+    # Find the actual username from config, case-insensitive match
+    matched_user = next((u for u in shell.get_valid_usernames() if u.lower() == user_input.lower()), None)
+    if matched_user is None:
+        return f"The user name could not be found: {user_input}"
+    return (
+        f"User name                    {matched_user}\n"
+        f"Full Name                    {matched_user.capitalize()} User\n"
+        "Account active               Yes\n"
+        "Account expires              Never\n"
+        "Password last set            1/1/2025 10:00 AM\n"
+        "Password expires             Never\n"
+        "Password changeable          1/1/2025 10:00 AM\n"
+        "Password required            Yes\n"
+        "User may change password     Yes\n"
+        "\nThe command completed successfully."
+    )
+
+
+@command("powershell", "pwsh")
+def powershell(shell, args, stdin):
+    return (
+        "Windows PowerShell\n"
+        "Copyright (C) Microsoft Corporation. All rights reserved.\n\n"
+        f"PS {shell.current_dir}>"
+    )
+
+
+@command("help")
+def help_(shell, args, stdin):
+    names = sorted(k.upper() for k in COMMANDS)
+    return "For more information on a specific command, type HELP command-name\n" + "\n".join(names)
+
+
+# --- Filters (used after a pipe) ---
+
+def _filter_source(shell, files, stdin):
+    """Lines to filter: from the given files, or from the previous stage."""
+    if not files:
+        return (stdin or "").splitlines()
+    lines = []
+    for filename in files:
+        node, _ = shell.fs.lookup(shell.fs.resolve(shell.cwd, filename))
+        if node is not None and not node.is_dir and not node.denied:
+            lines.extend(node.content.splitlines())
+    return lines
+
+
+@command("findstr")
+def findstr(shell, args, stdin):
+    switches, rest = split_switches(args)
+    if not rest:
+        return "FINDSTR: Bad command line"
+    pattern, files = rest[0], rest[1:]
+    ignore_case = "/i" in switches
+    invert = "/v" in switches
+    # findstr treats space-separated words as alternatives
+    words = [w.lower() if ignore_case else w for w in pattern.split()]
+    result = []
+    for line in _filter_source(shell, files, stdin):
+        text = line.lower() if ignore_case else line
+        if any(w in text for w in words) != invert:
+            result.append(line)
+    return "\n".join(result)
+
+
+@command("find")
+def find(shell, args, stdin):
+    switches, rest = split_switches(args)
+    if not rest:
+        return "FIND: Parameter format not correct"
+    needle, files = rest[0], rest[1:]
+    ignore_case = "/i" in switches
+    if ignore_case:
+        needle = needle.lower()
+    result = [
+        line for line in _filter_source(shell, files, stdin)
+        if (needle in (line.lower() if ignore_case else line)) != ("/v" in switches)
+    ]
+    if "/c" in switches:
+        return str(len(result))
+    return "\n".join(result)
+
+
+@command("sort")
+def sort(shell, args, stdin):
+    switches, files = split_switches(args)
+    return "\n".join(sorted(_filter_source(shell, files, stdin), key=str.lower, reverse="/r" in switches))
+
+
+@command("more")
+def more(shell, args, stdin):
+    return "\n".join(_filter_source(shell, args, stdin))
+
+
+# --- Static outputs, built once ---
+
+static("\n" * 50, "cls")
+static("DC01", "hostname")
+static("Microsoft Windows [Version 10.0.17763.1]", "ver")
+static(
+    "Windows IP Configuration\n\n"
+    "Ethernet adapter Ethernet:\n"
+    "   Connection-specific DNS Suffix  . : localdomain\n"
+    "   IPv4 Address. . . . . . . . . . . : 192.168.1.100\n"
+    "   Subnet Mask . . . . . . . . . . . : 255.255.255.0\n"
+    "   Default Gateway . . . . . . . . . : 192.168.1.1",
+    "ipconfig",
+)
+static(
+    "Host Name:                 DC01\n"
+    "OS Name:                   Microsoft Windows Server 2019 Standard\n"
+    "OS Version:                10.0.17763 N/A Build 17763\n"
+    "OS Manufacturer:           Microsoft Corporation\n"
+    "OS Configuration:          Standalone Server\n"
+    "OS Build Type:             Multiprocessor Free\n"
+    "Registered Owner:          Windows User\n"
+    "Registered Organization:   Contoso\n"
+    "Product ID:                12345-67890-ABCDE-FGHIJ\n"
+    "Original Install Date:     1/1/2025, 9:00:00 AM\n"
+    "System Boot Time:          6/12/2025, 8:00:00 AM\n"
+    "System Manufacturer:       Dell Inc.\n"
+    "System Model:              PowerEdge T40\n"
+    "System Type:               x64-based PC\n"
+    "Processor(s):              1 Processor(s) Installed.\n"
+    "                           [01]: Intel64 Family 6 Model 85 Stepping 7 GenuineIntel ~2200 Mhz\n"
+    "BIOS Version:              Dell Inc. 1.0.0, 12/01/2024\n"
+    "Windows Directory:         C:\\Windows\n"
+    "System Directory:          C:\\Windows\\system32\n"
+    "Boot Device:               \\Device\\HarddiskVolume1\n"
+    "System Locale:             en-us;English (United States)\n"
+    "Time Zone:                 (UTC+01:00) Amsterdam, Berlin, Bern, Rome, Stockholm, Vienna\n"
+    "Total Physical Memory:     8,192 MB\n"
+    "Available Physical Memory: 6,000 MB\n"
+    "Virtual Memory: Max Size:  9,216 MB\n"
+    "Virtual Memory: Available: 7,000 MB\n"
+    "Virtual Memory: In Use:    2,216 MB\n"
+    "Page File Location(s):     C:\\pagefile.sys\n"
+    "Domain:                    CONTOSO\n"
+    "Logon Server:              \\DC01\n"
+    "Hotfix(s):                 5 Hotfix(s) Installed.\n"
+    "Network Card(s):           1 NIC(s) Installed.\n"
+    "                           [01]: Intel(R) Ethernet Connection\n",
+    "systeminfo",
+)
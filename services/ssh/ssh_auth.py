@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+
+class _UserPolicy:
+    __slots__ = ("passwords", "accept_any", "accept_after")
+
+    def __init__(self, passwords, accept_any, accept_after):
+        self.passwords = passwords
+        self.accept_any = accept_any
+        self.accept_after = accept_after
+
+
+class SSHCredentials:
+    """
+    SSH credential checks, compiled once from services.ssh in honeypot.yaml
+    and shared by every connection.
+
+    Each entry of `users` becomes a dict lookup by username:
+      password / passwords: accepted password(s)
+      accept_any: accept any password for this username
+      accept_after: accept any password once this source IP has failed this
+                    many times (overrides auth.accept_after for this user)
+    auth.accept_after applies the same to every other username (0 = never),
+    so bots that keep guessing eventually get a shell to play in. Failures
+    are counted per source IP in an LRU map capped at auth.max_tracked_ips.
+    """
+
+    def __init__(self, ssh_config):
+        auth = ssh_config.get("auth") or {}
+        self.accept_after = int(auth.get("accept_after", 0) or 0)
+        self.max_tracked_ips = int(auth.get("max_tracked_ips", 10000))
+        self._users = {}
+        for user in ssh_config.get("users", []):
+            passwords = set(user.get("passwords") or [])
+            if user.get("password") is not None:
+                passwords.add(user["password"])
+            accept_after = user.get("accept_after")
+            self._users[user["username"]] = _UserPolicy(
+                frozenset(str(p) for p in passwords),
+                bool(user.get("accept_any", False)),
+                self.accept_after if accept_after is None else int(accept_after),
+            )
+        self._lock = threading.Lock()
+        self._failures = OrderedDict()
+
+    def check(self, username, password, src_ip=None):
+        """
+        Return the reason the login is accepted ("password", "accept_any" or
+        "accept_after"), or None if it is rejected (and counted as a failure).
+        """
+        policy = self._users.get(username)
+        if policy is not None:
+            if password in policy.passwords:
+                return "password"
+            if policy.accept_any:
+                return "accept_any"
+            accept_after = policy.accept_after
+        else:
+            accept_after = self.accept_after
+        failures = self._count_failure(src_ip)
+        if accept_after and failures >= accept_after:
+            return "accept_after"
+        return None
+
+    def _count_failure(self, src_ip):
+        """Count one more failure for src_ip, return the count before it."""
+        if not src_ip:
+            return 0
+        with self._lock:
+            failures = self._failures.pop(src_ip, 0)
+            self._failures[src_ip] = failures + 1
+            if len(self._failures) > self.max_tracked_ips:
+                self._failures.popitem(last=False)
+        return failures
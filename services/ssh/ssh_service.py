@@ -1,150 +1,466 @@
 import asyncio
 import asyncssh
 import sys
+from collections import deque
 from services.ssh.windows_shell import WindowsShell
 from services.ssh.windows_banner import generate_banner
+from services.ssh.ssh_auth import SSHCredentials
+from services.ssh.fake_fs import DEFAULT_IMAGE, FakeFileSystem
+from services.ssh.line_discipline import LineDiscipline
+from services.ssh.session_recorder import SessionRecorder
+from services.ssh.connection_limits import DEFAULTS as DEFAULT_LIMITS, connection_limits
+from services.ssh.host_keys import load_host_keys
+from core.control_plane import control_plane
+from core.rate_limiter import rate_limiter
+from core.logger import forward_log_events
+import copy
+import multiprocessing
 import os
+import socket
+import threading
+import time
 
 
 class SSHHoneypotSession(asyncssh.SSHServerSession):
-    def __init__(self, logger, config):
+    def __init__(self, logger, config, fake_fs, on_activity=None):
         self._input = ""
+        self._on_activity = on_activity
         self._chan = None
         self.logger = logger
         self.config = config
         users = config["services"]["ssh"].get("users", [])
-        self.shell = WindowsShell(users=users)
-        
-   
+        self.shell = WindowsShell(users=users, fs=fake_fs)
+        # Input is assembled into lines here (asyncssh's line editor is off),
+        # so PTY and non-PTY clients are handled the same way
+        self.line_discipline = LineDiscipline()
+        self._pty = False
+        self._pending = deque()
+        self._waiting = False
+        self._closing = False
+        self._eof = False
+        self._term_size = (80, 24)
+        self.recorder = None
 
-     
     def connection_made(self, chan):
         self._chan = chan
         self.peername = chan.get_extra_info('peername')
         self.username = self._chan.get_extra_info('username')
         if self.peername:
             host, port =self.peername
-            self.logger.info(f"New SSH connection from {self.username}@{host}:{port}", service="ssh")
+            self.logger.event("ssh.connection", src_ip=host, src_port=port, user=self.username)
 
     def session_started(self):
         host, port =self.peername
-        self.logger.info(f" Shell session started from {self.username}@{host}:{port} ", service="ssh")
+        self.recorder = self._start_recording()
+        recording = self.recorder.name if self.recorder else None
+        self.logger.event("ssh.session_started", src_ip=host, src_port=port, user=self.username, recording=recording)
         banner  = generate_banner(self.username)
-        self._chan.write(banner)
+        self._write(banner)
 
     def eof_received(self):
-        self.logger.info(f"EOF received for user {self.username}")
-        exit_signal = self.shell.handle_command(self.username, "exit")
-        if exit_signal == "__exit__":
-            self._chan.write("Logging off...\n")
-            self._chan.exit(0)
+        host, port = self.peername
+        self.logger.event("ssh.eof", src_ip=host, src_port=port, user=self.username)
+        # Run a last line sent without a newline, then log off
+        partial = self.line_discipline.pending
+        if partial.strip():
+            self._pending.append(partial)
+        self._eof = True
+        self._process_lines()
         return True
 
+    def pty_requested(self, term_type, term_size, term_modes):
+        # Interactive terminal: the client expects us to echo and to send CRLF
+        self._pty = True
+        self.line_discipline.echo = True
+        if term_size[0] and term_size[1]:
+            self._term_size = term_size[:2]
+        return True
+
+    def terminal_size_changed(self, width, height, pixwidth, pixheight):
+        if self.recorder:
+            self.recorder.resize(width, height)
+
+    def _start_recording(self):
+        settings = self.config["services"]["ssh"].get("recording") or {}
+        if not settings.get("enabled", False):
+            return None
+        host, port = self.peername
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{host.replace(':', '-')}_{port}"
+        width, height = self._term_size
+        return SessionRecorder(
+            name, width, height,
+            title=f"{self.username}@{host}:{port}",
+            flush_bytes=int(settings.get("flush_bytes", 64 * 1024)),
+            max_bytes=int(settings.get("max_bytes", 5 * 1024 * 1024)),
+        )
+
+    def _send(self, text):
+        # Recording only appends to memory; the file is written off the loop
+        if self.recorder:
+            self.recorder.output(text)
+        self._chan.write(text)
 
+    def _write(self, text):
+        if self._pty:
+            text = text.replace("\r\n", "\n").replace("\n", "\r\n")
+        self._send(text)
 
     def data_received(self, data, datatype):
+        if self._on_activity:
+            self._on_activity()
+        if self.recorder:
+            self.recorder.input(data)
+        for kind, text in self.line_discipline.feed(data):
+            if kind == "echo":
+                self._send(text)
+            else:
+                self._pending.append(text)
+        self._process_lines()
 
+    def _process_lines(self):
+        """Run complete lines in order, pausing while a line is tarpitted."""
         host, port =self.peername
-        self.logger.info(f"{self.username}@{host}:{port} executed  command: {data.strip()}   ", service="ssh")
-        response = self.shell.handle_command(self.username,data.strip())
-        if response == "__exit__":
-            self._chan.write("Logging off...\n")
+        while self._pending and not self._waiting and not self._closing:
+            line = self._pending.popleft()
+            verdict = rate_limiter.check('ssh', host, self.logger)
+            if not verdict.allowed:
+                continue
+            if verdict.delay:
+                # Tarpit: answer later without holding up the event loop
+                self._waiting = True
+                asyncio.get_running_loop().call_later(verdict.delay, self._resume, line, verdict.log)
+                return
+            self._handle_command(line, verdict.log)
+        if self._eof and not self._pending and not self._waiting:
+            self._log_off()
+
+    def _log_off(self):
+        if not self._closing:
+            self._closing = True
+            self._write("Logging off...\n")
             self._chan.exit(0)  # Close session gracefully
-            return 
+
+    def _resume(self, line, log):
+        self._waiting = False
+        self._handle_command(line, log)
+        self._process_lines()
+
+    def _handle_command(self, data, log=True):
+        if self._closing:
+            return
+        host, port =self.peername
+        command = data.strip()
+        if log and command:
+            self.logger.event("ssh.command", src_ip=host, src_port=port, user=self.username, command=command)
+        response = self.shell.handle_command(self.username, command)
+        if response == "__exit__":
+            self._log_off()
+            return
         # Show the correct prompt reflecting the current directory
         prompt = f"{self.shell.current_dir}> "
-        self._chan.write(response + "\n")
-        self._chan.write(prompt)
+        self._write(response + "\n")
+        self._write(prompt)
 
     def connection_lost(self, exc):
         host, port =self.peername
-        self.logger.info(f"{self.username}@{host}:{port}  SSH session ended" , service="ssh")
+        if self.recorder:
+            self.recorder.close()
+        self.logger.event("ssh.session_closed", src_ip=host, src_port=port, user=self.username)
 
     def shell_requested(self):
         host, port =self.peername
-        self.logger.info(f"{self.username}@{host}:{port}  Shell requested", service="ssh")
+        self.logger.event("ssh.shell_requested", src_ip=host, src_port=port, user=self.username)
         return True  
     
 class SSHHoneypotServer(asyncssh.SSHServer):
-    def __init__(self, users, logger, config):
-        self.users = users
+    def __init__(self, credentials, fake_fs, logger, config):
+        self.credentials = credentials
+        self.fake_fs = fake_fs
         self.logger = logger
         self.config = config
 
     def connection_requested(self, dest_host, dest_port, orig_host, orig_port):
-        self.logger.info(f"Connection requested from {orig_host}:{orig_port} to {dest_host}:{dest_port}", service="ssh")
+        self.logger.event("ssh.forward_requested", src_ip=orig_host, src_port=orig_port, dest_host=dest_host, dest_port=dest_port)
         return self
     
     def connection_made(self, conn):
         self.peername = conn.get_extra_info('peername')
+        self._conn = conn
+        self._admitted = False
+        self._timer = None
+        self.username = None
+        host, port = self.peername
+        if not rate_limiter.check('ssh', host, self.logger).allowed:
+            conn.abort()
+            return
+        refused = connection_limits.admit(host)
+        if refused:
+            self.logger.event("ssh.connection_refused", level="WARNING", src_ip=host, src_port=port, reason=refused)
+            conn.abort()
+            return
+        self._admitted = True
+        self._loop = asyncio.get_running_loop()
+        self._last_activity = self._loop.time()
+        if connection_limits.login_grace_time:
+            self._timer = self._loop.call_later(connection_limits.login_grace_time, self._evict, "login_grace_time")
+
+    def connection_lost(self, exc):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._admitted:
+            self._admitted = False
+            connection_limits.release(self.peername[0])
+
+    def auth_completed(self):
+        if self._timer:
+            self._timer.cancel()
+        self._authenticated_at = self._last_activity = self._loop.time()
+        self._check_timeouts()
 
+    def touch(self):
+        """Note input from the client (restarts the idle timeout)."""
+        self._last_activity = self._loop.time()
+
+    def _check_timeouts(self):
+        # One timer per connection, re-armed for the nearest deadline, instead
+        # of rescheduling on every keystroke
+        self._timer = None
+        now = self._loop.time()
+        deadlines = []
+        if connection_limits.max_session_duration:
+            deadline = self._authenticated_at + connection_limits.max_session_duration
+            if now >= deadline:
+                return self._evict("max_session_duration")
+            deadlines.append(deadline)
+        if connection_limits.idle_timeout:
+            deadline = self._last_activity + connection_limits.idle_timeout
+            if now >= deadline:
+                return self._evict("idle_timeout")
+            deadlines.append(deadline)
+        if deadlines:
+            self._timer = self._loop.call_at(min(deadlines), self._check_timeouts)
+
+    def _evict(self, reason):
+        self._timer = None
+        host, port = self.peername
+        connection_limits.count_eviction(reason)
+        self.logger.event("ssh.session_evicted", level="WARNING", src_ip=host, src_port=port, user=self.username, reason=reason)
+        self._conn.disconnect(asyncssh.DISC_BY_APPLICATION, f"Disconnected: {reason.replace('_', ' ')}")
 
     def begin_auth(self, username):
+        self.username = username
         return True
 
     def password_auth_supported(self):
         return True
 
-    def validate_password(self, username, password):
+    async def validate_password(self, username, password):
         host , port = self.peername
-        for user in self.users:
-            if user['username'] == username and user['password'] == password:
-                self.logger.info(f"Login success: {username}@{host}:{port}", service="ssh")
-                return True
-        self.logger.warning(f"Login failed: {username}@{host}:{port} with password: {password}", service="ssh")
+        verdict = rate_limiter.check('ssh', host, self.logger)
+        if not verdict.allowed:
+            self._conn.abort()
+            return False
+        if verdict.delay:
+            await asyncio.sleep(verdict.delay)
+        accepted = self.credentials.check(username, password, host)
+        if accepted:
+            self.logger.event("ssh.login_success", src_ip=host, src_port=port, user=username, accepted=accepted)
+            return True
+        if verdict.log:
+            self.logger.event("ssh.login_failed", level="WARNING", src_ip=host, src_port=port, user=username, password=password)
+        else:
+            # Sampled out: not logged, but still counted in the credential stats
+            self.logger.record_credentials("ssh", host, username, password)
         return False
 
     def session_requested(self):
-        return SSHHoneypotSession( self.logger, self.config )
+        return SSHHoneypotSession( self.logger, self.config, self.fake_fs, on_activity=self.touch )
     
 ssh_server_instance = None
 ssh_server_event = None
 
 def set_ssh_status(status):
-    import json
-    status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/service_status.json'))
+    control_plane.set_status('ssh', status)
+
+async def _listen(config, logger, host_keys, **options):
+    """Start an asyncssh server for the honeypot (in this process or in a worker)."""
+    # Compiled once, shared by every connection
+    credentials = SSHCredentials(config["services"]["ssh"])
+    connection_limits.configure(config["services"]["ssh"].get("limits"))
+    usernames = [user['username'] for user in config["services"]["ssh"].get("users", [])]
+    fake_fs = FakeFileSystem.load(config["services"]["ssh"].get("fake_fs", DEFAULT_IMAGE), usernames)
+    return await asyncssh.listen(
+        server_factory=lambda: SSHHoneypotServer(credentials, fake_fs, logger, config),
+        server_host_keys=host_keys,
+        encoding='utf-8',
+        line_editor=False,  # SSHHoneypotSession does its own line editing
+        # Login grace time is enforced (and counted) by SSHHoneypotServer
+        login_timeout=None if connection_limits.login_grace_time else 120,
+        keepalive_interval=connection_limits.keepalive_interval,
+        keepalive_count_max=3,
+        **options,
+    )
+
+def _run_worker(config, host_keys, event_queue, stop_event, rate_limit):
+    """Entry point of an SSH worker process (spawned, so it starts from a clean interpreter)."""
+    from core.logger import QueueLogger
+    # Each worker keeps its own rate limit buckets and connection counts
+    rate_limiter.configure(rate_limit)
+    logger = QueueLogger(event_queue)
+    keys = [asyncssh.import_private_key(data) for data in host_keys]
     try:
-        if os.path.exists(status_file):
-            with open(status_file, 'r') as f:
-                data = json.load(f)
-        else:
-            data = {}
-        data['ssh'] = status
-        with open(status_file, 'w') as f:
-            json.dump(data, f)
-    except Exception:
+        asyncio.run(_serve_worker(config, logger, keys, stop_event))
+    except KeyboardInterrupt:
         pass
 
+async def _serve_worker(config, logger, host_keys, stop_event):
+    port = config["services"]["ssh"]["port"]
+    try:
+        # Every worker listens on the port with SO_REUSEPORT; the kernel
+        # spreads incoming connections over them
+        server = await _listen(config, logger, host_keys, host='', port=port, reuse_port=True)
+    except (OSError, ValueError, asyncssh.Error) as e:
+        logger.event("ssh.server_error", level="ERROR", port=port, error=str(e), worker=os.getpid())
+        return
+    await asyncio.get_running_loop().run_in_executor(None, stop_event.wait)
+    server.close()
+    await server.wait_closed()
+
+class SSHWorkerPool:
+    """
+    services.ssh.workers > 1: the SSH server runs in N spawned processes, so
+    key exchanges and sessions use N cores. Log events are forwarded to the
+    orchestrator's logger over a queue. Stopped like an asyncssh server, with
+    close() and wait_closed().
+
+    Rate limits, max_per_ip and connection metrics are kept per worker;
+    max_connections is split evenly between the workers.
+    """
+
+    def __init__(self, config, logger, host_keys, workers, shutdown_timeout=5):
+        self.config = config
+        self.logger = logger
+        # Exported once here, so workers never generate keys themselves
+        self.host_keys = [key.export_private_key() for key in host_keys]
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        self._ctx = multiprocessing.get_context('spawn')
+        self._processes = []
+        self._stop_event = None
+        self._events = None
+        self._forwarder = None
+
+    def start(self):
+        config = copy.deepcopy(self.config)
+        limits = config["services"]["ssh"]["limits"] = dict(config["services"]["ssh"].get("limits") or {})
+        max_connections = int(limits.get("max_connections", DEFAULT_LIMITS["max_connections"]) or 0)
+        if max_connections:
+            limits["max_connections"] = -(-max_connections // self.workers)
+        self._stop_event = self._ctx.Event()
+        self._events = self._ctx.Queue(maxsize=10000)
+        self._forwarder = threading.Thread(target=forward_log_events, args=(self._events, self.logger),
+                                           name='ssh-worker-log-forwarder', daemon=True)
+        self._forwarder.start()
+        for _ in range(self.workers):
+            process = self._ctx.Process(target=_run_worker, daemon=True,
+                                        args=(config, self.host_keys, self._events, self._stop_event,
+                                              rate_limiter.settings))
+            process.start()
+            self._processes.append(process)
+
+    def is_alive(self):
+        return any(p.is_alive() for p in self._processes)
+
+    async def wait_exited(self):
+        """
+        Return once every worker process has exited. Waits on the processes'
+        sentinels from the loop, so no executor thread is held and
+        cancelling it leaves nothing behind.
+        """
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            exited = loop.create_future()
+            loop.add_reader(process.sentinel, lambda: exited.done() or exited.set_result(None))
+            try:
+                await exited
+            finally:
+                loop.remove_reader(process.sentinel)
+            process.join()  # already exited, just reaps it
+
+    def close(self):
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    async def wait_closed(self):
+        if self._stop_event is None:
+            return
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, self.shutdown_timeout + 1)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._events.put(None)
+        await loop.run_in_executor(None, self._forwarder.join, self.shutdown_timeout)
+        self._stop_event = None
+
 async def start_ssh_server(config, logger):
     global ssh_server_instance, ssh_server_event
     port = config["services"]["ssh"]["port"]
-    users = config["services"]["ssh"]["users"]
-    logger.info(f"Starting SSH honeypot on port {port}...")
+    workers = int(config["services"]["ssh"].get("workers", 1) or 1)
+    if workers > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+        logger.event("ssh.workers_unsupported", level="WARNING", workers=workers)
+        workers = 1
+    logger.event("ssh.server_starting", port=port, workers=workers)
     set_ssh_status("running")
+    failed = False
     try:
-        ssh_server_event = asyncio.Event()
-        ssh_server_instance = await asyncssh.listen(
-            '', port,
-            server_factory=lambda: SSHHoneypotServer(users, logger, config),
-            server_host_keys=['ssh_host_key'],
-            encoding='utf-8'
-        )
-        logger.info("SSH honeypot running. Press Ctrl+C to stop.", service="ssh")
+        ssh_server_event = stop_requested = asyncio.Event()
+        # Generated on first run, then served from the in-process cache
+        host_keys = await asyncio.get_running_loop().run_in_executor(
+            None, load_host_keys, config["services"]["ssh"].get("host_keys"), logger)
+        if workers > 1:
+            pool = SSHWorkerPool(config, logger, host_keys, workers)
+            pool.start()
+            ssh_server_instance = pool
+            logger.event("ssh.server_running", port=port, workers=workers)
+            stopped = asyncio.ensure_future(ssh_server_event.wait())
+            exited = asyncio.ensure_future(pool.wait_exited())
+            await asyncio.wait([stopped, exited], return_when=asyncio.FIRST_COMPLETED)
+            if not stop_requested.is_set():
+                # Every worker died on its own (e.g. port in use, logged by the worker)
+                stopped.cancel()
+                failed = True
+                set_ssh_status("error")
+                await pool.wait_closed()
+                ssh_server_instance = None
+            else:
+                # stop_ssh_server() closes the pool; the workers may be gone already
+                stopped.cancel()
+                exited.cancel()
+            return
+        ssh_server_instance = await _listen(config, logger, host_keys, host='', port=port)
+        logger.event("ssh.server_running", port=port)
         await ssh_server_event.wait()  # Keeps the server alive
-    except (OSError, asyncssh.Error) as e:
-        logger.error(f"Failed to start SSH server: {e}", service="ssh")
+    except (OSError, ValueError, asyncssh.Error) as e:
+        logger.event("ssh.server_error", level="ERROR", port=port, error=str(e))
+        failed = True
         set_ssh_status("error")
     finally:
-        set_ssh_status("stopped")
+        if not failed:
+            set_ssh_status("stopped")
 
 async def stop_ssh_server():
     global ssh_server_instance, ssh_server_event
-    if ssh_server_instance:
-        ssh_server_instance.close()
-        await ssh_server_instance.wait_closed()
-        ssh_server_instance = None
+    # Set first: in worker mode the workers exit during wait_closed(), and
+    # start_ssh_server() must know that was requested, not a crash
     if ssh_server_event:
         ssh_server_event.set()
         ssh_server_event = None
+    if ssh_server_instance:
+        server, ssh_server_instance = ssh_server_instance, None
+        server.close()
+        await server.wait_closed()
     set_ssh_status("stopped")
 
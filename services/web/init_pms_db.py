@@ -1,14 +1,83 @@
-from core.config_manager import ConfigManager
-from core.logger import Logger
-import sqlite3
-from datetime import datetime
+import csv
+import glob
+import json
 import os
+import sqlite3
+import time
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'pms.db')
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+
+# Bump when the schema below changes; stored in PRAGMA user_version
+SCHEMA_VERSION = 1
+
+PRODUCTION_COLUMNS = ('reference', 'family', 'product', 'quantity', 'status')
+
+DEFAULT_PRODUCTS = [
+    ('REF001', 'FamilyA', 'Widget A', 120, 'Completed'),
+    ('REF002', 'FamilyB', 'Widget B', 75, 'In Progress'),
+    ('REF003', 'FamilyC', 'Widget C', 200, 'Completed'),
+    ('REF004', 'FamilyD', 'Widget D', 50, 'Pending'),
+]
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS production (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    reference TEXT NOT NULL,
+    family TEXT NOT NULL,
+    product TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    status TEXT NOT NULL
+);
+-- Change counter for the production table, bumped by triggers. The
+-- dashboard uses it to know when its cached pages are stale, whichever
+-- process or connection made the change.
+CREATE TABLE IF NOT EXISTS pms_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO pms_meta (key, value) VALUES ('production_generation', 0);
+CREATE TRIGGER IF NOT EXISTS production_ai AFTER INSERT ON production BEGIN
+    UPDATE pms_meta SET value = value + 1 WHERE key = 'production_generation';
+END;
+CREATE TRIGGER IF NOT EXISTS production_au AFTER UPDATE ON production BEGIN
+    UPDATE pms_meta SET value = value + 1 WHERE key = 'production_generation';
+END;
+CREATE TRIGGER IF NOT EXISTS production_ad AFTER DELETE ON production BEGIN
+    UPDATE pms_meta SET value = value + 1 WHERE key = 'production_generation';
+END;
+'''
+
 
 class PMSDatabaseInitializer:
+    """
+    Prepares the PMS database for the web honeypot.
+
+    The database is kept across restarts, so whatever attackers wrote stays
+    in place. Tables are only created and seeded when the schema version
+    stored in the file is older than SCHEMA_VERSION, or when
+    services.web.pms.reset_on_start is set. On a normal start this is a
+    single PRAGMA read, whatever the size of the seed data.
+
+    services.web.pms options:
+      reset_on_start: drop and re-seed the tables on every start
+      snapshot_before_reset: copy the database to snapshot_dir before a reset
+      snapshot_dir: where snapshots go (default logs/pms_snapshots)
+      max_snapshots: snapshots kept, the oldest are deleted (default 5, 0 = all)
+      seed_file: CSV (with a header row) or JSON list of production records,
+                 used instead of the built-in decoy products
+    """
+
     @staticmethod
-    def initialize(config, logger=None):
-        import sqlite3
-        db_path = os.path.join(os.path.dirname(__file__), 'pms.db')
+    def initialize(config, logger=None, db_path=DB_PATH):
+        web_config = config['services']['web']
+        pms_config = web_config.get('pms', {}) or {}
+        reset = pms_config.get('reset_on_start', False)
         db_exists = os.path.exists(db_path)
         if logger:
             if not db_exists:
@@ -16,51 +85,81 @@ class PMSDatabaseInitializer:
             else:
                 logger.info(f"Opening existing PMS database file at {db_path}", service="web")
         conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        # Drop and recreate users and production tables
-        c.execute('DROP TABLE IF EXISTS users')
-        c.execute('DROP TABLE IF EXISTS production')
-        # Create users table
-        c.execute('''CREATE TABLE users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            password TEXT NOT NULL
-        )''')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if db_exists and version == SCHEMA_VERSION and not reset:
+                if logger:
+                    logger.info("PMS database is up to date, keeping existing data.", service="web")
+                return
+            if db_exists and reset and pms_config.get('snapshot_before_reset', True):
+                PMSDatabaseInitializer._snapshot(conn, pms_config, logger)
+            # Tables from before schema versioning were always recreated at
+            # start, so they only ever hold seed data: re-seed them as well
+            PMSDatabaseInitializer._recreate(conn, web_config.get('users', []),
+                                             PMSDatabaseInitializer._load_products(pms_config.get('seed_file')),
+                                             logger)
+        finally:
+            conn.close()
         if logger:
-            logger.info("Created 'users' table in PMS database.", service="web")
-        # Create production table with new schema
-        c.execute('''CREATE TABLE production (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            reference TEXT NOT NULL,
-            family TEXT NOT NULL,
-            product TEXT NOT NULL,
-            quantity INTEGER NOT NULL,
-            status TEXT NOT NULL
-        )''')
+            logger.info("--- PMS DB INIT END ---", service="web")
+        print("PMS database initialized.")
+
+    @staticmethod
+    def _recreate(conn, users, products, logger=None):
+        with conn:
+            conn.execute('DROP TABLE IF EXISTS users')
+            conn.execute('DROP TABLE IF EXISTS production')
+        conn.executescript(SCHEMA)
+        with conn:
+            conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)",
+                             [(user['username'], user['password']) for user in users])
+            conn.executemany("INSERT INTO production (reference, family, product, quantity, status) "
+                             "VALUES (?, ?, ?, ?, ?)", products)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         if logger:
-            logger.info("Created 'production' table in PMS database.", service="web")
-        # Insert users from config
-        web_users = config['services']['web'].get('users', [])
-        for user in web_users:
-            c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (user['username'], user['password']))
-            if logger:
-                logger.info(f"Inserted user: {user['username']}", service="web")
-        # Insert mock production data
-        prod_data = [
-            ('REF001', 'FamilyA', 'Widget A', 120, 'Completed'),
-            ('REF002', 'FamilyB', 'Widget B', 75, 'In Progress'),
-            ('REF003', 'FamilyC', 'Widget C', 200, 'Completed'),
-            ('REF004', 'FamilyD', 'Widget D', 50, 'Pending'),
+            logger.info(f"Seeded PMS database with {len(users)} users and {len(products)} production records.",
+                        service="web")
+
+    @staticmethod
+    def _load_products(seed_file):
+        if not seed_file:
+            return DEFAULT_PRODUCTS
+        path = seed_file if os.path.isabs(seed_file) else os.path.join(PROJECT_ROOT, seed_file)
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            if path.endswith('.json'):
+                records = json.load(f)
+            else:
+                records = list(csv.DictReader(f))
+        return [
+            (str(r['reference']), str(r['family']), str(r['product']), int(r['quantity']), str(r['status']))
+            for r in records
         ]
-        for p in prod_data:
-            c.execute("INSERT INTO production (reference, family, product, quantity, status) VALUES (?, ?, ?, ?, ?)", p)
-            if logger:
-                logger.info(f"Inserted production record: {p}", service="web")
-        conn.commit()
-        conn.close()
+
+    @staticmethod
+    def _snapshot(conn, pms_config, logger=None):
+        snapshot_dir = pms_config.get('snapshot_dir', 'logs/pms_snapshots')
+        if not os.path.isabs(snapshot_dir):
+            snapshot_dir = os.path.join(PROJECT_ROOT, snapshot_dir)
+        os.makedirs(snapshot_dir, exist_ok=True)
+        path = os.path.join(snapshot_dir, f"pms-{time.strftime('%Y%m%d-%H%M%S')}.db")
+        # Online backup: consistent even if the file is in WAL mode
+        target = sqlite3.connect(path)
+        try:
+            conn.backup(target)
+        finally:
+            target.close()
         if logger:
-            logger.info("--- PMS DB INIT END ---", service="web")
-        print("PMS database initialized.")
+            logger.info(f"Saved PMS database snapshot to {path}", service="web")
+        max_snapshots = int(pms_config.get('max_snapshots', 5) or 0)
+        if max_snapshots:
+            # Timestamped names sort oldest first
+            snapshots = sorted(glob.glob(os.path.join(snapshot_dir, 'pms-*.db')))
+            for old in snapshots[:-max_snapshots]:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
 
 if __name__ == "__main__":
     from core.config_manager import ConfigManager
@@ -12,42 +12,90 @@ import time
 
 from datetime import datetime, timedelta
 from core.logger import Logger
-import json
-import threading
-import requests
+from core.control_plane import control_plane
+from core.rate_limiter import rate_limiter
 from flask import make_response
+import threading
+from collections import OrderedDict
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'  # For session management (not secure, but fine for honeypot)
 app.permanent_session_lifetime = timedelta(hours=6)  # Sessions last 6 hours
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = False
-logger = Logger()
+# Set by the orchestrator (or the worker process) with set_logger()
+logger = None
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'pms.db')
-web_server_thread = None
-web_should_run = False
+DB_STATEMENT_CACHE_SIZE = 256
+DASHBOARD_PAGE_SIZE = 50
+DASHBOARD_CACHE_SIZE = 64  # rendered dashboard pages kept in memory
+web_server = None  # ThreadedWebServer / WorkerPoolWebServer, see web_server.py
 web_blocked = False  # If True, all requests return 503 Service Unavailable
+web_blocked_flag = None  # Shared-memory copy of web_blocked in worker processes
+
+def set_logger(new_logger):
+    """Use the orchestrator's logger instead of the module default."""
+    global logger
+    logger = new_logger
+
+_db_local = threading.local()
+_rows_cache = OrderedDict()  # (generation, after, before) -> rendered rows
+_rows_cache_lock = threading.Lock()
+
+def get_db():
+    """
+    Per-thread connection to the PMS database. Server threads are long-lived,
+    so the connection (and sqlite3's per-connection statement cache) is
+    reused across requests instead of being reopened every time.
+    """
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, cached_statements=DB_STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _db_local.conn = conn
+    return conn
 
 # Set the block flag to control access to the web honeypot
 def set_web_blocked(blocked: bool):
     """Block or unblock all web honeypot endpoints."""
     global web_blocked
     web_blocked = blocked
+    if web_server is not None:
+        web_server.set_blocked(blocked)
+
+def is_web_blocked():
+    if web_blocked_flag is not None:
+        return bool(web_blocked_flag.value)
+    return web_blocked
 
 @app.before_request
 def before_request():
     """Log every request and block if web_blocked is True."""
-    if web_blocked:
+    if is_web_blocked():
+        return make_response(render_template('service_unavailable.html'), 503)
+    verdict = rate_limiter.check('web', request.remote_addr, logger)
+    if not verdict.allowed:
+        return make_response(render_template('service_unavailable.html'), 503)
+    if verdict.delay and not rate_limiter.tarpit('web', verdict.delay):
+        # Tarpit: holds one server thread, dropped once max_tarpits are held
         return make_response(render_template('service_unavailable.html'), 503)
     g.start_time = datetime.now()
-    logger.info(f"WEB request: {request.method} {request.path} from {request.remote_addr}", service="web")
+    g.log_request = verdict.log
+    if verdict.log:
+        logger.event("web.request", src_ip=request.remote_addr, method=request.method, path=request.path)
 
 @app.after_request
 def after_request(response):
     """Log every response with timing info."""
-    duration = (datetime.now() - g.start_time).total_seconds()
-    logger.info(f"WEB response: {request.method} {request.path} status {response.status_code} ({duration:.3f}s)", service="web")
+    start_time = g.get('start_time')
+    if start_time is None or not g.get('log_request', True):
+        # Request was answered by before_request (blocked) or sampled out
+        return response
+    duration = (datetime.now() - start_time).total_seconds()
+    logger.event("web.response", src_ip=request.remote_addr, method=request.method, path=request.path,
+                 status=response.status_code, duration=round(duration, 3))
     return response
 
 @app.route('/', methods=['GET', 'POST'])
@@ -58,20 +106,16 @@ def login():
         username = request.form['username']
         password = request.form['password']
         ip = request.remote_addr
-        logger.info(f"WEB login attempt from {ip}: username='{username}' password='{password}'", service="web")
+        logger.event("web.login_attempt", src_ip=ip, user=username, password=password)
         # VULNERABLE: Directly interpolating user input into SQL (SQL injection possible!)
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
         query = f"SELECT * FROM users WHERE username = '{username}' AND password = '{password}'"
-        c.execute(query)
-        user = c.fetchone()
-        conn.close()
+        user = get_db().execute(query).fetchone()
         if user:
-            logger.info(f"WEB login success for '{username}' from {ip}", service="web")
+            logger.event("web.login_success", src_ip=ip, user=username)
             session['user'] = username
             session.permanent = True  # Make session permanent
             return redirect(url_for('dashboard'))
-        logger.warning(f"WEB login failed for '{username}' from {ip}", service="web")
+        logger.event("web.login_failed", level="WARNING", src_ip=ip, user=username, password=password)
         error = 'Invalid credentials.'
     return render_template('login.html', error=error)
 
@@ -80,12 +124,58 @@ def dashboard():
     """Simulated dashboard page (requires login)."""
     if 'user' not in session:
         return redirect(url_for('login'))
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT * FROM production")
-    data = c.fetchall()
-    conn.close()
-    return render_template('dashboard.html', data=data)
+    try:
+        after = int(request.args['after']) if request.args.get('after') else None
+        before = int(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        after = before = None
+    return render_template('dashboard.html', rows_html=render_product_rows(after, before))
+
+def _production_generation(conn):
+    try:
+        row = conn.execute("SELECT value FROM pms_meta WHERE key = 'production_generation'").fetchone()
+    except sqlite3.OperationalError:
+        # Database created before pms_meta existed: no caching
+        return None
+    return row[0] if row else None
+
+def render_product_rows(after=None, before=None):
+    """
+    Render one page of the production table (keyset pagination on id).
+    Rendered pages are cached until the production table changes.
+    """
+    conn = get_db()
+    generation = _production_generation(conn)
+    key = (generation, after, before)
+    if generation is not None:
+        with _rows_cache_lock:
+            cached = _rows_cache.get(key)
+            if cached is not None:
+                _rows_cache.move_to_end(key)
+                return cached
+    if before is not None:
+        data = conn.execute("SELECT * FROM production WHERE id < ? ORDER BY id DESC LIMIT ?",
+                            (before, DASHBOARD_PAGE_SIZE)).fetchall()[::-1]
+    else:
+        data = conn.execute("SELECT * FROM production WHERE id > ? ORDER BY id LIMIT ?",
+                            (after if after is not None else -1, DASHBOARD_PAGE_SIZE)).fetchall()
+    first_id = data[0][0] if data else None
+    last_id = data[-1][0] if data else None
+    has_prev = first_id is not None and conn.execute(
+        "SELECT 1 FROM production WHERE id < ? LIMIT 1", (first_id,)).fetchone() is not None
+    has_next = last_id is not None and conn.execute(
+        "SELECT 1 FROM production WHERE id > ? LIMIT 1", (last_id,)).fetchone() is not None
+    html = render_template('_product_rows.html', data=data, first_id=first_id, last_id=last_id,
+                           has_prev=has_prev, has_next=has_next)
+    if generation is not None:
+        with _rows_cache_lock:
+            # Entries of older generations are never hit again; drop them
+            for stale in [k for k in _rows_cache if k[0] != generation]:
+                del _rows_cache[stale]
+            _rows_cache[key] = html
+            if len(_rows_cache) > DASHBOARD_CACHE_SIZE:
+                _rows_cache.popitem(last=False)
+    return html
 
 # CRUD: Add Product
 @app.route('/add_product', methods=['GET', 'POST'])
@@ -100,13 +190,11 @@ def add_product():
         quantity = request.form.get('quantity')
         status = request.form.get('status')
         try:
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute("INSERT INTO production (reference, family, product, quantity, status) VALUES (?, ?, ?, ?, ?)",
-                      (reference, family, product, quantity, status))
-            conn.commit()
-            conn.close()
-            logger.info(f"WEB product added: {reference} - {product}", service="web")
+            conn = get_db()
+            with conn:
+                conn.execute("INSERT INTO production (reference, family, product, quantity, status) VALUES (?, ?, ?, ?, ?)",
+                             (reference, family, product, quantity, status))
+            logger.event("web.product_added", src_ip=request.remote_addr, reference=reference, product=product)
             return redirect(url_for('dashboard'))
         except Exception as e:
             error = str(e)
@@ -117,10 +205,8 @@ def add_product():
 def edit_product(product_id):
     if 'user' not in session:
         return redirect(url_for('login'))
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT * FROM production WHERE id = ?", (product_id,))
-    product = c.fetchone()
+    conn = get_db()
+    product = conn.execute("SELECT * FROM production WHERE id = ?", (product_id,)).fetchone()
     error = None
     if request.method == 'POST':
         reference = request.form.get('reference')
@@ -129,14 +215,13 @@ def edit_product(product_id):
         quantity = request.form.get('quantity')
         status = request.form.get('status')
         try:
-            c.execute("UPDATE production SET reference = ?, family = ?, product = ?, quantity = ?, status = ? WHERE id = ?",
-                      (reference, family, prod, quantity, status, product_id))
-            conn.commit()
-            logger.info(f"WEB product edited: {reference} - {prod}", service="web")
+            with conn:
+                conn.execute("UPDATE production SET reference = ?, family = ?, product = ?, quantity = ?, status = ? WHERE id = ?",
+                             (reference, family, prod, quantity, status, product_id))
+            logger.event("web.product_edited", src_ip=request.remote_addr, product_id=product_id, reference=reference, product=prod)
             return redirect(url_for('dashboard'))
         except Exception as e:
             error = str(e)
-    conn.close()
     return render_template('edit_product.html', product=product, error=error)
 
 # CRUD: Delete Product
@@ -145,14 +230,12 @@ def delete_product(product_id):
     if 'user' not in session:
         return redirect(url_for('login'))
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("DELETE FROM production WHERE id = ?", (product_id,))
-        conn.commit()
-        conn.close()
-        logger.info(f"WEB product deleted: {product_id}", service="web")
+        conn = get_db()
+        with conn:
+            conn.execute("DELETE FROM production WHERE id = ?", (product_id,))
+        logger.event("web.product_deleted", src_ip=request.remote_addr, product_id=product_id)
     except Exception as e:
-        logger.warning(f"WEB product delete failed: {product_id} - {e}", service="web")
+        logger.event("web.product_delete_failed", level="WARNING", src_ip=request.remote_addr, product_id=product_id, error=str(e))
     return redirect(url_for('dashboard'))
 
 @app.route('/logout')
@@ -162,72 +245,50 @@ def logout():
     return redirect(url_for('login'))
 
 def set_web_status(status):
-    """Update the web service status in the shared status file."""
-    status_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs/service_status.json'))
-    try:
-        if os.path.exists(status_file):
-            with open(status_file, 'r') as f:
-                data = json.load(f)
-        else:
-            data = {}
-        data['web'] = status
-        with open(status_file, 'w') as f:
-            json.dump(data, f)
-    except Exception:
-        pass
+    """Report the web service status to the control plane."""
+    control_plane.set_status('web', status)
 
 def start_web_server(config=None, logger=None):
-    """Start the web honeypot Flask app in a background thread."""
-    global web_server_thread, web_should_run
-    port = 8080
-    if config:
-        port = config.get('services', {}).get('web', {}).get('port', 8080)
-    def run():
-        set_web_status("running")
-        try:
-            app.run(host='0.0.0.0', port=port, debug=False, use_reloader=False)
-        except Exception:
-            set_web_status("error")
-        set_web_status("stopped")
-    web_should_run = True
-    web_server_thread = threading.Thread(target=run, daemon=True)
-    web_server_thread.start()
-
-def stop_web_server():
-    """Attempt to stop the Flask app by calling the /shutdown route."""
-    global web_should_run
+    """Start the web honeypot under the WSGI server selected in the config."""
+    global web_server
+    from services.web.web_server import create_web_server
+    if logger:
+        set_logger(logger)
+    web_config = (config or {}).get('services', {}).get('web', {})
+    server = create_web_server(app, web_config, logger=logger)
     try:
-        # Try to stop Flask by sending a shutdown request
-        requests.get('http://127.0.0.1:8080/shutdown')
+        server.start()
     except Exception:
-        pass
-    web_should_run = False
-    set_web_status("stopped")
+        set_web_status("error")
+        raise
+    web_server = server
+    server.set_blocked(web_blocked)
+    set_web_status("running")
 
-@app.route('/shutdown')
-def shutdown():
-    """Shutdown route for hard-stopping the Flask app (used internally)."""
+def stop_web_server():
+    """Gracefully stop the web server (in-flight requests are allowed to finish)."""
+    global web_server
+    if web_server is not None:
+        web_server.stop()
+        web_server = None
     set_web_status("stopped")
-    import os
-    os._exit(0)
 
 @app.errorhandler(404)
 def handle_404(e):
     """Return 503 if blocked, otherwise default 404."""
-    if web_blocked:
-        from flask import make_response, render_template
+    if is_web_blocked():
         return make_response(render_template('service_unavailable.html'), 503)
     return e
 
 @app.errorhandler(500)
 def handle_500(e):
     """Return 503 if blocked, otherwise default 500."""
-    if web_blocked:
-        from flask import make_response, render_template
+    if is_web_blocked():
         return make_response(render_template('service_unavailable.html'), 503)
     return e
 
 if __name__ == '__main__':
     # For standalone testing
     port = int(os.environ.get('PMS_WEB_PORT', 8080))
+    set_logger(Logger())
     app.run(host='0.0.0.0', port=port, debug=False)
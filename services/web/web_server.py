@@ -0,0 +1,193 @@
+"""
+WSGI serving modes for the PMS web honeypot.
+
+services.web.server in honeypot.yaml selects one of:
+
+- threaded: one waitress server in a background thread of the orchestrator
+  process, with a bounded pool of worker threads.
+- workers: the listening socket is opened once and handed to N spawned
+  processes, each running its own threaded waitress server on it. Log
+  events are forwarded to the orchestrator's logger over a queue and the
+  blocked/unblocked flag lives in shared memory.
+
+Both support HTTP/1.1 keep-alive (idle connections are closed after
+channel_timeout seconds), cap concurrent connections with connection_limit
+and shut down gracefully: stop accepting, let in-flight requests finish (up
+to shutdown_timeout seconds), then close the remaining connections.
+"""
+import multiprocessing
+import os
+import socket
+import threading
+
+from waitress.server import create_server
+
+from core.logger import QueueLogger, forward_log_events
+from core.rate_limiter import rate_limiter
+
+DEFAULTS = {
+    'server': 'threaded',
+    'threads': 8,
+    'workers': 2,
+    'connection_limit': 100,
+    'channel_timeout': 30,
+    'shutdown_timeout': 5,
+    'backlog': 1024,
+    # Sent as the Server header; the waitress default gives the honeypot away
+    'server_header': 'Microsoft-IIS/10.0',
+}
+
+
+class ThreadedWebServer:
+    def __init__(self, app, host='0.0.0.0', port=8080, sockets=None, threads=8, connection_limit=100,
+                 channel_timeout=30, shutdown_timeout=5, backlog=1024, server_header=DEFAULTS['server_header']):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.sockets = sockets
+        self.threads = threads
+        self.connection_limit = connection_limit
+        self.channel_timeout = channel_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.backlog = backlog
+        self.server_header = server_header
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        options = dict(
+            threads=self.threads,
+            connection_limit=self.connection_limit,
+            channel_timeout=self.channel_timeout,
+            backlog=self.backlog,
+            ident=self.server_header,
+        )
+        if self.sockets:
+            options['sockets'] = self.sockets
+        else:
+            options['host'] = self.host
+            options['port'] = self.port
+        # Binds right away, so "address in use" is raised to the caller
+        self._server = create_server(self.app, **options)
+        self._thread = threading.Thread(target=self._server.run, name='web-honeypot-server', daemon=True)
+        self._thread.start()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def set_blocked(self, blocked):
+        # Same process: web_honeypot's module flag is used directly
+        pass
+
+    def stop(self):
+        server = self._server
+        if server is None:
+            return
+        self._server = None
+        # Stop accepting, then let running requests finish
+        server.accepting = False
+        server.task_dispatcher.shutdown(cancel_pending=False, timeout=self.shutdown_timeout)
+
+        def close_all():
+            # Runs on the server loop thread: close idle keep-alive connections,
+            # then the listener and its trigger; the loop exits once its map is empty
+            for channel in list(server._map.values()):
+                if channel is server or channel is server.trigger:
+                    continue
+                try:
+                    channel.handle_close()
+                except Exception:
+                    pass
+            server.close()
+
+        server.trigger.pull_trigger(close_all)
+        self._thread.join(self.shutdown_timeout)
+
+
+def _run_worker(sock, event_queue, blocked_flag, stop_event, rate_limit, options):
+    """Entry point of a worker process (spawned, so it starts from a clean interpreter)."""
+    from services.web import web_honeypot
+    # Each worker keeps its own buckets, so the effective limit per IP is up to
+    # `workers` times the configured one
+    rate_limiter.configure(rate_limit)
+    web_honeypot.set_logger(QueueLogger(event_queue))
+    web_honeypot.web_blocked_flag = blocked_flag
+    server = ThreadedWebServer(web_honeypot.app, sockets=[sock], **options)
+    server.start()
+    try:
+        stop_event.wait()
+    except KeyboardInterrupt:
+        pass
+    server.stop()
+
+
+class WorkerPoolWebServer:
+    def __init__(self, app, host='0.0.0.0', port=8080, workers=2, backlog=1024, logger=None, **options):
+        # `app` is imported again inside each worker
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.backlog = backlog
+        self.shutdown_timeout = options.get('shutdown_timeout', DEFAULTS['shutdown_timeout'])
+        self.options = dict(options, backlog=backlog)
+        self.logger = logger
+        self._sock = None
+        self._processes = []
+        self._ctx = multiprocessing.get_context('spawn')
+        self._blocked = self._ctx.Value('b', 0, lock=False)
+        self._stop_event = None
+        self._events = None
+        self._forwarder = None
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if os.name != 'nt':
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        self._sock = sock
+        self._stop_event = self._ctx.Event()
+        self._events = self._ctx.Queue(maxsize=10000)
+        self._forwarder = threading.Thread(target=forward_log_events, args=(self._events, self.logger),
+                                           name='web-worker-log-forwarder', daemon=True)
+        self._forwarder.start()
+        for _ in range(self.workers):
+            process = self._ctx.Process(target=_run_worker, daemon=True,
+                                        args=(sock, self._events, self._blocked, self._stop_event,
+                                              rate_limiter.settings, self.options))
+            process.start()
+            self._processes.append(process)
+
+    def is_alive(self):
+        return any(p.is_alive() for p in self._processes)
+
+    def set_blocked(self, blocked):
+        self._blocked.value = 1 if blocked else 0
+
+    def stop(self):
+        if self._stop_event is None:
+            return
+        self._stop_event.set()
+        for process in self._processes:
+            process.join(self.shutdown_timeout + 1)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._sock.close()
+        self._events.put(None)
+        self._forwarder.join(self.shutdown_timeout)
+        self._stop_event = None
+
+
+def create_web_server(app, web_config, logger=None):
+    """Build the server selected by services.web.server (not started yet)."""
+    settings = dict(DEFAULTS)
+    settings.update({k: web_config[k] for k in DEFAULTS if k in web_config})
+    mode = settings.pop('server')
+    port = web_config.get('port', 8080)
+    workers = settings.pop('workers')
+    if mode == 'workers':
+        return WorkerPoolWebServer(app, port=port, workers=workers, logger=logger, **settings)
+    if mode != 'threaded':
+        raise ValueError(f"Unknown web server mode: {mode}")
+    return ThreadedWebServer(app, port=port, **settings)
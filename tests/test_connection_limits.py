@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+
+from core.rate_limiter import rate_limiter
+from services.ssh import ssh_service
+from services.ssh.connection_limits import SSHConnectionLimits, connection_limits
+
+
+class FakeLogger:
+    def __init__(self):
+        self.events = []
+
+    def event(self, name, level="INFO", **fields):
+        self.events.append((name, fields))
+
+
+class FakeConnection:
+    def __init__(self, ip):
+        self.ip = ip
+        self.aborted = False
+        self.disconnected = asyncio.Event()
+        self.reason = None
+
+    def get_extra_info(self, name):
+        return (self.ip, 50000) if name == "peername" else None
+
+    def abort(self):
+        self.aborted = True
+
+    def disconnect(self, code, reason):
+        self.reason = reason
+        self.disconnected.set()
+
+
+def make_limits(**config):
+    limits = SSHConnectionLimits()
+    limits.configure(config)
+    return limits
+
+
+def test_per_ip_cap():
+    limits = make_limits(max_connections=0, max_per_ip=2)
+    assert limits.admit("10.0.0.1") is None
+    assert limits.admit("10.0.0.1") is None
+    assert limits.admit("10.0.0.1") == "max_per_ip"
+    assert limits.admit("10.0.0.2") is None
+    assert limits.stats()["active"] == 3
+
+
+def test_global_cap():
+    limits = make_limits(max_connections=2, max_per_ip=0)
+    assert limits.admit("10.0.0.1") is None
+    assert limits.admit("10.0.0.2") is None
+    assert limits.admit("10.0.0.3") == "max_connections"
+    limits.release("10.0.0.1")
+    assert limits.admit("10.0.0.3") is None
+
+
+def test_release_forgets_idle_addresses():
+    limits = make_limits(max_per_ip=1)
+    limits.admit("10.0.0.1")
+    limits.admit("10.0.0.2")
+    assert limits.stats()["source_ips"] == 2
+    limits.release("10.0.0.1")
+    assert limits.stats() == {"active": 1, "source_ips": 1, "evicted": dict.fromkeys(
+        ("max_connections", "max_per_ip", "login_grace_time", "idle_timeout", "max_session_duration"), 0)}
+    # Its slot is free again
+    assert limits.admit("10.0.0.1") is None
+
+
+def test_counters_by_reason():
+    limits = make_limits(max_connections=1, max_per_ip=1)
+    limits.admit("10.0.0.1")
+    limits.admit("10.0.0.1")
+    limits.admit("10.0.0.2")
+    limits.count_eviction("idle_timeout")
+    evicted = limits.stats()["evicted"]
+    assert evicted["max_connections"] == 2
+    assert evicted["max_per_ip"] == 0
+    assert evicted["idle_timeout"] == 1
+
+
+def test_zero_disables_limits():
+    limits = make_limits(max_connections=0, max_per_ip=0)
+    assert all(limits.admit("10.0.0.1") is None for _ in range(1000))
+
+
+@pytest.fixture
+def server_limits():
+    rate_limiter.configure(None)
+
+    def configure(**config):
+        connection_limits.configure(dict({"keepalive_interval": 0}, **config))
+
+    yield configure
+    connection_limits.configure(None)
+
+
+def connect(ip="10.0.0.1"):
+    logger = FakeLogger()
+    server = ssh_service.SSHHoneypotServer(None, None, logger, {})
+    conn = FakeConnection(ip)
+    server.connection_made(conn)
+    return server, conn, logger
+
+
+async def wait_disconnected(conn):
+    async with asyncio.timeout(10):
+        await conn.disconnected.wait()
+
+
+def evicted_reasons(logger):
+    return [fields["reason"] for name, fields in logger.events if name == "ssh.session_evicted"]
+
+
+def test_server_refuses_over_the_cap(server_limits):
+    server_limits(max_connections=0, max_per_ip=1)
+
+    async def run():
+        first, first_conn, _ = connect()
+        second, second_conn, logger = connect()
+        assert not first_conn.aborted
+        assert second_conn.aborted
+        assert [f["reason"] for n, f in logger.events if n == "ssh.connection_refused"] == ["max_per_ip"]
+        # Only the admitted connection is released when it closes
+        second.connection_lost(None)
+        first.connection_lost(None)
+        assert connection_limits.stats()["active"] == 0
+
+    asyncio.run(run())
+
+
+def test_login_grace_time(server_limits):
+    server_limits(login_grace_time=0.05, idle_timeout=0, max_session_duration=0)
+
+    async def run():
+        server, conn, logger = connect()
+        await wait_disconnected(conn)
+        server.connection_lost(None)
+        assert evicted_reasons(logger) == ["login_grace_time"]
+
+    asyncio.run(run())
+
+
+def test_authenticated_connection_skips_grace_time(server_limits):
+    server_limits(login_grace_time=0.05, idle_timeout=0, max_session_duration=0.3)
+
+    async def run():
+        server, conn, logger = connect()
+        server.auth_completed()
+        await wait_disconnected(conn)
+        server.connection_lost(None)
+        assert evicted_reasons(logger) == ["max_session_duration"]
+
+    asyncio.run(run())
+
+
+def test_idle_timeout_restarts_on_activity(server_limits):
+    server_limits(login_grace_time=0, idle_timeout=0.2, max_session_duration=0)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        server, conn, logger = connect()
+        server.auth_completed()
+        started = loop.time()
+        await asyncio.sleep(0.1)
+        server.touch()
+        touched = loop.time()
+        await wait_disconnected(conn)
+        # Evicted one idle_timeout after the last input, not after login
+        assert loop.time() - touched >= 0.19
+        assert loop.time() - started >= 0.29
+        server.connection_lost(None)
+        assert evicted_reasons(logger) == ["idle_timeout"]
+        assert connection_limits.stats()["evicted"]["idle_timeout"] >= 1
+
+    asyncio.run(run())
@@ -0,0 +1,46 @@
+from core.credential_stats import CountMinSketch, CredentialStats, TopK
+
+
+def test_count_min_sketch_never_underestimates():
+    sketch = CountMinSketch(width=16, depth=2)
+    truth = {}
+    for i in range(500):
+        item = f"item{i % 37}"
+        truth[item] = truth.get(item, 0) + 1
+        assert sketch.add(item) >= truth[item]
+
+
+def test_top_k_keeps_heavy_hitters():
+    top = TopK(k=3)
+    for item, count in (("admin", 50), ("root", 30), ("guest", 20), ("test", 5)):
+        for _ in range(count):
+            top.add(item)
+    for i in range(100):
+        top.add(f"rare{i}")
+    assert [item for item, _ in top.most_common()] == ["admin", "root", "guest"]
+    assert top.most_common(1) == [("admin", 50)]
+
+
+def test_record_and_snapshot():
+    stats = CredentialStats(k=10)
+    stats.record("ssh", "10.0.0.1", "root", "123456")
+    stats.record("ssh", "10.0.0.1", "root", "password")
+    stats.record("ftp", "10.0.0.2", "admin", "123456")
+    stats.record("web", None, None, None)
+    snapshot = stats.snapshot()
+    assert snapshot["total"] == 4
+    assert snapshot["by_service"] == {"ssh": 2, "ftp": 1, "web": 1}
+    assert snapshot["usernames"][0] == {"user": "root", "count": 2}
+    assert snapshot["passwords"][0] == {"password": "123456", "count": 2}
+    assert {"user": "", "password": "", "count": 1} in snapshot["pairs"]
+    # Attempts without a source address are not counted as an IP
+    assert sum(entry["count"] for entry in snapshot["src_ips"]) == 3
+
+
+def test_reset():
+    stats = CredentialStats()
+    stats.record("ssh", "10.0.0.1", "root", "toor")
+    stats.reset()
+    snapshot = stats.snapshot()
+    assert snapshot["total"] == 0
+    assert snapshot["usernames"] == []
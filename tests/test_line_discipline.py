@@ -0,0 +1,84 @@
+from services.ssh.line_discipline import LineDiscipline
+
+UP = "\x1b[A"
+DOWN = "\x1b[B"
+LEFT = "\x1b[D"
+HOME = "\x1b[H"
+DELETE = "\x1b[3~"
+
+
+def lines(events):
+    return [text for kind, text in events if kind == "line"]
+
+
+def echoed(events):
+    return "".join(text for kind, text in events if kind == "echo")
+
+
+def test_whole_script_in_one_chunk():
+    ld = LineDiscipline()
+    assert lines(ld.feed("whoami\r\ndir\nipconfig\r")) == ["whoami", "dir", "ipconfig"]
+    # LF right after a CR does not produce an empty line
+    assert lines(ld.feed("\nver\n")) == ["ver"]
+
+
+def test_partial_line_is_buffered():
+    ld = LineDiscipline()
+    assert ld.feed("who") == []
+    assert ld.pending == "who"
+    assert lines(ld.feed("ami\r")) == ["whoami"]
+    assert ld.pending == ""
+
+
+def test_no_echo_without_pty():
+    ld = LineDiscipline(echo=False)
+    assert all(kind == "line" for kind, _ in ld.feed("dir\r"))
+
+
+def test_backspace_and_ctrl_u():
+    ld = LineDiscipline(echo=True)
+    events = ld.feed("dirr\x7f\r")
+    assert lines(events) == ["dir"]
+    assert echoed(events).startswith("dirr\b \b")
+    assert lines(ld.feed("garbage\x15cls\r")) == ["cls"]
+
+
+def test_ctrl_c_drops_the_line():
+    ld = LineDiscipline(echo=True)
+    events = ld.feed("del *\x03")
+    assert lines(events) == [""]
+    assert "^C\r\n" in echoed(events)
+    assert ld.pending == ""
+
+
+def test_cursor_movement():
+    ld = LineDiscipline()
+    assert lines(ld.feed("ac" + LEFT + "b\r")) == ["abc"]
+    assert lines(ld.feed("xbc" + HOME + DELETE + "a\r")) == ["abc"]
+
+
+def test_history():
+    ld = LineDiscipline(echo=True, history_size=2)
+    ld.feed("one\rtwo\rthree\r")
+    # Only history_size lines are kept
+    assert lines(ld.feed(UP + UP + UP + "\r")) == ["two"]
+    assert lines(ld.feed(UP + "\r")) == ["two"]
+    assert lines(ld.feed(UP + UP + DOWN + "\r")) == ["two"]
+    assert lines(ld.feed(UP + DOWN + "\r")) == [""]
+    # Blank lines are not recorded
+    ld.feed("   \r")
+    assert lines(ld.feed(UP + "\r")) == ["two"]
+
+
+def test_escape_split_across_packets():
+    ld = LineDiscipline()
+    ld.feed("ab")
+    assert ld.feed("\x1b") == []
+    assert ld.feed("[") == []
+    ld.feed("D")
+    assert lines(ld.feed("X\r")) == ["aXb"]
+
+
+def test_line_length_is_capped():
+    ld = LineDiscipline(max_line=5)
+    assert lines(ld.feed("x" * 100 + "\r")) == ["xxxxx"]
@@ -0,0 +1,108 @@
+import json
+import os
+import time
+
+import pytest
+
+from services.admin import log_search
+from services.admin.log_search import iter_lines_reversed, list_log_files, search_logs
+
+NOW = time.time()
+
+
+def write_log(path, records):
+    with open(path, "w") as f:
+        for age, fields in records:
+            record = {"timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(NOW - age)), "level": "INFO"}
+            record.update(fields)
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture
+def logs_dir(tmp_path):
+    write_log(tmp_path / "ssh_honeypot.log", [
+        (100, {"service": "ssh", "event": "ssh.login_failed", "src_ip": "10.0.0.1", "user": "root"}),
+        (50, {"service": "ssh", "event": "ssh.command", "src_ip": "10.0.0.2", "command": "whoami"}),
+        (10, {"service": "ssh", "event": "ssh.login_failed", "src_ip": "10.0.0.1", "user": "admin"}),
+    ])
+    write_log(tmp_path / "dns_honeypot.log", [
+        (80, {"service": "dns", "event": "dns.query", "src_ip": "10.0.0.3", "qname": "a.example."}),
+        (20, {"service": "dns", "event": "dns.query", "src_ip": "10.0.0.1", "qname": "b.example."}),
+    ])
+    return str(tmp_path)
+
+
+def test_iter_lines_reversed_across_blocks(tmp_path):
+    path = tmp_path / "x.log"
+    path.write_bytes(b"".join(b"line %d\n" % i for i in range(1000)))
+    result = list(iter_lines_reversed(str(path), chunk_size=7))
+    assert result == [b"line %d" % i for i in reversed(range(1000))]
+
+
+def test_list_log_files(logs_dir):
+    assert sorted(list_log_files(logs_dir)) == ["dns", "ssh"]
+    assert list(list_log_files(logs_dir, "dns")) == ["dns"]
+
+
+@pytest.mark.parametrize("service", ["*", "ss?", "[sd]ns", "../ssh", "a/b", ".."])
+def test_service_name_must_be_plain(logs_dir, service):
+    with pytest.raises(ValueError):
+        search_logs(logs_dir, service=service)
+
+
+def test_newest_first_across_services(logs_dir):
+    records, scanned = search_logs(logs_dir)
+    assert [r["event"] for r in records] == [
+        "ssh.login_failed", "dns.query", "ssh.command", "dns.query", "ssh.login_failed"]
+    assert scanned == 5
+    assert records[0]["file"] == "ssh_honeypot.log"
+
+
+def test_field_filters_and_text(logs_dir):
+    records, _ = search_logs(logs_dir, src_ip="10.0.0.1")
+    assert len(records) == 3
+    records, _ = search_logs(logs_dir, service="ssh", event="ssh.login_failed", user="root")
+    assert [r["user"] for r in records] == ["root"]
+    records, _ = search_logs(logs_dir, text="whoami")
+    assert [r["event"] for r in records] == ["ssh.command"]
+
+
+def test_limit(logs_dir):
+    records, _ = search_logs(logs_dir, limit=2)
+    assert len(records) == 2
+
+
+def test_time_range(logs_dir):
+    records, _ = search_logs(logs_dir, since=NOW - 60, until=NOW - 15)
+    assert [r["event"] for r in records] == ["dns.query", "ssh.command"]
+
+
+def test_out_of_order_records_are_not_missed(tmp_path):
+    # An aggregated record is written when its window closes, after newer ones
+    write_log(tmp_path / "dns_honeypot.log", [
+        (30, {"service": "dns", "event": "dns.query"}),
+        (45, {"service": "dns", "event": "dns.query", "aggregated": True}),
+        (20, {"service": "dns", "event": "dns.query"}),
+    ])
+    records, _ = search_logs(str(tmp_path), since=NOW - 50)
+    assert len(records) == 3
+    records, _ = search_logs(str(tmp_path), since=NOW - 40)
+    assert not any(r.get("aggregated") for r in records)
+
+
+def test_scan_stops_past_the_margin(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_search, "SINCE_MARGIN", 100)
+    write_log(tmp_path / "ssh_honeypot.log",
+              [(1000 + i, {"service": "ssh", "event": "ssh.command"}) for i in range(50, 0, -1)]
+              + [(5, {"service": "ssh", "event": "ssh.command"})])
+    records, scanned = search_logs(str(tmp_path), since=NOW - 60)
+    assert len(records) == 1
+    assert scanned == 2
+
+
+def test_skips_files_older_than_since(logs_dir):
+    old = os.path.join(logs_dir, "ssh_honeypot.2020-01-01.log")
+    write_log(old, [(0, {"service": "ssh", "event": "ssh.command"})])
+    os.utime(old, (NOW - 3600, NOW - 3600))
+    records, _ = search_logs(logs_dir, service="ssh", since=NOW - 600)
+    assert all(r["file"] == "ssh_honeypot.log" for r in records)
@@ -0,0 +1,127 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from core import rate_limiter as rate_limiter_module
+from core.rate_limiter import ALLOW, RateLimiter
+
+
+class FakeLogger:
+    def __init__(self):
+        self.events = []
+
+    def event(self, name, level="INFO", **fields):
+        self.events.append((name, fields))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_limiter(**config):
+    limiter = RateLimiter()
+    limiter.configure(dict({"enabled": True, "rate": 1, "burst": 3, "sample_every": 5}, **config))
+    return limiter
+
+
+def test_disabled_allows_everything(clock):
+    limiter = RateLimiter()
+    assert all(limiter.check("ssh", "10.0.0.1") is ALLOW for _ in range(100))
+    assert limiter.stats()["tracked"] == 0
+
+
+def test_burst_then_action(clock):
+    limiter = make_limiter(action="drop")
+    verdicts = [limiter.check("ssh", "10.0.0.1") for _ in range(4)]
+    assert verdicts[:3] == [ALLOW] * 3
+    assert verdicts[3] == (False, 0, False)
+    assert limiter.stats()["limited"] == 1
+
+
+def test_tokens_refill_over_time(clock):
+    limiter = make_limiter(action="drop")
+    for _ in range(3):
+        limiter.check("ssh", "10.0.0.1")
+    assert not limiter.check("ssh", "10.0.0.1").allowed
+    clock[0] += 2
+    assert limiter.check("ssh", "10.0.0.1") is ALLOW
+    assert limiter.check("ssh", "10.0.0.1") is ALLOW
+    assert not limiter.check("ssh", "10.0.0.1").allowed
+
+
+def test_buckets_are_per_service_and_ip(clock):
+    limiter = make_limiter(action="drop")
+    for _ in range(3):
+        limiter.check("ssh", "10.0.0.1")
+    assert limiter.check("ssh", "10.0.0.2") is ALLOW
+    assert limiter.check("ftp", "10.0.0.1") is ALLOW
+
+
+def test_delay_and_log_only_actions(clock):
+    limiter = make_limiter(action="delay", tarpit_delay=1.5,
+                           services={"web": {"action": "log_only"}})
+    for _ in range(3):
+        limiter.check("ssh", "10.0.0.1")
+        limiter.check("web", "10.0.0.1")
+    assert limiter.check("ssh", "10.0.0.1") == (True, 1.5, True)
+    # log_only: the first hit over the limit is logged, the next ones sampled
+    assert limiter.check("web", "10.0.0.1") == (True, 0, True)
+    assert limiter.check("web", "10.0.0.1") == (True, 0, False)
+
+
+def test_rate_limited_events_are_sampled(clock):
+    limiter = make_limiter(action="drop")
+    logger = FakeLogger()
+    for _ in range(3 + 12):
+        limiter.check("ssh", "10.0.0.1", logger)
+    counts = [fields["count"] for name, fields in logger.events if name == "ssh.rate_limited"]
+    assert counts == [1, 5, 10]
+
+
+def test_lru_eviction(clock):
+    limiter = make_limiter(max_tracked_ips=2)
+    for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+        limiter.check("ssh", ip)
+    assert limiter.stats()["tracked"] == 2
+    assert limiter.stats()["evicted"] == 1
+
+
+def test_unknown_action_rejected():
+    with pytest.raises(ValueError):
+        RateLimiter().configure({"action": "explode"})
+    with pytest.raises(ValueError):
+        RateLimiter().configure({"services": {"dns": {"action": "explode"}}})
+
+
+def test_tarpit_caps_concurrent_threads(monkeypatch):
+    # The tarpit sleep blocks until released, so no timing is involved
+    entered = threading.Semaphore(0)
+    release = threading.Event()
+
+    def sleep(delay):
+        entered.release()
+        assert release.wait(10)
+
+    monkeypatch.setattr(rate_limiter_module, "time", SimpleNamespace(sleep=sleep, monotonic=time.monotonic))
+    limiter = make_limiter(max_tarpits=2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(limiter.tarpit("dns", 2))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for _ in threads:
+        assert entered.acquire(timeout=10)
+    assert limiter.stats()["tarpitted"] == 2
+    # Both slots are held: further requests are dropped without sleeping
+    assert [limiter.tarpit("dns", 2) for _ in range(3)] == [False] * 3
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == [True, True]
+    stats = limiter.stats()
+    assert stats["tarpit_dropped"] == 3
+    assert stats["tarpitted"] == 0
@@ -0,0 +1,63 @@
+import asyncio
+import socket
+
+import pytest
+
+from core.control_plane import control_plane
+from services.ssh import ssh_service
+
+
+class FakeLogger:
+    def __init__(self):
+        self.events = []
+
+    def event(self, name, level="INFO", **fields):
+        self.events.append((name, fields))
+
+    def info(self, msg, service="ssh"):
+        pass
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def statuses(tmp_path, monkeypatch):
+    monkeypatch.setattr(control_plane, "status_file", str(tmp_path / "service_status.json"))
+    seen = []
+    set_status = control_plane.set_status
+
+    def record(service, status):
+        if service == "ssh":
+            seen.append(status)
+        set_status(service, status)
+
+    monkeypatch.setattr(control_plane, "set_status", record)
+    return seen
+
+
+@pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="worker mode needs SO_REUSEPORT")
+def test_stopping_a_worker_pool_is_not_an_error(tmp_path, statuses):
+    config = {"services": {"ssh": {
+        "port": free_port(),
+        "workers": 2,
+        "users": [{"username": "admin", "password": "admin"}],
+        "host_keys": {"dir": str(tmp_path / "keys"), "types": ["ssh-ed25519"]},
+    }}}
+    logger = FakeLogger()
+
+    async def run():
+        server = asyncio.create_task(ssh_service.start_ssh_server(config, logger))
+        async with asyncio.timeout(60):
+            while not isinstance(ssh_service.ssh_server_instance, ssh_service.SSHWorkerPool):
+                await asyncio.sleep(0.05)
+            await ssh_service.stop_ssh_server()
+            await server
+
+    asyncio.run(run())
+    assert "error" not in statuses
+    assert statuses[-1] == "stopped"
+    assert ssh_service.ssh_server_instance is None